@@ -1,13 +1,29 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
-from typing import Dict, List
+from starlette.requests import ClientDisconnect
+from typing import Dict, List, Optional
 import socketio
 import uvicorn
 from datetime import datetime
 import os
 import asyncio
+import bisect
+import hashlib
+import re
+import sys
+import time
+import uuid
 from pathlib import Path
+import aiofiles
+
+# The shared metrics registry lives in the socketlab package next to this folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from socketlab.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY
+from socketlab.stats import TransferMetrics
+from models import ClientInfo
 
 app = FastAPI()
 
@@ -21,15 +37,64 @@ app.add_middleware(
 )
 
 # Socket.IO setup
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# Chunk bytes all uploads together may have in flight; each upload's share is its credit
+INFLIGHT_BUDGET = 64 * 1024 * 1024
+MAX_CREDIT = 64
+# Room for the largest chunk plus the event envelope in one Socket.IO message
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*',
+                           max_http_buffer_size=MAX_CHUNK_SIZE + 64 * 1024)
 socket_app = socketio.ASGIApp(sio)
 app.mount('/socket.io', socket_app)
 
 # Store active transfers and clients
 active_transfers: Dict[str, dict] = {}
-clients: Dict[str, dict] = {}
+clients: Dict[str, ClientInfo] = {}
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploads in progress by transfer_id
+uploads: Dict[str, "UploadSession"] = {}
+HASH_BLOCK_SIZE = 1024 * 1024
+# Final digests run in threads; capping them keeps disk and CPU free for chunk writes
+# Made at import, so Python 3.10+: older semaphores bind to the loop current at creation
+hash_slots = asyncio.Semaphore(2)
+# Streamed request bodies are written in pieces of this size: the memory one HTTP upload holds
+STREAM_WRITE_SIZE = 1024 * 1024
+# transfer_update frames go out at most once per tick per client, batching every change since the last
+UPDATE_TICK = 0.25
+# Transfers changed since the last tick
+dirty_transfers: set = set()
+update_ticker: Optional[asyncio.Task] = None
+# Presence goes out as join/update/leave deltas on the same tick, never as the whole client list
+presence_seq = 0
+# client_id -> "join", "update" or "leave" since the last tick; the client's state is read when sent
+pending_presence: Dict[str, str] = {}
+# Client ids in sorted order, so snapshot pages can resume after a cursor while clients come and go
+client_order: List[str] = []
+# A tick with more changes than this (a reconnect wave) sends a resync notice instead of the deltas
+MAX_PRESENCE_CHANGES = 256
+SNAPSHOT_PAGE_SIZE = 200
+MAX_SNAPSHOT_PAGE = 1000
+# Clients heartbeat this often; one silent for HEARTBEAT_TIMEOUT is shown offline
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TIMEOUT = 30
+presence_sweeper: Optional[asyncio.Task] = None
+# HTTP uploads have no connection whose loss ends them; one idle this long is failed and its .part removed
+UPLOAD_IDLE_TIMEOUT = 15 * 60
+UPLOAD_SWEEP_INTERVAL = 60
+upload_sweeper: Optional[asyncio.Task] = None
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+# Same metric families as the TCP path, told apart by transport="socketio"
+transfer_metrics = TransferMetrics(transport="socketio")
+clients_gauge = REGISTRY.gauge("socketlab_socketio_clients", "Connected Socket.IO clients")
+transfers_gauge = REGISTRY.gauge("socketlab_socketio_active_transfers", "Transfers in progress")
+chunks_counter = REGISTRY.counter("socketlab_socketio_chunks_total", "Chunks received, duplicates included")
+update_frames_counter = REGISTRY.counter("socketlab_socketio_update_frames_total", "Batched transfer_update frames sent")
+presence_frames_counter = REGISTRY.counter("socketlab_socketio_presence_frames_total", "Presence delta frames broadcast")
+presence_resyncs_counter = REGISTRY.counter("socketlab_socketio_presence_resyncs_total",
+                                            "Presence ticks sent as a resync notice instead of deltas")
 
 class ConnectionManager:
     def __init__(self):
@@ -49,55 +114,620 @@ manager = ConnectionManager()
 async def read_root():
     return {"status": "Python File Transfer Server"}
 
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/metrics/snapshot")
+async def metrics_snapshot():
+    # Percentiles and the recent time series, for dashboards without Prometheus
+    return REGISTRY.snapshot()
+
+def transfer_room(transfer_id: str) -> str:
+    return f"transfer:{transfer_id}"
+
+def user_room(user_id: str) -> str:
+    return f"user:{user_id}"
+
+def user_of(sid: Optional[str]) -> Optional[str]:
+    return clients[sid].user_id if sid in clients else None
+
+def room_members(room: str):
+    # Older python-socketio releases raise on rooms nobody has entered yet
+    if room not in sio.manager.rooms.get("/", {}):
+        return []
+    return [sid for sid, _ in sio.manager.get_participants("/", room)]
+
 @sio.event
 async def connect(sid, environ):
+    global presence_sweeper
     print(f"Client connected: {sid}")
-    clients[sid] = {
-        "id": sid,
-        "connected_at": datetime.now().isoformat(),
-        "ip": environ.get("REMOTE_ADDR", "unknown")
-    }
-    await sio.emit("clients_updated", list(clients.values()))
+    now = datetime.now()
+    # Until the client registers, it is a user of its own
+    clients[sid] = ClientInfo(client_id=sid, name=sid, ip=environ.get("REMOTE_ADDR", "unknown"),
+                              connected_at=now, last_seen=now, user_id=sid)
+    bisect.insort(client_order, sid)
+    await sio.enter_room(sid, user_room(sid))
+    clients_gauge.set(len(clients))
+    queue_presence(sid, "join")
+    if presence_sweeper is None or presence_sweeper.done():
+        presence_sweeper = asyncio.get_running_loop().create_task(sweep_presence())
+
+@sio.event
+async def register(sid, data):
+    # Every connection of one user shares that user's room, so each sees all of the user's transfers
+    user_id = str(data.get("user_id") or sid)
+    await sio.leave_room(sid, user_room(clients[sid].user_id))
+    await sio.enter_room(sid, user_room(user_id))
+    clients[sid].user_id = user_id
+    clients[sid].name = str(data.get("name", user_id))
+    queue_presence(sid, "update")
+    return {"status": "ok", "user_id": user_id}
+
+@sio.event
+async def heartbeat(sid, data=None):
+    client = clients.get(sid)
+    if client is None:
+        return {"status": "error", "message": "Unknown client"}
+    client.last_seen = datetime.now()
+    if not client.is_online:
+        client.is_online = True
+        queue_presence(sid, "update")
+    # The latest presence seq lets a client notice a lost last frame, which no later gap reveals
+    return {"status": "ok", "seq": presence_seq}
+
+@sio.event
+async def presence_snapshot(sid, data=None):
+    data = data or {}
+    return presence_page(data.get("cursor"), data.get("limit", SNAPSHOT_PAGE_SIZE))
+
+@sio.event
+async def subscribe(sid, data):
+    # Watch other transfers or users; returns their current state right away
+    transfer_ids = [str(transfer_id) for transfer_id in data.get("transfer_ids", [])]
+    for transfer_id in transfer_ids:
+        await sio.enter_room(sid, transfer_room(transfer_id))
+    for user_id in data.get("user_ids", []):
+        await sio.enter_room(sid, user_room(str(user_id)))
+    return {"transfers": [active_transfers[transfer_id] for transfer_id in transfer_ids
+                          if transfer_id in active_transfers]}
+
+@sio.event
+async def unsubscribe(sid, data):
+    for transfer_id in data.get("transfer_ids", []):
+        await sio.leave_room(sid, transfer_room(str(transfer_id)))
+    for user_id in data.get("user_ids", []):
+        if str(user_id) != clients[sid].user_id:
+            await sio.leave_room(sid, user_room(str(user_id)))
+    return {"status": "ok"}
 
 @sio.event
 async def disconnect(sid):
+    for session in [session for session in uploads.values() if session.sid == sid]:
+        await fail_upload(session, "client disconnected")
     if sid in clients:
         del clients[sid]
-        await sio.emit("clients_updated", list(clients.values()))
+        client_order.pop(bisect.bisect_left(client_order, sid))
+        clients_gauge.set(len(clients))
+        queue_presence(sid, "leave")
     print(f"Client disconnected: {sid}")
 
-@sio.event
-async def start_transfer(sid, data):
+def presence_page(cursor: Optional[str] = None, limit: int = SNAPSHOT_PAGE_SIZE) -> dict:
+    # One page of clients after `cursor`; apply presence frames with a higher seq on top of it
+    limit = max(1, min(int(limit), MAX_SNAPSHOT_PAGE))
+    start = bisect.bisect_right(client_order, cursor) if cursor else 0
+    page = client_order[start:start + limit]
+    more = start + limit < len(client_order)
+    return {
+        "seq": presence_seq,
+        "clients": [jsonable_encoder(clients[client_id]) for client_id in page],
+        "total": len(client_order),
+        "next_cursor": page[-1] if more else None,
+    }
+
+def queue_presence(client_id: str, change: str):
+    previous = pending_presence.get(client_id)
+    if change == "leave" and previous == "join":
+        # Came and went within one tick: nobody needs to hear about it
+        del pending_presence[client_id]
+    elif previous != "join":
+        # A join followed by updates is still one join, carrying the latest state
+        pending_presence[client_id] = change
+    schedule_tick()
+
+async def sweep_presence():
+    # Marks clients offline when their heartbeats stop; the transport's own pings drop dead connections
+    while clients:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        now = datetime.now()
+        for client in list(clients.values()):
+            if client.is_online and (now - client.last_seen).total_seconds() > HEARTBEAT_TIMEOUT:
+                client.is_online = False
+                queue_presence(client.client_id, "update")
+
+async def sweep_uploads():
+    # Socket.IO uploads end with their connection; HTTP ones end here once nothing arrives for a while
+    while any(session.sid is None for session in uploads.values()):
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL)
+        now = time.monotonic()
+        for session in list(uploads.values()):
+            # A range still streaming is not idle, however slowly its bytes come in
+            if session.sid is None and not session.streams and now - session.last_activity > UPLOAD_IDLE_TIMEOUT:
+                await fail_upload(session, f"no data for {UPLOAD_IDLE_TIMEOUT} s")
+
+@app.get("/clients")
+async def list_clients(cursor: Optional[str] = None, limit: int = SNAPSHOT_PAGE_SIZE):
+    return presence_page(cursor, limit)
+
+class UploadSession:
+    """One upload: a preallocated .part file written at arbitrary offsets, in any order.
+
+    Socket.IO chunks and HTTP ranges both land here; received bytes are tracked as
+    merged [start, end) ranges, so either kind of client can resume the other's upload.
+    """
+
+    def __init__(self, transfer_id: str, sid: Optional[str], file_name: str, size: int, chunk_size: int):
+        self.transfer_id = transfer_id
+        self.sid = sid
+        self.file_name = file_name
+        self.size = size
+        self.chunk_size = chunk_size
+        self.total_chunks = (size + chunk_size - 1) // chunk_size
+        self.part_path = os.path.join(UPLOAD_DIR, f".{transfer_id}.part")
+        self.ranges: List[List[int]] = []
+        # Chunks being written; a copy arriving meanwhile is a duplicate too
+        self.writing = set()
+        self.bytes_received = 0
+        self.chunks_received = 0
+        # HTTP ranges streaming through their own file handles; finishing waits them out
+        self.streams = 0
+        self.streams_done = asyncio.Event()
+        self.streams_done.set()
+        self.finishing = False
+        self.started = time.monotonic()
+        # Last data written or client request, for expiring abandoned HTTP uploads
+        self.last_activity = self.started
+        self.file = None
+        # aiofiles handles share one file position, so seek+write pairs must not interleave
+        self.lock = asyncio.Lock()
+
+    def expected_length(self, index: int) -> int:
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def mark(self, start: int, end: int):
+        # Merge [start, end) into the received ranges
+        merged = []
+        for low, high in self.ranges:
+            if high < start or low > end:
+                merged.append([low, high])
+            else:
+                start, end = min(start, low), max(end, high)
+        merged.append([start, end])
+        merged.sort()
+        self.ranges = merged
+        self.bytes_received = sum(high - low for low, high in merged)
+        self.chunks_received = sum(self.whole_chunks(low, high) for low, high in merged)
+        self.touch()
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def whole_chunks(self, start: int, end: int) -> int:
+        # Chunks lying entirely inside [start, end); the last chunk may be short
+        first = (start + self.chunk_size - 1) // self.chunk_size
+        last = self.total_chunks if end == self.size else end // self.chunk_size
+        return max(0, last - first)
+
+    def covers(self, start: int, end: int) -> bool:
+        return any(low <= start and end <= high for low, high in self.ranges)
+
+    def missing_ranges(self, limit: int = 100) -> List[List[int]]:
+        gaps = []
+        position = 0
+        for low, high in self.ranges + [[self.size, self.size]]:
+            if low > position:
+                gaps.append([position, low])
+            position = max(position, high)
+        return gaps[:limit]
+
+    def missing(self, limit: int = 100) -> List[int]:
+        # Chunk indexes not yet fully received, for Socket.IO clients
+        indexes = []
+        for low, high in self.missing_ranges(limit):
+            indexes.extend(range(low // self.chunk_size, (high + self.chunk_size - 1) // self.chunk_size))
+        return sorted(set(indexes))[:limit]
+
+    async def open(self):
+        await asyncio.to_thread(preallocate, self.part_path, self.size)
+        self.file = await aiofiles.open(self.part_path, "r+b")
+
+    async def write(self, offset: int, data: bytes):
+        async with self.lock:
+            if self.file is None:
+                raise ConnectionError("upload was closed")
+            await self.file.seek(offset)
+            await self.file.write(data)
+
+    async def close(self):
+        if self.file:
+            await self.file.close()
+            self.file = None
+
+    async def discard(self):
+        await self.close()
+        await asyncio.to_thread(remove_quietly, self.part_path)
+
+
+def preallocate(path: str, size: int):
+    # Reserve the blocks up front, so a full disk fails the start rather than a chunk
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if size and hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def credit_for(session: UploadSession) -> int:
+    # Chunks this upload may have unacknowledged; shrinks as uploads multiply or writes queue up
+    share = INFLIGHT_BUDGET // max(1, len(uploads)) // session.chunk_size
+    return max(1, min(MAX_CREDIT, share - len(session.writing)))
+
+
+def valid_transfer_id(transfer_id) -> bool:
+    # It names the .part file, so nothing that could be a path
+    return (isinstance(transfer_id, str) and 0 < len(transfer_id) <= 64 and transfer_id.isascii()
+            and transfer_id.replace("-", "").isalnum())
+
+
+def parse_content_range(header: str, size: int):
+    # "bytes START-END/TOTAL" with END inclusive; returns [start, end)
+    match = CONTENT_RANGE.fullmatch(header.strip())
+    if not match:
+        raise ValueError(f"Content-Range must look like 'bytes START-END/{size}'")
+    start, last = int(match.group(1)), int(match.group(2))
+    if match.group(3) != "*" and int(match.group(3)) != size:
+        raise ValueError(f"Content-Range total {match.group(3)} does not match the upload size {size}")
+    if start > last or last >= size:
+        raise ValueError(f"range {start}-{last} is outside 0-{size - 1}")
+    return start, last + 1
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def publish(part_path: str, file_name: str) -> str:
+    # Never overwrite an earlier upload of the same name
+    stem, suffix = os.path.splitext(file_name)
+    path = os.path.join(UPLOAD_DIR, file_name)
+    counter = 1
+    while os.path.exists(path):
+        path = os.path.join(UPLOAD_DIR, f"{stem} ({counter}){suffix}")
+        counter += 1
+    os.replace(part_path, path)
+    return path
+
+
+def update_progress(session: UploadSession):
+    elapsed = time.monotonic() - session.started
+    bytes_per_second = session.bytes_received / max(elapsed, 1e-3)
+    active_transfers[session.transfer_id].update({
+        "progress": session.bytes_received / session.size * 100 if session.size else 100,
+        "speed": bytes_per_second,
+        "bytes_transferred": session.bytes_received,
+        "chunks_received": session.chunks_received,
+        "time_remaining": (session.size - session.bytes_received) / max(bytes_per_second, 1)
+    })
+
+
+def queue_update(transfer_id: str):
+    # Cheap enough to call per chunk: the change goes out with the next tick's batch
+    dirty_transfers.add(transfer_id)
+    schedule_tick()
+
+
+def schedule_tick():
+    global update_ticker
+    if update_ticker is None or update_ticker.done():
+        update_ticker = asyncio.get_running_loop().create_task(broadcast_updates())
+
+
+async def broadcast_updates():
+    # Runs only while there is something to send
+    while dirty_transfers or pending_presence:
+        await asyncio.sleep(UPDATE_TICK)
+        await flush_updates()
+        await flush_presence()
+
+
+async def flush_updates():
+    changed = list(dirty_transfers)
+    dirty_transfers.clear()
+    batches: Dict[str, List[dict]] = {}
+    for transfer_id in changed:
+        transfer = active_transfers.get(transfer_id)
+        if transfer is None:
+            continue
+        if transfer_id in uploads:
+            update_progress(uploads[transfer_id])
+        # Subscribers of the transfer and every connection of its owner, each once
+        recipients = set(room_members(transfer_room(transfer_id)))
+        if transfer.get("user_id"):
+            recipients.update(room_members(user_room(transfer["user_id"])))
+        for sid in recipients:
+            batches.setdefault(sid, []).append(dict(transfer))
+    for sid, transfers in batches.items():
+        update_frames_counter.inc()
+        await sio.emit("transfer_update", {"transfers": transfers}, to=sid)
+
+
+async def flush_presence():
+    # One frame per tick to everyone, however many clients came and went: O(clients) sends, not O(clients²)
+    global presence_seq
+    if not pending_presence:
+        return
+    changed = dict(pending_presence)
+    pending_presence.clear()
+    presence_seq += 1
+    presence_frames_counter.inc()
+    if len(changed) > MAX_PRESENCE_CHANGES:
+        # A connection storm: a tiny notice now, and clients page in a snapshot when they are ready
+        presence_resyncs_counter.inc()
+        await sio.emit("presence", {"seq": presence_seq, "resync": True, "total": len(clients)})
+        return
+    changes = []
+    for client_id, change in changed.items():
+        if change == "leave":
+            changes.append({"op": "leave", "client_id": client_id})
+        elif client_id in clients:
+            changes.append({"op": change, "client": jsonable_encoder(clients[client_id])})
+    await sio.emit("presence", {"seq": presence_seq, "changes": changes})
+
+
+async def fail_upload(session: UploadSession, error: str):
+    uploads.pop(session.transfer_id, None)
+    session.finishing = True
+    await session.streams_done.wait()
+    await session.discard()
+    transfers_gauge.dec()
+    active_transfers[session.transfer_id].update({"status": "failed", "error": error})
+    queue_update(session.transfer_id)
+
+
+async def start_upload(sid: Optional[str], data: dict, user_id: Optional[str] = None) -> dict:
     transfer_id = data.get("transfer_id")
+    file_name = os.path.basename(str(data.get("file_name", "")))
+    size = data.get("size")
+    chunk_size = data.get("chunk_size", DEFAULT_CHUNK_SIZE)
+    if not valid_transfer_id(transfer_id) or not file_name or file_name in (".", ".."):
+        return {"status": "error", "error": "a transfer_id (letters, digits, '-') and file_name are required"}
+    if not isinstance(size, int) or size < 0:
+        return {"status": "error", "error": "size must be a non-negative integer"}
+    if not isinstance(chunk_size, int) or not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        return {"status": "error", "error": f"chunk_size must be between 1 and {MAX_CHUNK_SIZE} bytes"}
+    if transfer_id in uploads:
+        # A retried start after a lost acknowledgement, or a resume
+        session = uploads[transfer_id]
+        session.touch()
+        return {"status": "ok", "transfer_id": transfer_id, "chunk_size": session.chunk_size,
+                "missing": session.missing(), "missing_ranges": session.missing_ranges(),
+                "credit": credit_for(session)}
+
+    session = UploadSession(transfer_id, sid, file_name, size, chunk_size)
+    try:
+        await session.open()
+    except OSError as e:
+        await asyncio.to_thread(remove_quietly, session.part_path)
+        return {"status": "error", "error": f"cannot allocate {size} bytes: {e.strerror}"}
+    uploads[transfer_id] = session
     active_transfers[transfer_id] = {
         **data,
+        "file_name": file_name,
+        "user_id": user_id or user_of(sid),
         "status": "in-progress",
         "progress": 0,
         "start_time": datetime.now().isoformat(),
         "bytes_transferred": 0,
-        "chunks_received": 0
+        "chunks_received": 0,
+        "total_chunks": session.total_chunks
     }
-    await sio.emit("transfer_update", active_transfers[transfer_id])
+    transfers_gauge.inc()
+    queue_update(transfer_id)
+    if sid is None:
+        schedule_upload_sweep()
+    return {"status": "ok", "transfer_id": transfer_id, "chunk_size": chunk_size, "missing": session.missing(),
+            "missing_ranges": session.missing_ranges(), "credit": credit_for(session)}
+
+
+def schedule_upload_sweep():
+    global upload_sweeper
+    if upload_sweeper is None or upload_sweeper.done():
+        upload_sweeper = asyncio.get_running_loop().create_task(sweep_uploads())
+
+
+async def finish_upload(transfer_id: str, checksum: str) -> dict:
+    session = uploads.get(transfer_id)
+    if session is None:
+        transfer = active_transfers.get(transfer_id)
+        if transfer and transfer["status"] == "completed":
+            return {"status": "completed", "checksum": transfer["checksum"], "path": transfer["path"]}  # a retried finish
+        return {"status": "error", "error": "unknown transfer"}
+    if session.missing_ranges():
+        # Not finished yet; the client re-sends these and finishes again
+        return {"status": "incomplete", "missing": session.missing(), "missing_ranges": session.missing_ranges()}
+
+    uploads.pop(transfer_id)
+    # Ranges still streaming can only be re-sends now; they stop at their next write
+    session.finishing = True
+    await session.streams_done.wait()
+    await session.close()
+    async with hash_slots:
+        digest = await asyncio.to_thread(file_digest, session.part_path)
+    expected = str(checksum or "").lower()
+    if digest != expected:
+        await fail_upload(session, f"checksum mismatch: expected {expected[:16]}..., got {digest[:16]}...")
+        return {"status": "failed", "error": "checksum mismatch", "checksum": digest}
+
+    path = await asyncio.to_thread(publish, session.part_path, session.file_name)
+    elapsed = time.monotonic() - session.started
+    transfers_gauge.dec()
+    transfer_metrics.record("received", 1, session.size, elapsed)
+    update_progress(session)
+    active_transfers[transfer_id].update({
+        "status": "completed",
+        "progress": 100,
+        "time_remaining": 0,
+        "checksum": digest,
+        "path": path,
+        "end_time": datetime.now().isoformat()
+    })
+    queue_update(transfer_id)
+    return {"status": "completed", "checksum": digest, "path": path}
+
+
+@sio.event
+async def start_transfer(sid, data):
+    return await start_upload(sid, data)
 
 @sio.event
 async def chunk_upload(sid, data):
+    # The return value is the client's acknowledgement for this chunk
     transfer_id = data.get("transfer_id")
-    if transfer_id in active_transfers:
-        transfer = active_transfers[transfer_id]
-        now = datetime.now()
-        time_elapsed = (now - datetime.fromisoformat(transfer["start_time"])).total_seconds()
-        bytes_per_second = data.get("bytes_transferred", 0) / max(time_elapsed, 1)
-        
-        active_transfers[transfer_id].update({
-            "progress": data.get("progress", 0),
-            "status": "completed" if data.get("progress", 0) == 100 else "in-progress",
-            "speed": bytes_per_second,
-            "bytes_transferred": data.get("bytes_transferred", 0),
-            "chunks_received": transfer.get("chunks_received", 0) + 1,
-            "time_remaining": 0 if data.get("progress", 0) == 100 else 
-                           (transfer["size"] - data.get("bytes_transferred", 0)) / max(bytes_per_second, 1)
-        })
-        await sio.emit("transfer_update", active_transfers[transfer_id])
+    index = data.get("index")
+    payload = data.get("data")
+    session = uploads.get(transfer_id)
+    if session is None:
+        return {"status": "error", "index": index, "error": "unknown transfer"}
+    if not isinstance(index, int) or not 0 <= index < session.total_chunks:
+        return {"status": "error", "index": index, "error": "chunk index out of range"}
+    if not isinstance(payload, (bytes, bytearray)) or len(payload) != session.expected_length(index):
+        return {"status": "error", "index": index,
+                "error": f"chunk {index} must be {session.expected_length(index)} bytes of binary data"}
+    chunks_counter.inc()
+    offset = index * session.chunk_size
+    if session.covers(offset, offset + len(payload)) or index in session.writing:
+        # Retransmitted after a lost acknowledgement; the bytes are already on disk
+        return {"status": "ok", "index": index, "duplicate": True, "credit": credit_for(session)}
+
+    session.writing.add(index)
+    try:
+        await session.write(offset, payload)
+    except (OSError, ConnectionError) as e:
+        return {"status": "error", "index": index, "error": str(e), "credit": 1}
+    finally:
+        session.writing.discard(index)
+    session.mark(offset, offset + len(payload))
+    queue_update(transfer_id)
+    return {"status": "ok", "index": index, "received": session.chunks_received, "credit": credit_for(session)}
+
+@sio.event
+async def finish_transfer(sid, data):
+    return await finish_upload(data.get("transfer_id"), data.get("checksum"))
+
+# Streaming HTTP uploads: better suited than Socket.IO events to multi-GB files
+
+@app.post("/uploads")
+async def create_upload(request: Request):
+    data = await request.json()
+    data.setdefault("transfer_id", str(uuid.uuid4()))
+    # HTTP clients name their user to have progress reach that user's Socket.IO room
+    result = await start_upload(None, data, user_id=str(data["user_id"]) if data.get("user_id") else None)
+    if result["status"] != "ok":
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+@app.get("/uploads/{transfer_id}")
+async def upload_status(transfer_id: str):
+    session = uploads.get(transfer_id)
+    if session is None:
+        if transfer_id in active_transfers:
+            return active_transfers[transfer_id]
+        raise HTTPException(status_code=404, detail="unknown transfer")
+    # A client checking where to resume from is still there
+    session.touch()
+    return {"transfer_id": transfer_id, "status": "in-progress", "size": session.size,
+            "bytes_received": session.bytes_received, "received_ranges": session.ranges,
+            "missing_ranges": session.missing_ranges()}
+
+@app.put("/uploads/{transfer_id}")
+async def upload_range(transfer_id: str, request: Request):
+    """Stream the body to disk at the offset given by Content-Range (the whole file without one).
+
+    Memory per request stays at one write buffer however large the range. Several ranges
+    of one upload may stream in parallel; each request writes through its own file handle
+    and is counted in session.streams, so finishing the upload waits until none is writing.
+    """
+    session = uploads.get(transfer_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="unknown transfer")
+    try:
+        start, end = (parse_content_range(request.headers["content-range"], session.size)
+                      if "content-range" in request.headers else (0, session.size))
+    except ValueError as e:
+        raise HTTPException(status_code=416, detail=str(e))
+
+    position = start
+    buffer = bytearray()
+
+    async def flush(f):
+        nonlocal position
+        if session.finishing:
+            raise HTTPException(status_code=409, detail="the upload is already finishing")
+        await f.write(buffer)
+        session.mark(position, position + len(buffer))
+        position += len(buffer)
+        buffer.clear()
+        queue_update(transfer_id)
+
+    session.streams += 1
+    session.streams_done.clear()
+    session.touch()
+    try:
+        async with aiofiles.open(session.part_path, "r+b") as f:
+            await f.seek(start)
+            try:
+                async for piece in request.stream():
+                    if position + len(buffer) + len(piece) > end:
+                        raise HTTPException(status_code=400,
+                                            detail=f"body is longer than the range {start}-{end - 1}")
+                    buffer += piece
+                    if len(buffer) >= STREAM_WRITE_SIZE:
+                        await flush(f)
+            except ClientDisconnect:
+                pass  # what arrived is kept; the client resumes from upload_status
+            if buffer:
+                await flush(f)
+    finally:
+        session.streams -= 1
+        if not session.streams:
+            session.streams_done.set()
+    if position != end:
+        raise HTTPException(status_code=400, detail=f"body ended at byte {position}, range ends at {end}")
+    return {"transfer_id": transfer_id, "bytes_received": session.bytes_received,
+            "missing_ranges": session.missing_ranges()}
+
+@app.post("/uploads/{transfer_id}/finish")
+async def finish_http_upload(transfer_id: str, request: Request):
+    data = await request.json()
+    result = await finish_upload(transfer_id, data.get("checksum"))
+    status_codes = {"completed": 200, "incomplete": 409, "failed": 422, "error": 404}
+    if result["status"] != "completed":
+        raise HTTPException(status_code=status_codes[result["status"]], detail=result)
+    return result
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
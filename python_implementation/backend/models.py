@@ -29,6 +29,7 @@ class ClientInfo(BaseModel):
     connected_at: datetime
     last_seen: datetime
     is_online: bool = True
+    user_id: Optional[str] = None
 
 class TransferUpdate(BaseModel):
     transfer_id: str
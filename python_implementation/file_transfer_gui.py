@@ -3,15 +3,26 @@ import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
-import time
-import hashlib
 from datetime import datetime
-import json
 import platform
 import subprocess
 import ipaddress
 from pathlib import Path
 import queue
+import time
+import uuid
+from socketlab import EventBus, FileSender, ReceiverEngine, TransferStats
+from socketlab.events import DEFAULT_TICK_MS
+from socketlab.archive import scan_tree
+from socketlab.chunkstore import DEFAULT_MAX_AGE, DEFAULT_MAX_BYTES, ChunkStore
+from socketlab.compression import COMPRESSION_MODES
+from socketlab.discovery import Announcer, PeerListener
+from socketlab.metrics import REGISTRY
+from socketlab.probe import LinkProbe, ProbeCache, describe_recommendation, recommended_profile
+from socketlab.ratelimit import DEFAULT_PRIORITY, PRIORITY_WEIGHTS, RateLimiter, parse_rate
+from socketlab.receiver import DEFAULT_BACKLOG
+from socketlab.scanner import NetworkScanner, hosts_in
+from socketlab.tuning import PROFILES, get_profile
 
 class FileTransferGUI:
     def __init__(self, root):
@@ -33,28 +44,50 @@ class FileTransferGUI:
         }
         
         # Network configuration
-        self.server_socket = None
-        self.client_socket = None
+        self.receiver = None
         self.is_server_running = False
-        self.is_client_connected = False
         self.transfer_queue = queue.Queue()
+        # Worker threads publish here; the Tk thread drains it on a fixed tick
+        self.events = EventBus(self.transfer_queue)
         
         # Student information
         self.student_id = tk.StringVar(value="LS2025001")
         self.partner_ip = tk.StringVar(value="192.168.1.100")
         self.port = tk.IntVar(value=8888)
+        self.parallel_streams = tk.IntVar(value=1)
+        self.listen_backlog = tk.IntVar(value=DEFAULT_BACKLOG)
+        self.socket_profile = tk.StringVar(value='default')
+        self.compression = tk.StringVar(value='auto')
+        self.delta_sync = tk.BooleanVar(value=False)
+        self.dedup = tk.BooleanVar(value=False)
+        # Limits for the chunk store, so it cannot grow without bound; blank means no limit
+        self.store_max_size = tk.StringVar(value=f"{DEFAULT_MAX_BYTES / 1024 ** 3:g}")
+        self.store_max_age = tk.StringVar(value=f"{DEFAULT_MAX_AGE / 86400:g}")
+        self.total_rate_limit = tk.StringVar(value='')
+        self.peer_rate_limit = tk.StringVar(value='')
+        self.transfer_rate_limit = tk.StringVar(value='')
+        self.priority = tk.StringVar(value=DEFAULT_PRIORITY)
+        # Shared by the server and every send, so limits apply to all traffic and can change mid-transfer
+        self.rate_limiter = RateLimiter()
+        # Kept across scans so recent results are answered from its cache
+        self.scanner = NetworkScanner(self.port.get())
+        self.scanning = False
+        # Identifies our own announcements so we never list ourselves as a peer
+        self.node_id = uuid.uuid4().hex[:12]
+        self.announcer = None
+        self.peer_listener = None
+        self.discovered_peers = []
+        # Socket profiles recommended by link probes, by name, alongside the built-in ones
+        self.probed_profiles = {}
+        self.probe_cache = ProbeCache()
         
         # Transfer statistics
-        self.transfer_stats = {
-            'files_sent': 0,
-            'files_received': 0,
-            'bytes_transferred': 0,
-            'transfer_time': 0,
-            'transfer_speed': 0
-        }
+        self.stats = TransferStats()
         
         self.setup_ui()
         self.get_local_ip()
+        self.start_discovery()
+        self.process_events()
         
     def setup_ui(self):
         # Main container
@@ -127,9 +160,77 @@ class FileTransferGUI:
         tk.Entry(network_frame, textvariable=self.port, width=20, 
                 bg=self.colors['accent'], fg=self.colors['text']).grid(row=1, column=1, padx=10, pady=10)
         
+        tk.Label(network_frame, text="Parallel Streams:", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=2, column=0, padx=10, pady=10, sticky='w')
+        tk.Spinbox(network_frame, from_=1, to=16, textvariable=self.parallel_streams, width=18, 
+                  bg=self.colors['accent'], fg=self.colors['text']).grid(row=2, column=1, padx=10, pady=10)
+        
         self.local_ip_label = tk.Label(network_frame, text="Local IP: Detecting...", 
                                        bg=self.colors['secondary'], fg=self.colors['success'])
-        self.local_ip_label.grid(row=2, column=0, columnspan=2, padx=10, pady=10)
+        tk.Label(network_frame, text="Listen Backlog:", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=3, column=0, padx=10, pady=10, sticky='w')
+        tk.Entry(network_frame, textvariable=self.listen_backlog, width=20, 
+                bg=self.colors['accent'], fg=self.colors['text']).grid(row=3, column=1, padx=10, pady=10)
+        
+        tk.Label(network_frame, text="Socket Profile:", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=4, column=0, padx=10, pady=10, sticky='w')
+        self.profile_combo = ttk.Combobox(network_frame, textvariable=self.socket_profile, values=list(PROFILES), 
+                                          state='readonly', width=17)
+        self.profile_combo.grid(row=4, column=1, padx=10, pady=10)
+        
+        tk.Label(network_frame, text="Compression:", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=5, column=0, padx=10, pady=10, sticky='w')
+        ttk.Combobox(network_frame, textvariable=self.compression, values=COMPRESSION_MODES, 
+                     state='readonly', width=17).grid(row=5, column=1, padx=10, pady=10)
+        
+        tk.Checkbutton(network_frame, text="Delta sync (send only changes to the partner's copy)", 
+                      variable=self.delta_sync, bg=self.colors['secondary'], fg=self.colors['text'], 
+                      selectcolor=self.colors['accent']).grid(row=6, column=0, columnspan=2, padx=10, pady=10, sticky='w')
+        
+        tk.Checkbutton(network_frame, text="Deduplicate with a chunk store (received_files/.chunks)", 
+                      variable=self.dedup, bg=self.colors['secondary'], fg=self.colors['text'], 
+                      selectcolor=self.colors['accent']).grid(row=7, column=0, columnspan=2, padx=10, pady=10, sticky='w')
+        
+        tk.Label(network_frame, text="Store Max Size (GB):", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=8, column=0, padx=10, pady=10, sticky='w')
+        tk.Entry(network_frame, textvariable=self.store_max_size, width=20, 
+                bg=self.colors['accent'], fg=self.colors['text']).grid(row=8, column=1, padx=10, pady=10)
+        
+        tk.Label(network_frame, text="Store Max Age (days):", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=9, column=0, padx=10, pady=10, sticky='w')
+        tk.Entry(network_frame, textvariable=self.store_max_age, width=20, 
+                bg=self.colors['accent'], fg=self.colors['text']).grid(row=9, column=1, padx=10, pady=10)
+        
+        tk.Label(network_frame, text="Total Limit (MB/s):", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=10, column=0, padx=10, pady=10, sticky='w')
+        tk.Entry(network_frame, textvariable=self.total_rate_limit, width=20, 
+                bg=self.colors['accent'], fg=self.colors['text']).grid(row=10, column=1, padx=10, pady=10)
+        
+        tk.Label(network_frame, text="Per-Peer Limit (MB/s):", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=11, column=0, padx=10, pady=10, sticky='w')
+        tk.Entry(network_frame, textvariable=self.peer_rate_limit, width=20, 
+                bg=self.colors['accent'], fg=self.colors['text']).grid(row=11, column=1, padx=10, pady=10)
+        
+        tk.Label(network_frame, text="Per-Transfer Limit (MB/s):", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=12, column=0, padx=10, pady=10, sticky='w')
+        tk.Entry(network_frame, textvariable=self.transfer_rate_limit, width=20, 
+                bg=self.colors['accent'], fg=self.colors['text']).grid(row=12, column=1, padx=10, pady=10)
+        
+        tk.Label(network_frame, text="Priority:", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=13, column=0, padx=10, pady=10, sticky='w')
+        ttk.Combobox(network_frame, textvariable=self.priority, values=list(PRIORITY_WEIGHTS), 
+                     state='readonly', width=17).grid(row=13, column=1, padx=10, pady=10)
+        
+        tk.Button(network_frame, text="🚦 Apply Limits", command=self.apply_rate_limits, 
+                 bg=self.colors['accent'], fg=self.colors['text']).grid(row=14, column=0, columnspan=2, padx=10, pady=10)
+        
+        self.local_ip_label.grid(row=15, column=0, columnspan=2, padx=10, pady=10)
+        
+        tk.Label(network_frame, text="🛰️ Discovered Peers (click to use):", bg=self.colors['secondary'], 
+                fg=self.colors['text']).grid(row=0, column=2, padx=10, pady=10, sticky='w')
+        self.peer_list = tk.Listbox(network_frame, width=42, bg=self.colors['accent'], fg=self.colors['text'])
+        self.peer_list.grid(row=1, column=2, rowspan=14, padx=10, pady=10, sticky='nsew')
+        self.peer_list.bind('<<ListboxSelect>>', self.choose_peer)
         
         # Action buttons
         button_frame = tk.Frame(config_container, bg=self.colors['secondary'])
@@ -197,9 +298,16 @@ class FileTransferGUI:
                                             bg=self.colors['secondary'], fg=self.colors['text'])
         self.selected_file_label.pack(pady=10)
         
-        tk.Button(file_frame, text="📂 Choose File", command=self.choose_file,
+        choose_frame = tk.Frame(file_frame, bg=self.colors['secondary'])
+        choose_frame.pack(pady=5)
+        
+        tk.Button(choose_frame, text="📂 Choose File", command=self.choose_file,
                  bg=self.colors['primary'], fg=self.colors['text'], 
-                 font=('Arial', 10, 'bold')).pack(pady=5)
+                 font=('Arial', 10, 'bold')).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(choose_frame, text="🗂️ Choose Folder", command=self.choose_folder,
+                 bg=self.colors['primary'], fg=self.colors['text'], 
+                 font=('Arial', 10, 'bold')).pack(side=tk.LEFT, padx=5)
         
         # Send controls
         send_frame = tk.Frame(client_container, bg=self.colors['secondary'])
@@ -240,7 +348,7 @@ class FileTransferGUI:
                                    fg=self.colors['text'])
         stats_frame.pack(fill=tk.X, pady=(0, 20))
         
-        self.stats_text = tk.Text(stats_frame, height=10, bg=self.colors['accent'], 
+        self.stats_text = tk.Text(stats_frame, height=16, bg=self.colors['accent'], 
                                   fg=self.colors['text'], font=('Consolas', 10))
         self.stats_text.pack(fill=tk.X, padx=10, pady=10)
         
@@ -287,6 +395,10 @@ class FileTransferGUI:
                  bg=self.colors['warning'], fg=self.colors['text'], 
                  font=('Arial', 10, 'bold')).pack(side=tk.LEFT, padx=5)
         
+        tk.Button(ip_frame, text="📶 Probe Link", command=self.probe_link,
+                 bg=self.colors['primary'], fg=self.colors['text'], 
+                 font=('Arial', 10, 'bold')).pack(side=tk.LEFT, padx=5)
+        
         # Tools output
         output_frame = tk.LabelFrame(tools_container, text="📋 Tools Output", 
                                     font=('Arial', 12, 'bold'), bg=self.colors['secondary'], 
@@ -362,6 +474,17 @@ File integrity checksum will be calculated upon transfer.
             self.selected_file_label.config(text=f"📄 {os.path.basename(filename)} ({file_size} bytes)")
             self.log_to_client(f"📁 File selected: {filename}")
             
+    def choose_folder(self):
+        folder = filedialog.askdirectory(title="Choose folder to send")
+        
+        if folder:
+            self.selected_file = folder
+            entries, _ = scan_tree(folder)
+            files = [entry for entry in entries if entry['type'] == 'file']
+            total_size = sum(entry['size'] for entry in files)
+            self.selected_file_label.config(text=f"🗂️ {os.path.basename(folder)} ({len(files)} files, {total_size} bytes)")
+            self.log_to_client(f"🗂️ Folder selected: {folder} ({len(files)} files)")
+            
     def toggle_server(self):
         if not self.is_server_running:
             self.start_server()
@@ -371,10 +494,18 @@ File integrity checksum will be calculated upon transfer.
     def start_server(self):
         try:
             port = self.port.get()
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind(('', port))
-            self.server_socket.listen(1)
+            self.receiver = ReceiverEngine(
+                port,
+                backlog=self.listen_backlog.get(),
+                profile=self.selected_profile(),
+                chunk_store=self.build_chunk_store() if self.dedup.get() else None,
+                rate_limiter=self.rate_limiter,
+                stats=self.stats,
+                on_log=self.log_to_server,
+                on_progress=lambda p: self.events.coalesce('server_progress', self.update_server_progress, p),
+                on_file_received=lambda *args: self.events.coalesce('stats', self.update_stats)
+            )
+            self.receiver.start()
             
             self.is_server_running = True
             self.server_button.config(text="⏹️ Stop Server", bg=self.colors['error'])
@@ -382,23 +513,43 @@ File integrity checksum will be calculated upon transfer.
             self.server_progress.start(10)
             
             self.log_to_server(f"🚀 File receiver server started, port: {port}")
-            self.log_to_server(f"⏳ Waiting for partner to send file...")
+            self.log_to_server(f"⚙️ Socket profile {self.receiver.profile.describe()}")
+            self.log_to_server(f"🚦 Rate limits: {self.rate_limiter.describe()}")
             
-            # Start server thread
-            server_thread = threading.Thread(target=self.server_accept_loop, daemon=True)
-            server_thread.start()
+            try:
+                self.announcer = Announcer(self.node_id, self.receiver.port, name=self.student_id.get(),
+                                           capabilities=self.receiver.capabilities())
+                self.announcer.start()
+                self.log_to_server(f"🛰️ Announcing this server to peers on the local network")
+            except OSError as e:
+                self.announcer = None
+                self.log_to_server(f"⚠️ Could not announce this server: {e}")
+            self.log_to_server(f"⏳ Waiting for partner to send file...")
             
         except Exception as e:
+            self.receiver = None
             self.log_to_server(f"❌ Error starting server: {e}")
             messagebox.showerror("Error", f"Failed to start server: {e}")
             
+    def build_chunk_store(self):
+        try:
+            size = self.store_max_size.get().strip()
+            age = self.store_max_age.get().strip()
+            max_bytes = int(float(size) * 1024 ** 3) if size else None
+            max_age = float(age) * 86400 if age else None
+        except ValueError:
+            raise ValueError("chunk store limits must be numbers of GB and days (leave blank for no limit)")
+        return ChunkStore(os.path.join('received_files', '.chunks'), max_bytes=max_bytes, max_age=max_age)
+        
     def stop_server(self):
         try:
             self.is_server_running = False
-            if self.server_socket:
-                self.server_socket.close()
-            if self.client_socket:
-                self.client_socket.close()
+            if self.announcer:
+                self.announcer.stop()
+                self.announcer = None
+            if self.receiver:
+                self.receiver.stop()
+                self.receiver = None
                 
             self.server_button.config(text="🚀 Start Server", bg=self.colors['success'])
             self.server_status.config(text="⚪ Server Stopped", fg=self.colors['warning'])
@@ -409,193 +560,91 @@ File integrity checksum will be calculated upon transfer.
         except Exception as e:
             self.log_to_server(f"❌ Error stopping server: {e}")
             
-    def server_accept_loop(self):
-        while self.is_server_running:
-            try:
-                self.server_socket.settimeout(1.0)
-                client_socket, address = self.server_socket.accept()
-                
-                self.client_socket = client_socket
-                self.is_client_connected = True
-                
-                self.log_to_server(f"📡 Connection received from {address}")
-                
-                # Handle file reception in separate thread
-                receive_thread = threading.Thread(target=self.receive_file, args=(client_socket, address), daemon=True)
-                receive_thread.start()
-                
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self.is_server_running:
-                    self.log_to_server(f"❌ Server error: {e}")
-                break
-                
-    def receive_file(self, client_socket, address):
+    def start_discovery(self):
         try:
-            # Receive file metadata
-            metadata = client_socket.recv(1024).decode('utf-8')
-            metadata_dict = json.loads(metadata)
-            
-            filename = metadata_dict['filename']
-            filesize = metadata_dict['filesize']
-            checksum = metadata_dict['checksum']
-            
-            self.log_to_server(f"📄 Starting to receive file: {filename}")
-            self.log_to_server(f"📏 File size: {filesize} bytes")
-            
-            # Create received_files directory
-            os.makedirs('received_files', exist_ok=True)
-            
-            # Receive file data
-            received_data = b''
-            bytes_received = 0
-            
-            start_time = time.time()
-            
-            while bytes_received < filesize:
-                chunk = client_socket.recv(4096)
-                if not chunk:
-                    break
-                received_data += chunk
-                bytes_received += len(chunk)
-                
-                # Update progress (calculate percentage)
-                progress = (bytes_received / filesize) * 100
-                self.root.after(0, lambda p=progress: self.update_server_progress(p))
-                
-            end_time = time.time()
-            transfer_time = end_time - start_time
-            
-            # Save file
-            filepath = os.path.join('received_files', filename)
-            with open(filepath, 'wb') as f:
-                f.write(received_data)
-                
-            # Verify checksum
-            received_checksum = hashlib.md5(received_data).hexdigest()
-            
-            self.log_to_server(f"✅ Reception completed! Time: {datetime.now().strftime('%H:%M, %m/%d/%Y')}")
-            self.log_to_server(f"💾 File saved: received_files/{filename}")
-            
-            if received_checksum == checksum:
-                self.log_to_server(f"✅ File integrity verified! Checksum: {checksum[:8]}...")
-                self.log_to_server(f"🎉 File received successfully!")
-            else:
-                self.log_to_server(f"⚠️ Checksum mismatch! Expected: {checksum[:8]}..., Got: {received_checksum[:8]}...")
-                
-            # Update statistics
-            self.transfer_stats['files_received'] += 1
-            self.transfer_stats['bytes_transferred'] += filesize
-            self.transfer_stats['transfer_time'] += transfer_time
-            if transfer_time > 0:
-                self.transfer_stats['transfer_speed'] = filesize / transfer_time / 1024  # KB/s
-                
-            self.update_stats()
-            
-            # Send acknowledgment
-            ack = f"FILE_RECEIVED:{len(received_data)}".encode('utf-8')
-            client_socket.send(ack)
-            
-        except Exception as e:
-            self.log_to_server(f"❌ Error receiving file: {e}")
-        finally:
-            client_socket.close()
-            self.is_client_connected = False
-            self.root.after(0, lambda: self.update_server_progress(0))
+            self.peer_listener = PeerListener(
+                ignore={self.node_id},
+                on_change=lambda peers: self.events.coalesce('peers', self.update_peer_list, peers)
+            )
+            self.peer_listener.start()
+        except OSError as e:
+            self.peer_listener = None
+            self.log_to_tools(f"⚠️ Peer discovery unavailable: {e}")
+            
+    def update_peer_list(self, peers):
+        self.discovered_peers = peers
+        self.peer_list.delete(0, tk.END)
+        for peer in peers:
+            self.peer_list.insert(tk.END, f"{peer['name']}  {peer['host']}:{peer['port']}")
+            
+    def choose_peer(self, event=None):
+        selection = self.peer_list.curselection()
+        if not selection or selection[0] >= len(self.discovered_peers):
+            return
+        peer = self.discovered_peers[selection[0]]
+        self.partner_ip.set(peer['host'])
+        self.port.set(peer['port'])
+        self.log_to_tools(f"🛰️ Partner set to {peer['name']} at {peer['host']}:{peer['port']}")
+        
+    def apply_rate_limits(self):
+        # Blank or 0 means unlimited; running transfers pick up the new rates immediately
+        try:
+            total = self.total_rate_limit.get().strip()
+            peer = self.peer_rate_limit.get().strip()
+            transfer = self.transfer_rate_limit.get().strip()
+            self.rate_limiter.set_global_rate(parse_rate(f"{total}M") if total else None)
+            self.rate_limiter.set_peer_rate(parse_rate(f"{peer}M") if peer else None)
+            self.rate_limiter.set_transfer_rate(parse_rate(f"{transfer}M") if transfer else None)
+            self.log_to_tools(f"🚦 Rate limits: {self.rate_limiter.describe()}")
+        except ValueError:
+            messagebox.showerror("Error", "Rate limits must be numbers of MB/s (leave blank for unlimited)")
             
     def send_file(self):
         if not hasattr(self, 'selected_file'):
             messagebox.showwarning("Warning", "Please select a file first!")
             return
             
+        # Keep the Tk main loop free while the transfer runs
+        send_thread = threading.Thread(target=self.send_file_worker,
+                                       args=([self.selected_file], self.partner_ip.get(), self.port.get(),
+                                             self.parallel_streams.get(), self.selected_profile(),
+                                             self.compression.get(), self.delta_sync.get(), self.dedup.get(),
+                                             self.priority.get()),
+                                       daemon=True)
+        send_thread.start()
+        
+    def send_file_worker(self, paths, partner_ip, port, streams=1, profile=None, compression='off', delta=False,
+                         dedup=False, priority=DEFAULT_PRIORITY):
         try:
-            partner_ip = self.partner_ip.get()
-            port = self.port.get()
-            
-            self.client_status.config(text="🟡 Connecting...", fg=self.colors['warning'])
-            self.log_to_client(f"🔗 Connecting to partner computer {partner_ip}:{port}...")
-            
-            # Create client socket
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.connect((partner_ip, port))
-            
-            self.client_status.config(text="🟢 Connected", fg=self.colors['success'])
-            self.log_to_client(f"✅ Connection successful!")
-            
-            # Get file info
-            filename = os.path.basename(self.selected_file)
-            filesize = os.path.getsize(self.selected_file)
-            
-            # Calculate checksum
-            with open(self.selected_file, 'rb') as f:
-                file_data = f.read()
-            checksum = hashlib.md5(file_data).hexdigest()
-            
-            # Send metadata
-            metadata = {
-                'filename': filename,
-                'filesize': filesize,
-                'checksum': checksum,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            self.client_socket.send(json.dumps(metadata).encode('utf-8'))
-            
-            self.log_to_client(f"📤 Starting to send file data...")
-            self.log_to_client(f"📏 File size: {filesize} bytes")
-            
-            # Send file data
-            start_time = time.time()
-            bytes_sent = 0
-            
-            chunk_size = 4096
-            with open(self.selected_file, 'rb') as f:
-                while bytes_sent < filesize:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
-                    self.client_socket.send(chunk)
-                    bytes_sent += len(chunk)
-                    
-                    # Update progress
-                    progress = (bytes_sent / filesize) * 100
-                    self.client_progress['value'] = progress
-                    self.root.update_idletasks()
-                    
-            end_time = time.time()
-            transfer_time = end_time - start_time
-            
-            self.log_to_client(f"✅ Data sending completed! Time: {datetime.now().strftime('%H:%M, %m/%d/%Y')}")
-            self.log_to_client(f"🎉 File transfer successful!")
-            
-            # Wait for acknowledgment
-            try:
-                ack = self.client_socket.recv(1024).decode('utf-8')
-                if ack.startswith("FILE_RECEIVED"):
-                    self.log_to_client(f"✅ Partner confirmed file receipt: {ack}")
-            except:
-                pass
-                
-            # Update statistics
-            self.transfer_stats['files_sent'] += 1
-            self.transfer_stats['bytes_transferred'] += filesize
-            self.transfer_stats['transfer_time'] += transfer_time
-            if transfer_time > 0:
-                self.transfer_stats['transfer_speed'] = filesize / transfer_time / 1024  # KB/s
-                
-            self.update_stats()
-            
-            self.client_status.config(text="✅ Transfer completed", fg=self.colors['success'])
+            self.events.emit(self.client_status.config, text="🟡 Connecting...", fg=self.colors['warning'])
+            sender = FileSender(
+                partner_ip, port,
+                streams=streams,
+                profile=profile or get_profile('default'),
+                compression=compression,
+                delta=delta,
+                dedup=dedup,
+                rate_limiter=self.rate_limiter,
+                priority=priority,
+                stats=self.stats,
+                on_log=self.log_to_client,
+                on_progress=lambda p: self.events.coalesce('client_progress', self.client_progress.config, value=p),
+                on_connected=lambda: self.events.emit(self.client_status.config,
+                                                      text="🟢 Connected", fg=self.colors['success'])
+            )
+            sender.send(paths)
+            
+            self.events.coalesce('stats', self.update_stats)
+            self.events.emit(self.client_status.config, text="✅ Transfer completed", fg=self.colors['success'])
             
         except Exception as e:
             self.log_to_client(f"❌ Error sending file: {e}")
-            self.client_status.config(text="❌ Transfer failed", fg=self.colors['error'])
-            messagebox.showerror("Error", f"Failed to send file: {e}")
+            self.events.coalesce('stats', self.update_stats)
+            self.events.emit(self.client_status.config, text="❌ Transfer failed", fg=self.colors['error'])
+            self.events.emit(messagebox.showerror, "Error", f"Failed to send file: {e}")
         finally:
-            if self.client_socket:
-                self.client_socket.close()
-            self.client_progress['value'] = 0
+            # Replaces any progress still pending from this transfer
+            self.events.coalesce('client_progress', self.client_progress.config, value=0)
             
     def update_server_progress(self, value):
         # This would update a progress bar if we had one for server
@@ -631,52 +680,77 @@ File integrity checksum will be calculated upon transfer.
         except Exception as e:
             self.log_to_tools(f"❌ Connection test error: {e}")
             
+    def probe_link(self):
+        partner_ip = self.partner_ip.get()
+        port = self.port.get()
+        cached = self.probe_cache.get(partner_ip, port)
+        if cached:
+            self.log_to_tools(f"💾 Using today's probe of {partner_ip}:{port}: {describe_recommendation(cached)}")
+            self.offer_probe_settings(cached)
+            return
+        threading.Thread(target=self.probe_link_worker, args=(partner_ip, port), daemon=True).start()
+        
+    def probe_link_worker(self, partner_ip, port):
+        try:
+            result = LinkProbe(partner_ip, port, on_log=self.log_to_tools).run()
+            self.probe_cache.put(result)
+            self.events.emit(self.offer_probe_settings, result)
+        except Exception as e:
+            self.log_to_tools(f"❌ Link probe error: {e}")
+            
+    def offer_probe_settings(self, result):
+        if not messagebox.askyesno("Link Probe", f"Use the recommended settings for {result['host']}?\n\n"
+                                                 f"{describe_recommendation(result)}"):
+            return
+        profile = recommended_profile(result)
+        self.probed_profiles[profile.name] = profile
+        self.profile_combo.config(values=list(PROFILES) + list(self.probed_profiles))
+        self.socket_profile.set(profile.name)
+        self.parallel_streams.set(result['recommended']['streams'])
+        self.log_to_tools(f"✅ Applied profile {profile.describe()}, {result['recommended']['streams']} stream(s)")
+        
+    def selected_profile(self):
+        name = self.socket_profile.get()
+        return self.probed_profiles[name] if name in self.probed_profiles else get_profile(name)
+        
     def scan_network(self):
+        if self.scanning:
+            self.log_to_tools("⏳ A network scan is already running")
+            return
+        self.scanning = True
+        self.scanner.port = self.port.get()
+        threading.Thread(target=self.scan_network_worker, args=(self.get_local_ip(),), daemon=True).start()
+        
+    def scan_network_worker(self, local_ip):
         try:
-            local_ip = self.get_local_ip()
             network = ipaddress.IPv4Network(f"{local_ip}/24", strict=False)
             
-            self.log_to_tools(f"🔍 Scanning network {network}...")
+            self.log_to_tools(f"🔍 Scanning network {network} on port {self.scanner.port}...")
             
-            active_hosts = []
-            for ip in network.hosts():
-                ip_str = str(ip)
-                if ip_str == local_ip:
-                    continue
-                    
-                # Simple ping test
-                try:
-                    result = subprocess.run(['ping', '-c', '1', '-W', '1', ip_str], 
-                                          capture_output=True, text=True, timeout=2)
-                    if result.returncode == 0:
-                        active_hosts.append(ip_str)
-                        self.log_to_tools(f"✅ Host found: {ip_str}")
-                except:
-                    pass
+            def report(result):
+                if result['status'] == 'open':
+                    self.log_to_tools(f"✅ Partner found: {result['host']} (port {result['port']} open, "
+                                      f"{result['rtt'] * 1000:.1f} ms{', cached' if result['cached'] else ''})")
+                elif result['status'] == 'closed':
+                    self.log_to_tools(f"💻 Host up: {result['host']} (port {result['port']} closed)")
                     
-            self.log_to_tools(f"📊 Scan complete. Found {len(active_hosts)} active hosts:")
-            for host in active_hosts:
+            start = time.perf_counter()
+            results = self.scanner.scan(hosts_in(network, exclude={local_ip}), on_result=report)
+            partners = sorted((r['host'] for r in results if r['status'] == 'open'), key=ipaddress.IPv4Address)
+            hosts_up = sum(1 for r in results if r['status'] != 'down')
+            
+            self.log_to_tools(f"📊 Scan complete in {time.perf_counter() - start:.2f}s. "
+                              f"Found {hosts_up} active hosts, {len(partners)} with a receiver listening:")
+            for host in partners:
                 self.log_to_tools(f"   📍 {host}")
                 
         except Exception as e:
             self.log_to_tools(f"❌ Network scan error: {e}")
+        finally:
+            self.scanning = False
             
     def update_stats(self):
-        stats_text = f"""📊 Transfer Statistics
-{'='*40}
-
-📤 Files Sent: {self.transfer_stats['files_sent']}
-📥 Files Received: {self.transfer_stats['files_received']}
-📁 Total Files: {self.transfer_stats['files_sent'] + self.transfer_stats['files_received']}
-
-💾 Bytes Transferred: {self.transfer_stats['bytes_transferred']:,} bytes
-📏 MB Transferred: {self.transfer_stats['bytes_transferred'] / 1024 / 1024:.2f} MB
-
-⏱️ Total Transfer Time: {self.transfer_stats['transfer_time']:.2f} seconds
-🚀 Average Speed: {self.transfer_stats['transfer_speed']:.2f} KB/s
-
-📅 Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-"""
+        stats_text = self.stats.format_report()
         
         self.stats_text.delete(1.0, tk.END)
         self.stats_text.insert(1.0, stats_text)
@@ -686,19 +760,17 @@ File integrity checksum will be calculated upon transfer.
             filename = f"transfer_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
             with open(filename, 'w') as f:
                 f.write(self.stats_text.get(1.0, tk.END))
-            self.log_to_tools(f"✅ Statistics exported to {filename}")
+            # Histograms and counters alongside, in the Prometheus text format
+            metrics_filename = filename.replace('.txt', '.prom')
+            with open(metrics_filename, 'w') as f:
+                f.write(REGISTRY.render())
+            self.log_to_tools(f"✅ Statistics exported to {filename} and {metrics_filename}")
             messagebox.showinfo("Success", f"Statistics exported to {filename}")
         except Exception as e:
             self.log_to_tools(f"❌ Error exporting statistics: {e}")
             
     def reset_stats(self):
-        self.transfer_stats = {
-            'files_sent': 0,
-            'files_received': 0,
-            'bytes_transferred': 0,
-            'transfer_time': 0,
-            'transfer_speed': 0
-        }
+        self.stats.reset()
         self.update_stats()
         self.log_to_tools("🗑️ Statistics reset")
         
@@ -717,20 +789,30 @@ File integrity checksum will be calculated upon transfer.
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open folder: {e}")
             
+    def process_events(self):
+        # A failing handler is reported in the Tools log, written on the next tick
+        self.events.drain(on_error=lambda e: self.log_to_tools(f"⚠️ UI event error: {e}"))
+        self.root.after(DEFAULT_TICK_MS, self.process_events)
+        
+    def append_log(self, widget, lines):
+        widget.insert(tk.END, ''.join(lines))
+        widget.see(tk.END)
+        
+    # Safe to call from any thread: lines are batched and written on the next UI tick
     def log_to_server(self, message):
         timestamp = datetime.now().strftime('%H:%M:%S')
-        self.server_log.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.server_log.see(tk.END)
+        self.events.append('server_log', lambda lines: self.append_log(self.server_log, lines),
+                           f"[{timestamp}] {message}\n")
         
     def log_to_client(self, message):
         timestamp = datetime.now().strftime('%H:%M:%S')
-        self.client_log.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.client_log.see(tk.END)
+        self.events.append('client_log', lambda lines: self.append_log(self.client_log, lines),
+                           f"[{timestamp}] {message}\n")
         
     def log_to_tools(self, message):
         timestamp = datetime.now().strftime('%H:%M:%S')
-        self.tools_output.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.tools_output.see(tk.END)
+        self.events.append('tools_log', lambda lines: self.append_log(self.tools_output, lines),
+                           f"[{timestamp}] {message}\n")
 
 def main():
     root = tk.Tk()
@@ -6,9 +6,71 @@ import asyncio
 import threading
 import uuid
 import json
+import hashlib
+import random
+import time
 from datetime import datetime
 from pathlib import Path
 
+CHUNK_SIZE = 1024 * 1024
+# Chunks that may be unacknowledged at once, unless the server grants less credit
+DEFAULT_MAX_WINDOW = 32
+ACK_TIMEOUT = 30
+MAX_ATTEMPTS = 5
+UI_UPDATE_INTERVAL = 0.1
+# Round trips longer than twice the fastest one, plus this jitter allowance, mean queues are building
+RTT_SLACK = 0.01
+HEARTBEAT_INTERVAL = 10
+SNAPSHOT_PAGE_SIZE = 200
+# Spreads snapshot requests after a server-wide resync, so clients don't all ask at once
+RESYNC_JITTER = 2.0
+
+
+class CreditWindow:
+    """How many chunks may be in flight: grows while round trips stay fast, backs off when
+    they stretch (queues building) or chunks are lost, and never exceeds the server's credit."""
+    
+    def __init__(self, max_window, credit, initial=4):
+        self.max_window = max_window
+        self.credit = credit
+        self.cwnd = float(initial)
+        self.min_rtt = None
+        self.srtt = None
+        self.slow_start = True
+        self.last_decrease = 0
+    
+    @property
+    def size(self):
+        return max(1, min(int(self.cwnd), self.credit, self.max_window))
+    
+    def on_ack(self, rtt, credit=None):
+        if credit is not None:
+            self.credit = credit
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        self.srtt = rtt if self.srtt is None else 0.875 * self.srtt + 0.125 * rtt
+        if self.srtt > 2 * self.min_rtt + RTT_SLACK:
+            # Round trips doubled: data is queueing at the server or on the link
+            self.decrease(0.75)
+        elif self.slow_start:
+            self.cwnd = min(self.cwnd + 1, self.max_window)  # doubles once per round trip
+        else:
+            self.cwnd = min(self.cwnd + 1 / self.cwnd, self.max_window)  # one more per round trip
+    
+    def on_loss(self, credit=None):
+        if credit is not None:
+            self.credit = credit
+        self.decrease(0.5)
+    
+    def decrease(self, factor):
+        # At most once per round trip, so one burst of slow acks counts as one signal
+        now = time.monotonic()
+        if now - self.last_decrease < (self.srtt or 0):
+            return
+        self.last_decrease = now
+        self.slow_start = False
+        self.cwnd = max(1.0, self.cwnd * factor)
+
+
 class FileTransferApp:
     def __init__(self, root):
         self.root = root
@@ -23,12 +85,20 @@ class FileTransferApp:
         
         # Transfer data
         self.active_transfers = {}
+        
+        # Presence: a snapshot plus the deltas after its seq; None while a snapshot is loading
+        self.clients = {}
+        self.presence_seq = None
+        self.pending_presence = []
+        # The connect task and a resync may both ask for a snapshot; one loads at a time.
+        # Made in start_client, so it belongs to self.loop rather than whichever loop is current here
+        self.presence_lock = None
         self.setup_ui()
         self.setup_socket_events()
         
-        # Start the Socket.IO client in a separate thread
+        # Run the Socket.IO client on its own loop in a separate thread
         self.loop = asyncio.new_event_loop()
-        threading.Thread(target=self.start_client, daemon=True).start()
+        threading.Thread(target=self.run_client, daemon=True).start()
     
     def setup_theme(self):
         self.style = ttk.Style()
@@ -100,6 +170,10 @@ class FileTransferApp:
         )
         browse_btn.pack(side=tk.LEFT, padx=(0, 5))
         
+        ttk.Label(file_frame, text="Window").pack(side=tk.LEFT, padx=(0, 2))
+        self.max_window = tk.IntVar(value=DEFAULT_MAX_WINDOW)
+        ttk.Spinbox(file_frame, from_=1, to=256, textvariable=self.max_window, width=4).pack(side=tk.LEFT, padx=(0, 5))
+        
         self.upload_btn = ttk.Button(
             file_frame,
             text="Upload",
@@ -170,24 +244,109 @@ class FileTransferApp:
             self.connected = True
             self.root.after(0, self.update_ui_connection_status, True)
             await self.sio.emit('register', {
+                'user_id': self.client_id,
                 'name': f'Client-{self.client_id[:8]}',
                 'ip': '127.0.0.1'  # This would be the actual IP in a real app
             })
+            self.sio.start_background_task(self.load_presence)
+            self.sio.start_background_task(self.send_heartbeats)
         
         @self.sio.event
         async def disconnect():
             self.connected = False
+            self.presence_seq = None
+            self.pending_presence = []
             self.root.after(0, self.update_ui_connection_status, False)
         
         @self.sio.on('transfer_update')
         async def on_transfer_update(data):
-            self.root.after(0, self.update_transfer, data)
+            # One batch per server tick with every changed transfer of ours
+            for transfer in data.get('transfers', []):
+                self.root.after(0, self.update_transfer, transfer)
         
-        @self.sio.on('clients_updated')
-        async def on_clients_updated(clients):
-            self.root.after(0, self.update_clients_list, clients)
+        self.sio.on('presence', self.on_presence)
+    
+    async def on_presence(self, frame):
+        if self.presence_seq is None:
+            self.pending_presence.append(frame)  # held aside until the snapshot is in
+        elif frame.get('resync') or frame['seq'] != self.presence_seq + 1:
+            # Too many changes for deltas, or we missed a frame
+            await self.resync_presence()
+        else:
+            self.apply_presence(frame)
+    
+    async def resync_presence(self):
+        # Start over from a snapshot, after a random delay so a wave of clients spreads out
+        self.presence_seq = None
+        self.pending_presence = []
+        await asyncio.sleep(random.uniform(0, RESYNC_JITTER))
+        await self.load_presence()
+    
+    async def load_presence(self):
+        async with self.presence_lock:
+            while self.presence_seq is None:
+                await self.read_presence_snapshot()
+        self.root.after(0, self.update_clients_list, list(self.clients.values()))
+    
+    async def read_presence_snapshot(self):
+        # Leaves presence_seq at None if the frames held aside meanwhile need another snapshot
+        clients = {}
+        cursor = None
+        seq = None
+        while True:
+            page = await self.sio.call('presence_snapshot', {'cursor': cursor, 'limit': SNAPSHOT_PAGE_SIZE})
+            # Frames after the first page's seq cover whatever changed while the rest was paged in
+            seq = page['seq'] if seq is None else seq
+            for client in page['clients']:
+                clients[client['client_id']] = client
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.clients = clients
+        self.presence_seq = seq
+        pending, self.pending_presence = self.pending_presence, []
+        for frame in pending:
+            if frame['seq'] <= self.presence_seq:
+                continue  # already part of the snapshot
+            if frame.get('resync') or frame['seq'] != self.presence_seq + 1:
+                self.presence_seq = None
+                return
+            self.apply_presence(frame)
+    
+    def apply_presence(self, frame):
+        # Changes are idempotent, so one also covered by the snapshot does no harm
+        for change in frame.get('changes', []):
+            if change['op'] == 'leave':
+                self.clients.pop(change['client_id'], None)
+            else:
+                self.clients[change['client']['client_id']] = change['client']
+        self.presence_seq = frame['seq']
+        self.root.after(0, self.update_clients_list, list(self.clients.values()))
+    
+    async def send_heartbeats(self):
+        reported = None
+        while self.connected:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                reply = await self.sio.call('heartbeat', {})
+            except socketio.exceptions.TimeoutError:
+                continue
+            except Exception:
+                return
+            # A seq reported a heartbeat ago and still not seen means the latest frame was lost,
+            # which no gap in later frames would show while presence is quiet
+            if reported is not None and self.presence_seq is not None and self.presence_seq < reported:
+                await self.resync_presence()
+            reported = reply.get('seq')
+    
+    def run_client(self):
+        # Uploads are scheduled onto self.loop from the Tk thread, so it keeps running after connecting
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self.start_client())
+        self.loop.run_forever()
     
     async def start_client(self):
+        self.presence_lock = asyncio.Lock()
         try:
             await self.sio.connect('http://localhost:8000')
             await self.sio.wait()
@@ -211,9 +370,9 @@ class FileTransferApp:
         if filename:
             self.file_path.set(filename)
     
-    async def upload_file_async(self, file_path):
+    async def upload_file_async(self, file_path, max_window=DEFAULT_MAX_WINDOW):
         if not os.path.exists(file_path):
-            messagebox.showerror("Error", "File does not exist!")
+            self.root.after(0, lambda: messagebox.showerror("Error", "File does not exist!"))
             return
         
         file_name = os.path.basename(file_path)
@@ -233,51 +392,90 @@ class FileTransferApp:
         }
         
         # Update UI
-        self.update_transfer_ui(transfer_id)
+        self.root.after(0, self.update_transfer_ui, transfer_id)
         
         try:
-            # Read file in chunks
-            chunk_size = 1024 * 1024  # 1MB chunks
-            total_chunks = (file_size + chunk_size - 1) // chunk_size
-            bytes_sent = 0
+            start = await self.sio.call('start_transfer', {
+                'transfer_id': transfer_id,
+                'file_name': file_name,
+                'size': file_size,
+                'chunk_size': CHUNK_SIZE
+            }, timeout=ACK_TIMEOUT)
+            if start.get('status') != 'ok':
+                raise RuntimeError(start.get('error', 'server refused the upload'))
+            
+            window = CreditWindow(max_window, start.get('credit', 1))
+            total_chunks = (file_size + CHUNK_SIZE - 1) // CHUNK_SIZE
+            pending = list(range(total_chunks))
+            pending.reverse()  # pop() hands out chunks in file order
+            in_flight = {}
+            attempts = {}
+            acked = set()
+            bytes_acked = 0
+            checksum = hashlib.sha256()
+            hashed_upto = 0
+            last_ui_update = 0
+            # Server updates overwrite start_time with a string, so time the upload locally
+            started = time.monotonic()
             
             with open(file_path, 'rb') as f:
-                for chunk_num in range(total_chunks):
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        break
+                while pending or in_flight:
+                    # Keep the window full; every chunk in flight is held until acknowledged
+                    while pending and len(in_flight) < window.size:
+                        index = pending.pop()
+                        data = await asyncio.to_thread(os.pread, f.fileno(), CHUNK_SIZE, index * CHUNK_SIZE)
+                        if index * CHUNK_SIZE == hashed_upto:
+                            checksum.update(data)
+                            hashed_upto += len(data)
+                        task = asyncio.ensure_future(self.send_chunk(transfer_id, index, data))
+                        in_flight[task] = (index, data)
+                        self.active_transfers[transfer_id]['status'] = 'in-progress'
                     
-                    bytes_sent += len(chunk)
-                    progress = min(100, (bytes_sent / file_size) * 100)
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        index, data = in_flight.pop(task)
+                        ack, rtt = task.result()
+                        if ack is None or ack.get('status') != 'ok':
+                            # Lost or refused: send it again with a smaller window
+                            attempts[index] = attempts.get(index, 0) + 1
+                            if attempts[index] > MAX_ATTEMPTS:
+                                raise RuntimeError(f"chunk {index} failed: {(ack or {}).get('error', 'no acknowledgement')}")
+                            window.on_loss((ack or {}).get('credit'))
+                            pending.append(index)
+                            continue
+                        window.on_ack(rtt, ack.get('credit'))
+                        # A duplicate ack may be the first one to reach us after a timeout
+                        if index not in acked:
+                            acked.add(index)
+                            bytes_acked += len(data)
                     
-                    # Update transfer status
+                    elapsed = time.monotonic() - started
+                    speed = bytes_acked / max(elapsed, 1e-3)
                     self.active_transfers[transfer_id].update({
-                        'progress': progress,
-                        'status': 'in-progress',
-                        'bytes_transferred': bytes_sent,
-                        'speed': bytes_sent / (datetime.now() - 
-                                self.active_transfers[transfer_id]['start_time']).total_seconds(),
-                        'time_remaining': (file_size - bytes_sent) / max(
-                            self.active_transfers[transfer_id]['speed'], 1
-                        ) if progress < 100 else 0
-                    })
-                    
-                    # Send chunk to server
-                    await self.sio.emit('chunk_upload', {
-                        'transfer_id': transfer_id,
-                        'chunk_number': chunk_num + 1,
-                        'total_chunks': total_chunks,
-                        'progress': progress,
-                        'bytes_transferred': bytes_sent
+                        'progress': bytes_acked / file_size * 100 if file_size else 100,
+                        'bytes_transferred': bytes_acked,
+                        'speed': speed,
+                        'time_remaining': (file_size - bytes_acked) / max(speed, 1),
+                        'window': window.size,
+                        'rtt': window.srtt
                     })
-                    
-                    # Small delay to prevent overwhelming the server
-                    await asyncio.sleep(0.1)
+                    if elapsed - last_ui_update >= UI_UPDATE_INTERVAL:
+                        last_ui_update = elapsed
+                        self.root.after(0, self.update_transfer_ui, transfer_id)
+                
+                # Chunks are read in order, so the whole file has been hashed exactly once
+                result = await self.sio.call('finish_transfer', {
+                    'transfer_id': transfer_id,
+                    'checksum': checksum.hexdigest()
+                }, timeout=ACK_TIMEOUT * 4)
+            if result.get('status') != 'completed':
+                raise RuntimeError(result.get('error') or f"server is missing chunks {result.get('missing')}")
             
             # Mark as completed
             self.active_transfers[transfer_id].update({
                 'status': 'completed',
-                'progress': 100
+                'progress': 100,
+                'time_remaining': 0
             })
             
         except Exception as e:
@@ -288,7 +486,20 @@ class FileTransferApp:
             })
         
         # Final UI update
-        self.update_transfer_ui(transfer_id)
+        self.root.after(0, self.update_transfer_ui, transfer_id)
+    
+    async def send_chunk(self, transfer_id, index, data):
+        # Returns the server's acknowledgement (None if it never came) and the round trip time
+        start = time.perf_counter()
+        try:
+            ack = await self.sio.call('chunk_upload', {
+                'transfer_id': transfer_id,
+                'index': index,
+                'data': data
+            }, timeout=ACK_TIMEOUT)
+        except socketio.exceptions.TimeoutError:
+            ack = None
+        return ack, time.perf_counter() - start
     
     def upload_file(self):
         file_path = self.file_path.get()
@@ -296,7 +507,7 @@ class FileTransferApp:
             messagebox.showwarning("Warning", "Please select a file first!")
             return
         
-        asyncio.run_coroutine_threadsafe(self.upload_file_async(file_path), self.loop)
+        asyncio.run_coroutine_threadsafe(self.upload_file_async(file_path, self.max_window.get()), self.loop)
     
     def update_transfer_ui(self, transfer_id):
         if transfer_id not in self.active_transfers:
@@ -0,0 +1,20 @@
+"""Headless core of the socket file transfer lab: protocol, sender, receiver and stats.
+
+Nothing in this package imports tkinter, so it runs on servers, in containers
+and in benchmarks. The Tk GUI in ``file_transfer_gui.py`` is a thin client of it.
+"""
+from .events import EventBus
+from .protocol import PROTOCOL_VERSION, ProtocolError
+from .receiver import ReceiverEngine
+from .sender import FileSender, TransferRejected
+from .stats import TransferStats
+
+__all__ = [
+    'EventBus',
+    'PROTOCOL_VERSION',
+    'ProtocolError',
+    'ReceiverEngine',
+    'FileSender',
+    'TransferRejected',
+    'TransferStats',
+]
@@ -0,0 +1,256 @@
+"""Reproducible loopback benchmark suite for the TCP transfer path.
+
+Runs the real sender and receiver headlessly over 127.0.0.1 for a matrix of
+file sizes, chunk sizes and concurrency levels, and records MB/s, files/s,
+CPU time, peak RSS and time to first byte for every case. Each case runs in a
+fresh process, so its peak RSS and CPU time are its own. Input files are
+generated from a fixed seed, so two runs move exactly the same bytes.
+
+Small sizes are sent as many files (about ``TARGET_BYTES`` per case), sizes
+from ``SINGLE_FILE_SIZE`` up as a single file. Concurrency is the number of simultaneous connections:
+parallel streams for a single file, concurrent senders splitting the files
+otherwise.
+
+Results are written as JSON and can be compared with an earlier run; a case
+whose throughput drops by more than the threshold is reported as a regression.
+"""
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from .protocol import PROTOCOL_VERSION
+from .receiver import ReceiverEngine
+from .sender import FileSender
+from .tuning import PROFILES, SocketProfile
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+RESULTS_VERSION = 1
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+DEFAULT_SIZES = [KB, 64 * KB, MB, 64 * MB, GB]
+DEFAULT_CHUNK_SIZES = [256 * KB, 4 * MB]
+DEFAULT_CONCURRENCY = [1, 4]
+DEFAULT_ROUNDS = 3
+# Sizes below SINGLE_FILE_SIZE move about TARGET_BYTES per case as many files, capped at MAX_FILES
+TARGET_BYTES = 64 * MB
+MAX_FILES = 1000
+SINGLE_FILE_SIZE = 8 * MB
+DEFAULT_SEED = 2025
+DEFAULT_THRESHOLD = 10.0
+BLOCK_SIZE = MB
+# Profile the chunk size is applied to; loopback has the buffer sizes that suit this path
+BASE_PROFILE = PROFILES['loopback']
+
+
+def format_size(size):
+    for unit, scale in (('G', GB), ('M', MB), ('K', KB)):
+        if size >= scale and size % scale == 0:
+            return f"{size // scale}{unit}"
+    return str(size)
+
+
+def files_for(size):
+    if size >= SINGLE_FILE_SIZE:
+        return 1
+    return max(1, min(MAX_FILES, TARGET_BYTES // max(size, 1)))
+
+
+def case_key(case):
+    return f"{format_size(case['size'])}/{format_size(case['chunk_size'])}/x{case['concurrency']}"
+
+
+def build_matrix(sizes, chunk_sizes, concurrency):
+    return [{'size': size, 'chunk_size': chunk_size, 'concurrency': level}
+            for size in sizes for chunk_size in chunk_sizes for level in concurrency]
+
+
+def generate_files(directory, size, count, seed):
+    # Deterministic pseudo-random content: one seeded block per file, varied per block so nothing dedups
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(f"{seed}:{size}")
+    base = rng.randbytes(min(size, BLOCK_SIZE)) if size else b''
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"bench_{index:04d}.bin")
+        with open(path, 'wb') as f:
+            remaining = size
+            block_index = 0
+            while remaining:
+                block = min(remaining, len(base))
+                prefix = f"{index}:{block_index}:".encode('ascii')
+                f.write((prefix + base[len(prefix):block])[:block])
+                remaining -= block
+                block_index += 1
+        paths.append(path)
+    return paths
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(case, paths, rounds, workdir):
+    """Run one case ``rounds`` times in this process and return its measurements."""
+    size = case['size']
+    concurrency = case['concurrency']
+    profile = SocketProfile(f"bench {format_size(case['chunk_size'])}", sndbuf=BASE_PROFILE.sndbuf, rcvbuf=BASE_PROFILE.rcvbuf,
+                            nodelay=BASE_PROFILE.nodelay, chunk_size=case['chunk_size'],
+                            recv_buffer_size=BASE_PROFILE.recv_buffer_size)
+    total_bytes = size * len(paths)
+    first_byte = threading.Event()
+    first_byte_at = [None]
+
+    def mark_first_byte(*args):
+        # The receiver reports 0% when a connection closes; only real progress counts
+        if args and args[0] == 0 and len(args) == 1:
+            return
+        if not first_byte.is_set():
+            first_byte_at[0] = time.perf_counter()
+            first_byte.set()
+
+    output_dir = os.path.join(workdir, 'received')
+    receiver = ReceiverEngine(0, host='127.0.0.1', output_dir=output_dir, profile=profile,
+                              on_progress=mark_first_byte, on_file_received=mark_first_byte)
+    receiver.start()
+    try:
+        # Never resumable: that path would otherwise start at RESUMABLE_MIN_SIZE and change what a case measures
+        if len(paths) == 1:
+            senders = [(FileSender('127.0.0.1', receiver.port, streams=concurrency, profile=profile,
+                                   resumable=False), paths)]
+        else:
+            shares = [paths[index::concurrency] for index in range(min(concurrency, len(paths)))]
+            senders = [(FileSender('127.0.0.1', receiver.port, profile=profile, resumable=False), share)
+                       for share in shares]
+        sender, share = senders[0]
+        mode = sender.transfer_mode(share, size * len(share))
+
+        measured = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(senders)) as pool:
+            for _ in range(rounds):
+                first_byte.clear()
+                cpu_start = time.process_time()
+                start = time.perf_counter()
+                for future in [pool.submit(sender.send, share) for sender, share in senders]:
+                    future.result()
+                elapsed = time.perf_counter() - start
+                measured.append({
+                    'seconds': elapsed,
+                    'cpu_seconds': time.process_time() - cpu_start,
+                    'ttfb': first_byte_at[0] - start if first_byte.is_set() else None,
+                })
+                shutil.rmtree(output_dir, ignore_errors=True)
+    finally:
+        receiver.stop()
+
+    seconds = statistics.median(round_['seconds'] for round_ in measured)
+    ttfbs = [round_['ttfb'] for round_ in measured if round_['ttfb'] is not None]
+    return {
+        'key': case_key(case),
+        'case': case,
+        'mode': mode,
+        'files': len(paths),
+        'bytes': total_bytes,
+        'rounds': measured,
+        'seconds': seconds,
+        'mb_per_s': total_bytes / seconds / MB,
+        'files_per_s': len(paths) / seconds,
+        'cpu_seconds': statistics.median(round_['cpu_seconds'] for round_ in measured),
+        'peak_rss': peak_rss(),
+        'ttfb': statistics.median(ttfbs) if ttfbs else None,
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'protocol_version': PROTOCOL_VERSION,
+    }
+
+
+def run_suite(sizes, chunk_sizes, concurrency, rounds=DEFAULT_ROUNDS, seed=DEFAULT_SEED, workdir=None,
+              on_result=None):
+    on_result = on_result or (lambda result: None)
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='socketlab-suite-')
+    # A fresh interpreter per case keeps peak RSS and CPU time per case, not cumulative
+    context = multiprocessing.get_context('spawn')
+    results = []
+    try:
+        for size in sizes:
+            input_dir = os.path.join(workdir, f"input_{size}")
+            paths = generate_files(input_dir, size, files_for(size), seed)
+            for case in build_matrix([size], chunk_sizes, concurrency):
+                case_dir = os.path.join(workdir, 'case')
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(run_case, case, paths, rounds, case_dir).result()
+                shutil.rmtree(case_dir, ignore_errors=True)
+                results.append(result)
+                on_result(result)
+            shutil.rmtree(input_dir, ignore_errors=True)
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'version': RESULTS_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'environment': environment(),
+        'settings': {'sizes': sizes, 'chunk_sizes': chunk_sizes, 'concurrency': concurrency,
+                     'rounds': rounds, 'seed': seed, 'base_profile': BASE_PROFILE.name},
+        'results': results,
+    }
+
+
+def compare(current, previous, threshold=DEFAULT_THRESHOLD):
+    """Per-case changes against ``previous``; a throughput drop beyond ``threshold`` percent is a regression."""
+    before = {case_key(result['case']): result for result in previous['results']}
+    changes = []
+    for result in current['results']:
+        key = case_key(result['case'])
+        old = before.get(key)
+        if old is None or old['files'] != result['files'] or old.get('mode', result['mode']) != result['mode']:
+            continue  # not run before, or run with a different file count or transfer mode
+        change = (result['mb_per_s'] - old['mb_per_s']) / old['mb_per_s'] * 100 if old['mb_per_s'] else 0.0
+        changes.append({
+            'case': key,
+            'before': old['mb_per_s'],
+            'after': result['mb_per_s'],
+            'change': change,
+            'regression': change < -threshold,
+        })
+    return changes
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+    if results.get('version') != RESULTS_VERSION:
+        raise ValueError(f"{path} holds results version {results.get('version')}, expected {RESULTS_VERSION}")
+    return results
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,194 @@
+"""Content-addressed chunk store used to deduplicate received files.
+
+Files are cut into fixed-size chunks named by their BLAKE2b-256 digest and
+kept under ``<root>/objects/<2 hex>/<digest>``. A JSON index records each
+chunk's size and last use, so the store can be trimmed by total size (least
+recently used first) or by age. Received files are assembled from chunks:
+reflinked where the filesystem supports it, and copied otherwise. They never
+share an inode with the store, so changing a received file cannot change the
+chunk it came from.
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflinks, chunks are copied
+    fcntl = None
+
+DIGEST_SIZE = 32
+MIN_CHUNK_SIZE = 1024 * 1024
+# Keeps a file's chunk list within one control frame
+MAX_CHUNKS = 8 * 1024
+INDEX_SAVE_INTERVAL = 5.0
+# Limits the GUI suggests for a new store
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+DEFAULT_MAX_AGE = 30 * 86400
+# Linux ioctl that clones a byte range between files on btrfs/xfs, and its argument struct
+FICLONERANGE = 0x4020940d
+FILE_CLONE_RANGE = struct.Struct('=qQQQ')
+
+
+def chunk_size_for(filesize, minimum=MIN_CHUNK_SIZE, max_chunks=MAX_CHUNKS):
+    # Smallest power of two of at least minimum bytes that splits the file into max_chunks or fewer
+    size = max(minimum, -(-filesize // max_chunks))
+    return 1 << (size - 1).bit_length()
+
+
+def new_hasher():
+    return hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+
+def file_chunk_digests(path, chunk_size):
+    digests = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digests.append(hashlib.blake2b(chunk, digest_size=DIGEST_SIZE).hexdigest())
+    return digests
+
+
+def clone_range(source_fd, fd, source_offset, length, offset):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(fd, FICLONERANGE, FILE_CLONE_RANGE.pack(source_fd, source_offset, length, offset))
+        return True
+    except OSError:
+        return False
+
+
+class ChunkStore:
+    def __init__(self, root, max_bytes=None, max_age=None):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, 'index.json')
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.pins = {}
+        self.last_saved = 0.0
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.index = self.load_index()
+        self.total_bytes = sum(size for size, _ in self.index.values())
+
+    def load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = {digest: tuple(entry) for digest, entry in json.load(f).items()}
+        except (OSError, ValueError):
+            index = self.scan_objects()
+        # Objects removed behind our back are forgotten
+        return {digest: entry for digest, entry in index.items() if os.path.exists(self.path(digest))}
+
+    def scan_objects(self):
+        index = {}
+        for prefix in os.listdir(self.objects_dir):
+            directory = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(directory):
+                if len(name) == DIGEST_SIZE * 2:
+                    st = os.stat(os.path.join(directory, name))
+                    index[name] = (st.st_size, st.st_mtime)
+        return index
+
+    def save_index(self, force=False):
+        with self.lock:
+            if not force and time.time() - self.last_saved < INDEX_SAVE_INTERVAL:
+                return
+            snapshot = {digest: list(entry) for digest, entry in self.index.items()}
+            self.last_saved = time.time()
+        fd, temp_path = tempfile.mkstemp(prefix='.index.', dir=self.root)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, self.index_path)
+
+    def path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def pin(self, digests):
+        # Pinned chunks survive eviction until the transfer using them is done; returns the ones not stored yet
+        with self.lock:
+            for digest in set(digests):
+                self.pins[digest] = self.pins.get(digest, 0) + 1
+            return {digest for digest in digests if digest not in self.index}
+
+    def unpin(self, digests):
+        with self.lock:
+            for digest in set(digests):
+                self.pins[digest] -= 1
+                if not self.pins[digest]:
+                    del self.pins[digest]
+
+    def open_writer(self):
+        return tempfile.mkstemp(prefix='.incoming.', dir=self.root)
+
+    def commit(self, temp_path, digest, size):
+        # temp_path must already hold data whose digest was verified by the caller
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(temp_path, 0o444)
+        os.replace(temp_path, path)
+        with self.lock:
+            if digest not in self.index:
+                self.total_bytes += size
+            self.index[digest] = (size, time.time())
+        self.evict()
+        self.save_index()
+
+    def assemble(self, digests, chunk_size, temp_path, hasher):
+        """Write the file made of ``digests`` to ``temp_path`` (which must not exist yet)."""
+        now = time.time()
+        with self.lock:
+            for digest in digests:
+                self.index[digest] = (self.index[digest][0], now)
+
+        method = 'reflink'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            for index, digest in enumerate(digests):
+                offset = index * chunk_size
+                with open(self.path(digest), 'rb') as source:
+                    data = source.read()
+                    hasher.update(data)
+                    if method == 'reflink' and clone_range(source.fileno(), fd, 0, len(data), offset):
+                        continue
+                method = 'copy'
+                os.lseek(fd, offset, os.SEEK_SET)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        return method if digests else 'copy'
+
+    def evict(self):
+        removed = []
+        with self.lock:
+            if self.max_bytes is None and self.max_age is None:
+                return
+            cutoff = time.time() - self.max_age if self.max_age is not None else None
+            for digest, (size, last_used) in sorted(self.index.items(), key=lambda item: item[1][1]):
+                over_size = self.max_bytes is not None and self.total_bytes > self.max_bytes
+                too_old = cutoff is not None and last_used < cutoff
+                if not over_size and not too_old:
+                    break
+                if digest in self.pins:
+                    continue
+                del self.index[digest]
+                self.total_bytes -= size
+                removed.append(digest)
+        for digest in removed:
+            try:
+                os.remove(self.path(digest))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        self.save_index(force=True)
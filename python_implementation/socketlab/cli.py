@@ -0,0 +1,381 @@
+"""Command line entry point: ``python -m socketlab serve|send|bench|suite|scan|peers|probe``."""
+import argparse
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from .benchmark import DEFAULT_CONCURRENCY as SUITE_CONCURRENCY
+from .benchmark import (DEFAULT_CHUNK_SIZES, DEFAULT_ROUNDS, DEFAULT_SEED, DEFAULT_SIZES, DEFAULT_THRESHOLD,
+                        compare, format_size, load_results, run_suite, save_results)
+from .chunkstore import ChunkStore
+from .compression import COMPRESSION_MODES
+from .discovery import ANNOUNCE_INTERVAL, DISCOVERY_GROUP, DISCOVERY_PORT, Announcer, PeerListener
+from .metrics import serve_metrics
+from .probe import TEST_SECONDS, LinkProbe, ProbeCache, describe_recommendation, recommended_profile
+from .protocol import ProtocolError
+from .ratelimit import DEFAULT_PRIORITY, PRIORITY_WEIGHTS, RateLimiter, parse_rate
+from .receiver import DEFAULT_BACKLOG, ReceiverEngine
+from .scanner import DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT, NetworkScanner, hosts_in
+from .sender import FileSender
+from .stats import TransferStats
+from .tuning import PROFILES, get_profile
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip('B')
+    unit = text[-1] if text and text[-1] in SIZE_UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def log(message):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+def build_rate_limiter(args):
+    return RateLimiter(global_rate=args.rate_limit, peer_rate=args.peer_rate_limit,
+                       transfer_rate=args.transfer_rate_limit)
+
+
+def watch_rate_commands(limiter):
+    # Limits can be changed while running by typing commands on stdin
+    def apply(line):
+        words = line.split()
+        if not words:
+            return
+        if words[0] == 'rate' and len(words) == 2:
+            limiter.set_global_rate(parse_rate(words[1]))
+        elif words[0] == 'peer' and len(words) in (2, 3):
+            limiter.set_peer_rate(parse_rate(words[1]), words[2] if len(words) == 3 else None)
+        elif words[0] == 'transfer' and len(words) == 2:
+            limiter.set_transfer_rate(parse_rate(words[1]))
+        elif words[0] != 'limits':
+            log("❓ Commands: rate RATE | peer RATE [HOST] | transfer RATE | limits  (RATE like 10M or off)")
+            return
+        log(f"🚦 Rate limits: {limiter.describe()}")
+
+    def run():
+        for line in sys.stdin:
+            try:
+                apply(line)
+            except (ValueError, IndexError) as e:
+                log(f"❌ Bad rate command: {e}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def cmd_serve(args):
+    stats = TransferStats()
+    chunk_store = None
+    if args.chunk_store is not None or args.store_max_size or args.store_max_age:
+        chunk_store = ChunkStore(args.chunk_store or os.path.join(args.output_dir, '.chunks'),
+                                 max_bytes=parse_size(args.store_max_size) if args.store_max_size else None,
+                                 max_age=args.store_max_age * 86400 if args.store_max_age else None)
+    limiter = build_rate_limiter(args)
+    receiver = ReceiverEngine(args.port, host=args.host, backlog=args.backlog,
+                              output_dir=args.output_dir, profile=get_profile(args.profile),
+                              chunk_store=chunk_store, rate_limiter=limiter, stats=stats, on_log=log)
+    receiver.start()
+    log(f"🚀 File receiver server started, port: {receiver.port}")
+    log(f"⚙️ Socket profile {receiver.profile.describe()}")
+    log(f"🚦 Rate limits: {limiter.describe()}")
+    watch_rate_commands(limiter)
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = serve_metrics(args.metrics_port, host=args.host)
+        log(f"📈 Metrics at http://{args.host or 'localhost'}:{metrics_server.server_address[1]}/metrics")
+    announcer = None
+    if not args.no_announce:
+        announcer = Announcer(args.name, receiver.port, capabilities=receiver.capabilities(),
+                              group=args.discovery_group, discovery_port=args.discovery_port)
+        announcer.start()
+        log(f"🛰️ Announcing as {args.name} on {args.discovery_group}:{args.discovery_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if announcer:
+            announcer.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        receiver.stop()
+        log("⏹️ Server stopped")
+        print(stats.format_report())
+    return 0
+
+
+def cmd_send(args):
+    stats = TransferStats()
+    limiter = build_rate_limiter(args)
+    streams = args.streams or 1
+    if args.profile == 'probed':
+        result = ProbeCache().get(args.host, args.port)
+        if result is None:
+            log(f"❌ No recent probe of {args.host}:{args.port}; run 'probe {args.host}' first")
+            return 1
+        profile = recommended_profile(result)
+        streams = args.streams or result['recommended']['streams']
+        log(f"📶 Using probed settings: {describe_recommendation(result)}")
+    else:
+        profile = get_profile(args.profile)
+    sender = FileSender(args.host, args.port, streams=streams, profile=profile,
+                        compression=args.compression, delta=args.delta, dedup=args.dedup,
+                        rate_limiter=limiter, priority=args.priority, stats=stats, on_log=log)
+    watch_rate_commands(limiter)
+    try:
+        sender.send(args.files)
+    except Exception as e:
+        log(f"❌ Error sending file: {e}")
+        return 1
+    print(stats.format_report())
+    return 0
+
+
+def cmd_bench(args):
+    size = parse_size(args.size)
+    workdir = tempfile.mkdtemp(prefix='socketlab-bench-')
+    tree_dir = os.path.join(workdir, 'tree')
+    profile = get_profile(args.profile)
+    receiver = ReceiverEngine(0, host='127.0.0.1', output_dir=os.path.join(workdir, 'received'),
+                              profile=profile)
+    try:
+        paths = []
+        os.makedirs(tree_dir)
+        for index in range(args.files):
+            path = os.path.join(tree_dir if args.tree else workdir, f"bench_{index}.bin")
+            with open(path, 'wb') as f:
+                remaining = size
+                while remaining:
+                    block = min(remaining, 1024 * 1024)
+                    f.write(os.urandom(block))
+                    remaining -= block
+            paths.append(path)
+        if args.tree:
+            paths = [tree_dir]
+
+        receiver.start()
+        sender = FileSender('127.0.0.1', receiver.port, streams=args.streams, profile=profile,
+                            compression=args.compression)
+        total = size * args.files
+        print(f"Benchmark: {args.files} x {size:,} bytes{' as one folder' if args.tree else ''}, "
+              f"{args.streams} stream(s), {args.rounds} round(s), profile {profile.name}")
+        rates = []
+        for round_number in range(1, args.rounds + 1):
+            start = time.perf_counter()
+            sender.send(paths)
+            elapsed = time.perf_counter() - start
+            rates.append(total / elapsed / 1024 / 1024)
+            print(f"  round {round_number}: {elapsed:.3f} s, {rates[-1]:.1f} MB/s, {args.files / elapsed:.1f} files/s")
+        print(f"best {max(rates):.1f} MB/s, mean {sum(rates) / len(rates):.1f} MB/s")
+    finally:
+        receiver.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+def cmd_suite(args):
+    try:
+        sizes = [parse_size(size) for size in args.sizes.split(',')]
+        chunk_sizes = [parse_size(size) for size in args.chunk_sizes.split(',')]
+        concurrency = [int(level) for level in args.concurrency.split(',')]
+        previous = load_results(args.compare) if args.compare else None
+    except (OSError, ValueError) as e:
+        log(f"❌ {e}")
+        return 1
+
+    def report(result):
+        peak_rss = f"{result['peak_rss'] / 1024 / 1024:.0f} MB" if result['peak_rss'] else 'n/a'
+        ttfb = f"{result['ttfb'] * 1000:.1f} ms" if result['ttfb'] is not None else 'n/a'
+        print(f"  {result['key']:<16} {result['mode']:<9} {result['files']:>4} file(s)  {result['mb_per_s']:8.1f} MB/s  "
+              f"{result['files_per_s']:8.1f} files/s  cpu {result['cpu_seconds']:6.2f} s  "
+              f"rss {peak_rss:>7}  ttfb {ttfb}", flush=True)
+
+    print(f"Suite: sizes {','.join(map(format_size, sizes))}, chunks {','.join(map(format_size, chunk_sizes))}, "
+          f"concurrency {args.concurrency}, {args.rounds} round(s) per case (median reported)")
+    results = run_suite(sizes, chunk_sizes, concurrency, rounds=args.rounds, seed=args.seed, on_result=report)
+    if args.output:
+        save_results(results, args.output)
+        print(f"Results written to {args.output}")
+    if previous is None:
+        return 0
+
+    changes = compare(results, previous, threshold=args.threshold)
+    print(f"Compared with {args.compare} ({previous['created_at']}):")
+    for change in changes:
+        flag = '  REGRESSION' if change['regression'] else ''
+        print(f"  {change['case']:<16} {change['before']:8.1f} -> {change['after']:8.1f} MB/s  "
+              f"{change['change']:+6.1f}%{flag}")
+    regressions = sum(1 for change in changes if change['regression'])
+    if regressions:
+        print(f"{regressions} case(s) slower by more than {args.threshold:g}%")
+        return 1
+    return 0
+
+
+def add_rate_arguments(parser):
+    parser.add_argument('--rate-limit', type=parse_rate, metavar='RATE', help='total bandwidth, e.g. 10M (bytes/s)')
+    parser.add_argument('--peer-rate-limit', type=parse_rate, metavar='RATE', help='bandwidth per peer address')
+    parser.add_argument('--transfer-rate-limit', type=parse_rate, metavar='RATE', help='bandwidth per transfer')
+
+
+def cmd_scan(args):
+    scanner = NetworkScanner(args.port, concurrency=args.concurrency, timeout=args.timeout)
+
+    def report(result):
+        if result['status'] == 'open':
+            log(f"✅ Partner found: {result['host']} ({result['rtt'] * 1000:.1f} ms)")
+        elif result['status'] == 'closed' and args.all:
+            log(f"💻 Host up: {result['host']} (port {args.port} closed)")
+
+    start = time.perf_counter()
+    try:
+        hosts = hosts_in(args.network)
+    except ValueError as e:
+        log(f"❌ Bad network: {e}")
+        return 1
+    log(f"🔍 Scanning {len(hosts)} hosts in {args.network} on port {args.port}...")
+    results = scanner.scan(hosts, on_result=report)
+    partners = sum(1 for result in results if result['status'] == 'open')
+    hosts_up = sum(1 for result in results if result['status'] != 'down')
+    log(f"📊 Scan complete in {time.perf_counter() - start:.2f}s: {hosts_up} hosts up, {partners} with a receiver listening")
+    return 0
+
+
+def cmd_peers(args):
+    def show(peers):
+        log(f"🛰️ {len(peers)} peer(s)")
+        for peer in peers:
+            capabilities = peer['capabilities']
+            log(f"   📍 {peer['name']} {peer['host']}:{peer['port']} "
+                f"codecs={','.join(capabilities.get('codecs', [])) or '-'} dedup={capabilities.get('dedup', False)}")
+
+    listener = PeerListener(group=args.discovery_group, discovery_port=args.discovery_port,
+                            on_change=show if args.watch else None)
+    listener.start()
+    try:
+        if args.watch:
+            threading.Event().wait()
+        time.sleep(args.wait)
+        show(listener.peers())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+    return 0
+
+
+def cmd_probe(args):
+    probe = LinkProbe(args.host, args.port, profile=get_profile(args.profile), seconds=args.seconds, on_log=log)
+    try:
+        result = probe.run()
+    except (OSError, ProtocolError) as e:
+        log(f"❌ Probe failed: {e}")
+        return 1
+    if not args.no_cache:
+        ProbeCache().put(result)
+        log(f"💾 Saved; 'send --profile probed {args.host} ...' uses these settings")
+    return 0
+
+
+def add_discovery_arguments(parser):
+    parser.add_argument('--discovery-group', default=DISCOVERY_GROUP,
+                        help='multicast group, broadcast address, or 127.0.0.1 for loopback')
+    parser.add_argument('--discovery-port', type=int, default=DISCOVERY_PORT)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m socketlab',
+                                     description='Headless socket file transfer (no display required)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='receive files')
+    serve.add_argument('--host', default='')
+    serve.add_argument('--port', type=int, default=8888)
+    serve.add_argument('--backlog', type=int, default=DEFAULT_BACKLOG)
+    serve.add_argument('--output-dir', default='received_files')
+    serve.add_argument('--profile', choices=list(PROFILES), default='default', help='socket tuning profile')
+    serve.add_argument('--chunk-store', nargs='?', const='', metavar='DIR',
+                       help='enable deduplication with a chunk store (default DIR: <output-dir>/.chunks)')
+    serve.add_argument('--store-max-size', metavar='SIZE', help='evict least recently used chunks above this size')
+    serve.add_argument('--store-max-age', type=float, metavar='DAYS', help='evict chunks unused for this long')
+    add_rate_arguments(serve)
+    serve.add_argument('--name', default=socket.gethostname(), help='name announced to peers')
+    serve.add_argument('--no-announce', action='store_true', help='do not announce this server on the network')
+    add_discovery_arguments(serve)
+    serve.add_argument('--metrics-port', type=int, metavar='PORT',
+                       help='serve Prometheus metrics at http://HOST:PORT/metrics')
+    serve.set_defaults(func=cmd_serve)
+
+    send = commands.add_parser('send', help='send files to a running server')
+    send.add_argument('host')
+    send.add_argument('files', nargs='+')
+    send.add_argument('--port', type=int, default=8888)
+    send.add_argument('--streams', type=int, help='parallel streams (default 1, or the probed recommendation)')
+    send.add_argument('--profile', choices=list(PROFILES) + ['probed'], default='default',
+                      help="socket tuning profile; 'probed' uses the last 'probe' of this host")
+    send.add_argument('--compression', choices=COMPRESSION_MODES, default='auto')
+    send.add_argument('--delta', action='store_true', help="send only what differs from the partner's copy")
+    send.add_argument('--dedup', action='store_true', help="skip chunks already in the partner's chunk store")
+    send.add_argument('--priority', choices=list(PRIORITY_WEIGHTS), default=DEFAULT_PRIORITY,
+                      help='share of limited bandwidth (interactive gets a larger share than bulk)')
+    add_rate_arguments(send)
+    send.set_defaults(func=cmd_send)
+
+    bench = commands.add_parser('bench', help='measure loopback throughput')
+    bench.add_argument('--size', default='64M', help='file size, e.g. 512K, 64M, 2G')
+    bench.add_argument('--files', type=int, default=1)
+    bench.add_argument('--streams', type=int, default=1)
+    bench.add_argument('--rounds', type=int, default=3)
+    bench.add_argument('--profile', choices=list(PROFILES), default='loopback', help='socket tuning profile')
+    bench.add_argument('--compression', choices=COMPRESSION_MODES, default='off')
+    bench.add_argument('--tree', action='store_true', help='send the files as one folder stream')
+    bench.set_defaults(func=cmd_bench)
+
+    suite = commands.add_parser('suite', help='run the loopback benchmark matrix and compare with a previous run')
+    suite.add_argument('--sizes', default=','.join(map(format_size, DEFAULT_SIZES)),
+                       help='file sizes; small sizes are sent as many files')
+    suite.add_argument('--chunk-sizes', default=','.join(map(format_size, DEFAULT_CHUNK_SIZES)))
+    suite.add_argument('--concurrency', default=','.join(map(str, SUITE_CONCURRENCY)),
+                       help='simultaneous connections: streams for one file, senders for many')
+    suite.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS)
+    suite.add_argument('--seed', type=int, default=DEFAULT_SEED, help='seed for the generated file contents')
+    suite.add_argument('--output', metavar='JSON', help='write the results to this file')
+    suite.add_argument('--compare', metavar='JSON', help='results of a previous run to compare against')
+    suite.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                       help='percent drop in MB/s that counts as a regression (exit status 1)')
+    suite.set_defaults(func=cmd_suite)
+
+    scan = commands.add_parser('scan', help='find receivers on the network')
+    scan.add_argument('network', help='hosts to probe, e.g. 192.168.1.0/24')
+    scan.add_argument('--port', type=int, default=8888)
+    scan.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='probes in flight at once')
+    scan.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds to wait for each connect')
+    scan.add_argument('--all', action='store_true', help='also list hosts that are up without a receiver')
+    scan.set_defaults(func=cmd_scan)
+
+    peers = commands.add_parser('peers', help='list servers announcing themselves on the network')
+    peers.add_argument('--wait', type=float, default=ANNOUNCE_INTERVAL + 0.5, help='seconds to listen')
+    peers.add_argument('--watch', action='store_true', help='keep listening and print every change')
+    add_discovery_arguments(peers)
+    peers.set_defaults(func=cmd_peers)
+
+    probe = commands.add_parser('probe', help='measure the link to a running server and recommend settings')
+    probe.add_argument('host')
+    probe.add_argument('--port', type=int, default=8888)
+    probe.add_argument('--profile', choices=list(PROFILES), default='default', help='socket profile to probe with')
+    probe.add_argument('--seconds', type=float, default=TEST_SECONDS, help='length of each throughput test')
+    probe.add_argument('--no-cache', action='store_true', help='do not remember the recommendation')
+    probe.set_defaults(func=cmd_probe)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sys.exit(args.func(args))
@@ -0,0 +1,105 @@
+"""Optional per-file streaming compression for the framed transfer.
+
+Codecs are negotiated once per connection with a HELLO frame pair, then a
+file's META names the codec it uses. Compressed DATA frames carry consecutive
+slices of one compressed stream (``offset`` is the position in that stream)
+and END still carries the checksum of the original bytes. Each range of a
+parallel transfer is a stream of its own. A resumable transfer compresses
+every chunk on its own instead: one DATA frame per chunk, at the chunk's file
+offset, with the DIGEST frame still covering the original bytes.
+
+Before compressing, the sender estimates the byte entropy of a sample from
+the start of the file and sends already-compressed media as-is.
+"""
+import lzma
+import math
+import zlib
+
+# Bytes of the file sampled to decide whether compression is worth it
+SAMPLE_SIZE = 64 * 1024
+# Above this many bits per byte the data is treated as already compressed
+MAX_ENTROPY = 7.5
+# Files this small are not worth a codec
+MIN_COMPRESS_SIZE = 1024
+
+
+class Codec:
+    def __init__(self, name, compressor, decompressor):
+        self.name = name
+        self.compressor = compressor
+        self.decompressor = decompressor
+
+
+# Listed in order of preference; register more codecs here
+CODECS = {
+    'zlib': Codec('zlib', lambda: zlib.compressobj(6), zlib.decompressobj),
+    'lzma': Codec('lzma', lambda: lzma.LZMACompressor(preset=1), lzma.LZMADecompressor),
+}
+
+COMPRESSION_MODES = ['off', 'auto'] + list(CODECS)
+
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"unsupported codec {name!r}") from None
+
+
+def byte_entropy(data):
+    # Shannon entropy in bits per byte: 8.0 for random data, ~4-5 for text
+    if not data:
+        return 0.0
+    total = len(data)
+    entropy = 0.0
+    for value in range(256):
+        count = data.count(value)
+        if count:
+            p = count / total
+            entropy -= p * math.log2(p)
+    return entropy
+
+
+def choose_codec(path, filesize, mode, accepted):
+    """Return the codec name to use for ``path``, or None to send it raw."""
+    if mode == 'off' or filesize < MIN_COMPRESS_SIZE:
+        return None
+    if mode == 'auto':
+        candidates = [name for name in CODECS if name in accepted]
+        if not candidates:
+            return None
+        with open(path, 'rb') as f:
+            sample = f.read(SAMPLE_SIZE)
+        return candidates[0] if byte_entropy(sample) <= MAX_ENTROPY else None
+    return mode if mode in accepted else None
+
+
+class Decoder:
+    # Inflates one compressed stream in bounded pieces, so a tiny frame cannot expand into GBs at once
+    OUTPUT_CHUNK = 1024 * 1024
+
+    def __init__(self, codec):
+        self.decompressor = get_codec(codec).decompressor()
+
+    def decode(self, data):
+        decompressor = self.decompressor
+        output = decompressor.decompress(data, self.OUTPUT_CHUNK)
+        while output:
+            yield output
+            if getattr(decompressor, 'unconsumed_tail', b''):
+                output = decompressor.decompress(decompressor.unconsumed_tail, self.OUTPUT_CHUNK)
+            elif not getattr(decompressor, 'needs_input', True) and not decompressor.eof:
+                output = decompressor.decompress(b'', self.OUTPUT_CHUNK)
+            else:
+                break
+
+    def finish(self):
+        flush = getattr(self.decompressor, 'flush', None)
+        if flush:
+            output = flush()
+            if output:
+                yield output
+
+    @property
+    def eof(self):
+        return self.decompressor.eof
@@ -0,0 +1,147 @@
+"""rsync-style delta encoding against the receiver's existing copy of a file.
+
+The receiver splits its copy into fixed-size blocks and sends one signature
+per block: an Adler-32 weak checksum that can be rolled one byte at a time,
+and a 16-byte BLAKE2b strong hash. The sender slides a window over the new
+file and emits COPY instructions for blocks the receiver already has and
+literal ranges for everything else, then the receiver rebuilds the file.
+
+Wire form of a signature list (SIGNATURE frame, ``offset`` = block size):
+
+    weak (I) | strong (16s)   repeated once per full block
+"""
+import contextlib
+import hashlib
+import math
+import mmap
+import os
+import struct
+import zlib
+
+SIGNATURE = struct.Struct('!I16s')
+# COPY frame payload: source offset and length in the receiver's old copy
+COPY = struct.Struct('!QQ')
+
+MIN_BLOCK_SIZE = 2 * 1024
+# Keeps a signature list within one control frame
+MAX_BLOCKS = 32 * 1024
+ADLER_MOD = 65521
+# Blocks skipped between rolled windows once a long run has no match
+SKIP_BLOCKS = 7
+
+
+def block_size_for(filesize):
+    # sqrt(size) balances signature size against literal overhead, as rsync does
+    size = max(int(math.sqrt(filesize)), -(-filesize // MAX_BLOCKS), MIN_BLOCK_SIZE)
+    return 1 << (size - 1).bit_length()
+
+
+def strong_hash(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def file_signatures(path, block_size):
+    """Signature payload for every full block of ``path``."""
+    parts = []
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if len(block) < block_size:
+                break
+            parts.append(SIGNATURE.pack(zlib.adler32(block), strong_hash(block)))
+    return b''.join(parts)
+
+
+def parse_signatures(payload):
+    if len(payload) % SIGNATURE.size:
+        raise ValueError(f"signature payload of {len(payload)} bytes is not a whole number of entries")
+    table = {}
+    for index, (weak, strong) in enumerate(SIGNATURE.iter_unpack(payload)):
+        table.setdefault(weak, []).append((strong, index))
+    return table
+
+
+def find_block(table, weak, window):
+    candidates = table.get(weak)
+    if candidates:
+        strong = strong_hash(window)
+        for candidate, index in candidates:
+            if candidate == strong:
+                return index
+    return None
+
+
+def compute_delta(data, block_size, table, roll_limit=None):
+    """Yield ('copy', source_offset, length) and ('literal', start, end) covering ``data`` in order.
+
+    Unmatched bytes are searched one byte at a time with the rolling checksum.
+    After ``roll_limit`` bytes without a match the search alternates: it jumps
+    ``SKIP_BLOCKS`` blocks, then rolls over one block's worth of offsets. Old
+    blocks that follow an insertion sit one block apart, so one of them falls
+    in a rolled window within ``SKIP_BLOCKS + 1`` blocks, whatever its
+    alignment, while long runs of new data are only partly scanned in pure Python.
+    """
+    size = len(data)
+    if roll_limit is None:
+        roll_limit = max(4 * block_size, 1024 * 1024)
+    position = 0
+    literal_start = 0
+    copy_start = copy_length = 0
+    rolled = 0
+    a = b = None
+
+    while position + block_size <= size:
+        if a is None:
+            weak = zlib.adler32(data[position:position + block_size])
+            a, b = weak & 0xffff, weak >> 16
+        index = find_block(table, (b << 16) | a, data[position:position + block_size])
+        if index is not None:
+            if literal_start < position:
+                if copy_length:
+                    yield 'copy', copy_start, copy_length
+                    copy_length = 0
+                yield 'literal', literal_start, position
+            source = index * block_size
+            if copy_length and copy_start + copy_length == source:
+                copy_length += block_size
+            else:
+                if copy_length:
+                    yield 'copy', copy_start, copy_length
+                copy_start, copy_length = source, block_size
+            position += block_size
+            literal_start = position
+            rolled = 0
+            a = None
+        elif rolled >= roll_limit:
+            position += SKIP_BLOCKS * block_size
+            rolled -= block_size
+            a = None
+        else:
+            if position + block_size >= size:
+                break
+            # Adler-32 of the window shifted right by one byte
+            outgoing, incoming = data[position], data[position + block_size]
+            a = (a - outgoing + incoming) % ADLER_MOD
+            b = (b - block_size * outgoing + a - 1) % ADLER_MOD
+            position += 1
+            rolled += 1
+
+    if copy_length:
+        yield 'copy', copy_start, copy_length
+    if literal_start < size:
+        yield 'literal', literal_start, size
+
+
+@contextlib.contextmanager
+def mapped_file(path):
+    # Read-only view of the whole file for the sliding window; empty files cannot be mapped
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield memoryview(b'')
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                yield view
+            finally:
+                view.release()
@@ -0,0 +1,208 @@
+"""Zero-configuration peer discovery with UDP multicast announcements.
+
+A running receiver sends a small JSON datagram to a multicast group every
+couple of seconds: node id, name, transfer port and capabilities. Listeners
+keep a ``PeerTable`` keyed by node id and drop entries that have not been
+heard from for ``PEER_TTL`` seconds; a receiver that stops sends a final
+``leaving`` announcement so it disappears at once. Discovery costs one
+datagram per receiver per interval and no per-host probing.
+
+The group may also be a broadcast address (``255.255.255.255`` or a subnet's
+broadcast) or a unicast address such as ``127.0.0.1``, which keeps discovery
+testable on loopback where no multicast route exists.
+"""
+import ipaddress
+import json
+import socket
+import struct
+import threading
+import time
+
+from .protocol import PROTOCOL_VERSION
+
+DISCOVERY_GROUP = '239.255.77.88'
+DISCOVERY_PORT = 8887
+ANNOUNCE_INTERVAL = 2.0
+# Peers missing this many seconds of announcements are dropped
+PEER_TTL = 3 * ANNOUNCE_INTERVAL
+ANNOUNCE_MAGIC = 'socketlab'
+# Announcements must fit in one unfragmented datagram
+MAX_ANNOUNCEMENT = 1400
+
+
+def is_multicast(address):
+    try:
+        return ipaddress.ip_address(address).is_multicast
+    except ValueError:
+        return False
+
+
+class PeerTable:
+    def __init__(self, ttl=PEER_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.peers = {}
+
+    def update(self, announcement, host, now=None):
+        # Returns True when the set of peers or their details changed
+        now = time.time() if now is None else now
+        node_id = announcement['node_id']
+        with self.lock:
+            if announcement.get('leaving'):
+                return self.peers.pop(node_id, None) is not None
+            peer = {
+                'node_id': node_id,
+                'name': announcement.get('name', node_id),
+                'host': announcement.get('host') or host,
+                'port': announcement['port'],
+                'capabilities': announcement.get('capabilities', {}),
+                'last_seen': now,
+            }
+            previous = self.peers.get(node_id)
+            self.peers[node_id] = peer
+            return previous is None or {**previous, 'last_seen': now} != peer
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            stale = [node_id for node_id, peer in self.peers.items() if now - peer['last_seen'] > self.ttl]
+            for node_id in stale:
+                del self.peers[node_id]
+        return bool(stale)
+
+    def snapshot(self):
+        with self.lock:
+            return sorted((dict(peer) for peer in self.peers.values()), key=lambda peer: (peer['name'], peer['host']))
+
+
+class Announcer:
+    def __init__(self, node_id, port, name=None, capabilities=None, group=DISCOVERY_GROUP,
+                 discovery_port=DISCOVERY_PORT, interval=ANNOUNCE_INTERVAL, interface='0.0.0.0', hops=1):
+        self.node_id = node_id
+        self.port = port
+        self.name = name or node_id
+        self.capabilities = capabilities or {}
+        self.group = group
+        self.discovery_port = discovery_port
+        self.interval = interval
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if is_multicast(group):
+            # Stay on the local network and let listeners on this machine hear us too
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, hops)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            if interface != '0.0.0.0':
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        else:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def announcement(self, leaving=False):
+        payload = json.dumps({
+            'magic': ANNOUNCE_MAGIC,
+            'version': PROTOCOL_VERSION,
+            'node_id': self.node_id,
+            'name': self.name,
+            'port': self.port,
+            'capabilities': self.capabilities,
+            'leaving': leaving,
+        }).encode('utf-8')
+        if len(payload) > MAX_ANNOUNCEMENT:
+            raise ValueError(f"announcement of {len(payload)} bytes does not fit in one datagram")
+        return payload
+
+    def announce(self, leaving=False):
+        self.sock.sendto(self.announcement(leaving), (self.group, self.discovery_port))
+
+    def start(self):
+        self.announcement()  # fail fast on an oversized announcement
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.announce()
+            except OSError:
+                pass  # no route yet (e.g. network still coming up); try again next interval
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval + 1)
+        try:
+            self.announce(leaving=True)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class PeerListener:
+    def __init__(self, table=None, group=DISCOVERY_GROUP, discovery_port=DISCOVERY_PORT, interface='0.0.0.0',
+                 ignore=(), on_change=None):
+        self.table = table or PeerTable()
+        self.group = group
+        self.discovery_port = discovery_port
+        self.interface = interface
+        # Node ids to leave out, such as our own receiver's
+        self.ignore = set(ignore)
+        self.on_change = on_change or (lambda peers: None)
+        self.sock = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        # Bind in the caller's thread so address errors surface immediately
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Several listeners on one machine (GUI and CLI) can share the discovery port
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if is_multicast(self.group):
+            self.sock.bind(('', self.discovery_port))
+            membership = struct.pack('4s4s', socket.inet_aton(self.group), socket.inet_aton(self.interface))
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        else:
+            self.sock.bind(('' if self.group == '255.255.255.255' else self.group, self.discovery_port))
+        # Wakes up regularly to expire peers even when nothing arrives
+        self.sock.settimeout(1.0)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            changed = False
+            try:
+                data, address = self.sock.recvfrom(MAX_ANNOUNCEMENT)
+                changed = self.handle(data, address[0])
+            except socket.timeout:
+                pass
+            except OSError:
+                if self.stopped.is_set():
+                    break
+                raise
+            if self.table.expire() or changed:
+                self.on_change(self.table.snapshot())
+
+    def handle(self, data, host):
+        try:
+            announcement = json.loads(data.decode('utf-8'))
+            if announcement.get('magic') != ANNOUNCE_MAGIC or announcement.get('version') != PROTOCOL_VERSION:
+                return False
+            if announcement['node_id'] in self.ignore:
+                return False
+            return self.table.update(announcement, host)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # Stray or malformed datagrams on the group are ignored
+            return False
+
+    def peers(self):
+        return self.table.snapshot()
+
+    def stop(self):
+        self.stopped.set()
+        if self.sock:
+            self.sock.close()
+        if self.thread:
+            self.thread.join(timeout=2)
@@ -0,0 +1,63 @@
+"""Non-blocking event bus between transfer threads and a single UI thread.
+
+Worker threads publish without ever touching widgets or waiting on the UI.
+The UI thread calls ``drain`` on a fixed tick; everything published since
+the previous tick is delivered through ``sink`` (a ``queue.Queue``):
+
+- ``emit``: delivered once per call, in order (status changes, dialogs)
+- ``coalesce``: only the latest call per key survives a tick (progress bars, stats)
+- ``append``: items are batched per key into a single call (log lines)
+
+UI work therefore grows with the tick rate, not with the number of chunks.
+"""
+import queue
+import threading
+
+# 30 Hz is smooth for progress bars and cheap for Tk
+DEFAULT_TICK_MS = 33
+
+
+class EventBus:
+    def __init__(self, sink=None):
+        self.sink = sink if sink is not None else queue.Queue()
+        self.lock = threading.Lock()
+        self.latest = {}
+        self.batches = {}
+
+    def emit(self, fn, *args, **kwargs):
+        self.sink.put_nowait((fn, args, kwargs))
+
+    def coalesce(self, key, fn, *args, **kwargs):
+        with self.lock:
+            self.latest[key] = (fn, args, kwargs)
+
+    def append(self, key, fn, item):
+        with self.lock:
+            batch = self.batches.get(key)
+            if batch is None:
+                self.batches[key] = (fn, [item])
+            else:
+                batch[1].append(item)
+
+    def flush(self):
+        with self.lock:
+            latest, self.latest = self.latest, {}
+            batches, self.batches = self.batches, {}
+        for fn, items in batches.values():
+            self.sink.put_nowait((fn, (items,), {}))
+        for event in latest.values():
+            self.sink.put_nowait(event)
+
+    def drain(self, on_error=None):
+        # Call from the UI thread only
+        self.flush()
+        while True:
+            try:
+                fn, args, kwargs = self.sink.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                if on_error:
+                    on_error(e)
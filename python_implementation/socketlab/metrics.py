@@ -0,0 +1,290 @@
+"""Process-wide metrics: counters, gauges, histograms and ring-buffered time series.
+
+Everything in one process shares ``REGISTRY``. The TCP sender and receiver feed
+it through ``TransferStats``, and the FastAPI backend feeds it from its
+Socket.IO handlers. ``render()`` produces the Prometheus text exposition format
+for a ``/metrics`` endpoint.
+
+Histograms keep fixed bucket counts, so an observation costs one pass over the
+buckets and memory does not grow with traffic. Percentiles are interpolated
+within buckets the way Prometheus' ``histogram_quantile`` does. Time series
+keep the last ``capacity`` intervals in a ring buffer for live charts.
+"""
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def exponential_buckets(start, factor, count):
+    return [start * factor ** index for index in range(count)]
+
+
+# 64 KB/s to 8 GB/s
+SPEED_BUCKETS = exponential_buckets(64 * 1024, 2, 18)
+# 1 ms to about 65 s
+LATENCY_BUCKETS = exponential_buckets(0.001, 2, 17)
+SERIES_CAPACITY = 300
+SERIES_INTERVAL = 1.0
+
+
+def format_labels(labels, extra=None):
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help='', labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("a counter only goes up")
+        with self.lock:
+            self.value += amount
+
+    def reset(self):
+        with self.lock:
+            self.value = 0
+
+    def samples(self):
+        return [(self.name, self.labels, {}, self.value)]
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help='', labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = sorted(buckets)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # One count per bound plus the +Inf bucket; not cumulative until rendered
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.min = None
+            self.max = None
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, fraction):
+        with self.lock:
+            if not self.count:
+                return None
+            rank = fraction * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                if count and seen + count >= rank:
+                    if index == len(self.bounds):
+                        return self.max  # beyond the last bound; the largest value seen is the best estimate
+                    lower = self.bounds[index - 1] if index else min(self.min, self.bounds[0])
+                    upper = self.bounds[index]
+                    estimate = lower + (upper - lower) * (rank - seen) / count
+                    return max(self.min, min(self.max, estimate))
+                seen += count
+            return self.max
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds + [math.inf], counts):
+            cumulative += bucket_count
+            samples.append((f"{self.name}_bucket", self.labels, {'le': format_value(bound)}, cumulative))
+        samples.append((f"{self.name}_sum", self.labels, {}, total))
+        samples.append((f"{self.name}_count", self.labels, {}, count))
+        return samples
+
+    def snapshot(self):
+        with self.lock:
+            count, total, low, high = self.count, self.sum, self.min, self.max
+        return {
+            'count': count,
+            'sum': total,
+            'min': low,
+            'max': high,
+            'mean': total / count if count else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+        }
+
+
+class TimeSeries:
+    # Not exported to Prometheus, which keeps its own history; for charts and snapshots
+    kind = 'series'
+
+    def __init__(self, name, help='', labels=(), capacity=SERIES_CAPACITY, interval=SERIES_INTERVAL,
+                 aggregate='sum'):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.capacity = capacity
+        self.interval = interval
+        # 'sum' adds up values within an interval (bytes per second), 'last' keeps the latest sample
+        self.aggregate = aggregate
+        self.lock = threading.Lock()
+        self.points = deque(maxlen=capacity)
+
+    def record(self, value, now=None):
+        now = time.time() if now is None else now
+        slot = math.floor(now / self.interval) * self.interval
+        with self.lock:
+            if self.points and self.points[-1][0] == slot:
+                previous = self.points[-1][1]
+                self.points[-1] = (slot, previous + value if self.aggregate == 'sum' else value)
+                return
+            if self.points and self.aggregate == 'sum':
+                # Empty intervals are zeros, so the points stay evenly spaced
+                missing = min(self.capacity, round((slot - self.points[-1][0]) / self.interval) - 1)
+                for index in range(missing, 0, -1):
+                    self.points.append((slot - index * self.interval, 0))
+            self.points.append((slot, value))
+
+    def reset(self):
+        with self.lock:
+            self.points.clear()
+
+    def samples(self):
+        return []
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.points)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, sorted label items) -> metric; metrics sharing a name form one family
+        self.metrics = {}
+
+    def get_or_create(self, metric_class, name, help, labels, **options):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = self.metrics[key] = metric_class(name, help, key[1], **options)
+            elif type(metric) is not metric_class:
+                raise ValueError(f"metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help='', labels=None):
+        return self.get_or_create(Counter, name, help, labels)
+
+    def gauge(self, name, help='', labels=None):
+        return self.get_or_create(Gauge, name, help, labels)
+
+    def histogram(self, name, help='', labels=None, buckets=LATENCY_BUCKETS):
+        return self.get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+    def series(self, name, help='', labels=None, capacity=SERIES_CAPACITY, interval=SERIES_INTERVAL,
+               aggregate='sum'):
+        return self.get_or_create(TimeSeries, name, help, labels, capacity=capacity, interval=interval,
+                                  aggregate=aggregate)
+
+    def families(self):
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        families = {}
+        for (name, _), metric in metrics:
+            families.setdefault(name, []).append(metric)
+        return families
+
+    def render(self):
+        """All counters, gauges and histograms in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        for name, metrics in self.families().items():
+            if metrics[0].kind == 'series':
+                continue
+            if metrics[0].help:
+                lines.append(f"# HELP {name} {metrics[0].help}")
+            lines.append(f"# TYPE {name} {metrics[0].kind}")
+            for metric in metrics:
+                for sample_name, labels, extra, value in metric.samples():
+                    lines.append(f"{sample_name}{format_labels(labels, extra)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        # JSON-friendly view of every metric, percentiles and time series included
+        return {name: [{'labels': dict(metric.labels), 'type': metric.kind, 'value': metric.snapshot()}
+                       for metric in metrics]
+                for name, metrics in self.families().items()}
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def serve_metrics(port, host='', registry=REGISTRY):
+    """Serve ``registry.render()`` at ``/metrics`` from a daemon thread; returns the server."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would flood the console
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,216 @@
+"""iperf-style link probe against a running receiver, with recommended settings.
+
+Over PROBE frames the probing side measures the round-trip time distribution,
+then timed streams of throwaway DATA frames: uploads for several chunk sizes
+and stream counts, a download, and both directions at once. The
+bandwidth-delay product (best throughput x median RTT) sizes the recommended
+socket buffers; the fastest chunk size and the fewest streams that come close
+to the best throughput complete the recommendation. Results are cached per
+peer, so a later transfer can reuse them without probing again.
+"""
+import json
+import os
+import socket
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .protocol import (FRAME_ACK, FRAME_DATA, FRAME_END, FRAME_PROBE, ProtocolError, pack_header,
+                       recv_frame, recv_header, recv_payload, send_frame, send_json_frame)
+from .tuning import DEFAULT_PROFILE, SocketProfile
+
+RTT_SAMPLES = 20
+CHUNK_SIZES = [64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+STREAM_COUNTS = [1, 2, 4]
+TEST_SECONDS = 1.0
+# Limits the receiver enforces on download requests
+MAX_PROBE_SECONDS = 10
+MAX_PROBE_CHUNK = 16 * 1024 * 1024
+# A setting within this fraction of the best throughput is as good, and cheaper
+GOOD_ENOUGH = 0.95
+MIN_SOCKET_BUFFER = 256 * 1024
+MAX_SOCKET_BUFFER = 16 * 1024 * 1024
+CACHE_MAX_AGE = 24 * 3600
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.socketlab', 'link_probes.json')
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def socket_buffer_for(bdp):
+    # Twice the BDP keeps the window open while ACKs are in flight
+    size = 1 << max(0, int(2 * bdp) - 1).bit_length()
+    return max(MIN_SOCKET_BUFFER, min(MAX_SOCKET_BUFFER, size))
+
+
+class LinkProbe:
+    def __init__(self, host, port, profile=DEFAULT_PROFILE, seconds=TEST_SECONDS, chunk_sizes=CHUNK_SIZES,
+                 stream_counts=STREAM_COUNTS, on_log=None):
+        self.host = host
+        self.port = port
+        self.profile = profile
+        self.seconds = seconds
+        self.chunk_sizes = chunk_sizes
+        self.stream_counts = stream_counts
+        self.on_log = on_log or (lambda message: None)
+
+    def connect(self):
+        sock = self.profile.connect((self.host, self.port), timeout=MAX_PROBE_SECONDS + 5)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def measure_rtt(self, samples=RTT_SAMPLES):
+        with self.connect() as sock:
+            rtts = []
+            # One extra round trip first, so connection warm-up is not measured
+            for seq in range(samples + 1):
+                start = time.perf_counter()
+                send_json_frame(sock, FRAME_PROBE, {'test': 'echo', 'seq': seq})
+                recv_frame(sock, FRAME_PROBE)
+                if seq:
+                    rtts.append(time.perf_counter() - start)
+        ordered = sorted(rtts)
+        return {
+            'samples': len(rtts),
+            'min': ordered[0],
+            'median': statistics.median(ordered),
+            'p90': percentile(ordered, 0.9),
+            'max': ordered[-1],
+            'jitter': statistics.pstdev(ordered),
+        }
+
+    def upload(self, chunk_size):
+        frame = pack_header(FRAME_DATA, chunk_size) + os.urandom(chunk_size)
+        with self.connect() as sock:
+            send_json_frame(sock, FRAME_PROBE, {'test': 'upload'})
+            start = time.perf_counter()
+            deadline = start + self.seconds
+            sent = 0
+            while time.perf_counter() < deadline:
+                sock.sendall(frame)
+                sent += chunk_size
+            send_frame(sock, FRAME_END)
+            _, payload = recv_frame(sock, FRAME_ACK)
+            elapsed = time.perf_counter() - start
+        if json.loads(payload.decode('utf-8'))['bytes'] != sent:
+            raise ProtocolError("partner counted a different number of probe bytes")
+        return sent, elapsed
+
+    def download(self, chunk_size):
+        buffer = memoryview(bytearray(min(chunk_size, 1024 * 1024)))
+        with self.connect() as sock:
+            start = time.perf_counter()
+            send_json_frame(sock, FRAME_PROBE, {'test': 'download', 'chunk_size': chunk_size,
+                                                'seconds': self.seconds})
+            received = 0
+            while True:
+                header = recv_header(sock)
+                if header is None:
+                    raise ConnectionError("connection closed during a download probe")
+                frame_type, _, length = header
+                for view in recv_payload(sock, length, buffer):
+                    received += len(view)
+                if frame_type == FRAME_END:
+                    break
+            elapsed = time.perf_counter() - start
+        return received, elapsed
+
+    def throughput(self, direction, chunk_size, streams=1):
+        # Bytes per second summed over all streams; 'both' runs that many streams each way
+        tests = {'upload': [self.upload] * streams, 'download': [self.download] * streams,
+                 'both': [self.upload, self.download] * streams}[direction]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(tests)) as pool:
+            results = list(pool.map(lambda test: test(chunk_size), tests))
+        return sum(nbytes for nbytes, _ in results) / (time.perf_counter() - start)
+
+    def run(self):
+        self.on_log(f"📶 Probing {self.host}:{self.port}...")
+        rtt = self.measure_rtt()
+        self.on_log(f"⏱️ RTT median {rtt['median'] * 1000:.2f} ms, p90 {rtt['p90'] * 1000:.2f} ms, "
+                    f"jitter {rtt['jitter'] * 1000:.2f} ms")
+
+        uploads = []
+        for chunk_size in self.chunk_sizes:
+            uploads.append({'chunk_size': chunk_size, 'streams': 1,
+                            'bps': self.throughput('upload', chunk_size)})
+            self.on_log(f"📤 {chunk_size // 1024} KB chunks, 1 stream: {uploads[-1]['bps'] / 1024 / 1024:.1f} MB/s")
+        best_single = max(uploads, key=lambda test: test['bps'])['bps']
+        chunk_size = next(test['chunk_size'] for test in uploads if test['bps'] >= GOOD_ENOUGH * best_single)
+
+        for streams in self.stream_counts:
+            if streams > 1:
+                uploads.append({'chunk_size': chunk_size, 'streams': streams,
+                                'bps': self.throughput('upload', chunk_size, streams)})
+                self.on_log(f"📤 {chunk_size // 1024} KB chunks, {streams} streams: "
+                            f"{uploads[-1]['bps'] / 1024 / 1024:.1f} MB/s")
+        with_chunk = [test for test in uploads if test['chunk_size'] == chunk_size]
+        best = max(with_chunk, key=lambda test: test['bps'])
+        streams = min(test['streams'] for test in with_chunk if test['bps'] >= GOOD_ENOUGH * best['bps'])
+
+        download = self.throughput('download', chunk_size)
+        self.on_log(f"📥 Download: {download / 1024 / 1024:.1f} MB/s")
+        bidirectional = self.throughput('both', chunk_size)
+        self.on_log(f"🔁 Both directions: {bidirectional / 1024 / 1024:.1f} MB/s")
+
+        bdp = max(best['bps'], download) * rtt['median']
+        buffer_size = socket_buffer_for(bdp)
+        result = {
+            'host': self.host,
+            'port': self.port,
+            'measured_at': time.time(),
+            'rtt': rtt,
+            'upload': uploads,
+            'download': download,
+            'bidirectional': bidirectional,
+            'bdp': bdp,
+            'recommended': {'chunk_size': chunk_size, 'sndbuf': buffer_size, 'rcvbuf': buffer_size,
+                            'streams': streams},
+        }
+        self.on_log(f"📐 Bandwidth-delay product {bdp / 1024:.1f} KB")
+        self.on_log(f"💡 Recommended: {describe_recommendation(result)}")
+        return result
+
+
+def describe_recommendation(result):
+    recommended = result['recommended']
+    return (f"{recommended['chunk_size'] // 1024} KB chunks, {recommended['sndbuf'] // 1024} KB socket buffers, "
+            f"{recommended['streams']} stream(s)")
+
+
+def recommended_profile(result):
+    recommended = result['recommended']
+    return SocketProfile(f"probed {result['host']}", sndbuf=recommended['sndbuf'], rcvbuf=recommended['rcvbuf'],
+                         nodelay=True, chunk_size=recommended['chunk_size'])
+
+
+class ProbeCache:
+    # Latest probe result per peer, kept in a JSON file across runs
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age=CACHE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, host, port):
+        result = self.load().get(f"{host}:{port}")
+        if result and time.time() - result['measured_at'] < self.max_age:
+            return result
+        return None
+
+    def put(self, result):
+        results = self.load()
+        results[f"{result['host']}:{result['port']}"] = result
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.probes.', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,218 @@
+"""Length-prefixed binary framing for the TCP file transfer.
+
+Every frame starts with a fixed header followed by ``length`` payload bytes:
+
+    magic (2s) | version (B) | type (B) | offset (Q) | length (Q)
+
+A file is sent as one META frame (JSON), any number of DATA frames (raw
+bytes, ``offset`` is the position in the file), and one END frame carrying
+the hex checksum. The receiver answers each file with an ACK frame (JSON),
+so several files can be pipelined over a single connection.
+
+A connection may open with a HELLO frame (JSON) listing the compression
+codecs the sender can use; the receiver answers with a HELLO listing the
+ones it accepts (see ``compression``).
+
+A delta transfer (META with ``delta``) is answered with a SIGNATURE frame for
+the receiver's existing copy; the sender then mixes DATA frames with COPY
+frames that reuse blocks of that copy (see ``delta``).
+
+A directory is sent as one META with ``archive`` followed by an ENTRY frame
+per directory or file (see ``archive``).
+
+Resumable transfers follow each chunk's DATA with a DIGEST frame (raw
+BLAKE2b, ``offset`` = chunk start) and end with the Merkle root of all chunk
+digests (see ``merkle``). The receiver answers END with either an ACK or a
+RESUME frame re-requesting chunks that failed verification.
+
+A PROBE frame (JSON) starts a link measurement instead of a file: an echo
+for RTT, or a timed stream of throwaway DATA frames in either direction
+(see ``probe``).
+"""
+import hashlib
+import json
+import os
+import struct
+
+MAGIC = b'SL'
+PROTOCOL_VERSION = 1
+
+HEADER = struct.Struct('!2sBBQQ')
+
+FRAME_META = 1
+FRAME_DATA = 2
+FRAME_END = 3
+FRAME_ACK = 4
+FRAME_RESUME = 5
+FRAME_HELLO = 6
+FRAME_SIGNATURE = 7
+FRAME_COPY = 8
+FRAME_ENTRY = 9
+FRAME_DIGEST = 10
+FRAME_PROBE = 11
+
+FRAME_NAMES = {
+    FRAME_META: 'META',
+    FRAME_DATA: 'DATA',
+    FRAME_END: 'END',
+    FRAME_ACK: 'ACK',
+    FRAME_RESUME: 'RESUME',
+    FRAME_HELLO: 'HELLO',
+    FRAME_SIGNATURE: 'SIGNATURE',
+    FRAME_COPY: 'COPY',
+    FRAME_ENTRY: 'ENTRY',
+    FRAME_DIGEST: 'DIGEST',
+    FRAME_PROBE: 'PROBE',
+}
+
+# Upper bound for JSON control frames, so a bad peer cannot make us allocate GBs
+MAX_CONTROL_FRAME = 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def pack_header(frame_type, length, offset=0):
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, frame_type, offset, length)
+
+
+def unpack_header(data):
+    magic, version, frame_type, offset, length = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ProtocolError(f"bad frame magic {magic!r}")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+    if frame_type not in FRAME_NAMES:
+        raise ProtocolError(f"unknown frame type {frame_type}")
+    if frame_type != FRAME_DATA and length > MAX_CONTROL_FRAME:
+        raise ProtocolError(f"{FRAME_NAMES[frame_type]} frame too large: {length} bytes")
+    return frame_type, offset, length
+
+
+def send_frame(sock, frame_type, payload=b'', offset=0):
+    sock.sendall(pack_header(frame_type, len(payload), offset) + payload)
+
+
+def send_json_frame(sock, frame_type, obj):
+    send_frame(sock, frame_type, json.dumps(obj).encode('utf-8'))
+
+
+def recv_exact(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError(f"connection closed after {received} of {size} bytes")
+        received += n
+    return bytes(data)
+
+
+def recv_payload(sock, length, buffer):
+    # Yields views into ``buffer``; each view is only valid until the next one
+    remaining = length
+    while remaining:
+        n = sock.recv_into(buffer, min(len(buffer), remaining))
+        if not n:
+            raise ConnectionError(f"connection closed with {remaining} payload bytes outstanding")
+        remaining -= n
+        yield buffer[:n]
+
+
+def recv_header(sock):
+    # A clean close between frames ends the session; anywhere else it is an error
+    first = sock.recv(HEADER.size)
+    if not first:
+        return None
+    if len(first) < HEADER.size:
+        first += recv_exact(sock, HEADER.size - len(first))
+    return unpack_header(first)
+
+
+def recv_json(sock, length):
+    return json.loads(recv_exact(sock, length).decode('utf-8'))
+
+
+def recv_frame(sock, expected_type):
+    _, offset, payload = recv_frame_of(sock, expected_type)
+    return offset, payload
+
+
+def recv_frame_of(sock, *expected_types):
+    # Like recv_frame, for replies that may be one of several frame types
+    names = ' or '.join(FRAME_NAMES[frame_type] for frame_type in expected_types)
+    header = recv_header(sock)
+    if header is None:
+        raise ConnectionError(f"connection closed while waiting for {names}")
+    frame_type, offset, length = header
+    if frame_type not in expected_types:
+        raise ProtocolError(f"expected {names} frame, got {FRAME_NAMES[frame_type]}")
+    return frame_type, offset, recv_exact(sock, length)
+
+
+async def async_recv_into(loop, sock, view):
+    # Fills ``view`` completely from a non-blocking socket
+    received = 0
+    while received < len(view):
+        n = await loop.sock_recv_into(sock, view[received:])
+        if not n:
+            raise ConnectionError(f"connection closed after {received} of {len(view)} bytes")
+        received += n
+
+
+async def async_recv_exact(loop, sock, size):
+    data = bytearray(size)
+    await async_recv_into(loop, sock, memoryview(data))
+    return bytes(data)
+
+
+async def async_recv_header(loop, sock):
+    data = bytearray(HEADER.size)
+    first = await loop.sock_recv_into(sock, data)
+    if not first:
+        return None
+    if first < HEADER.size:
+        await async_recv_into(loop, sock, memoryview(data)[first:])
+    return unpack_header(data)
+
+
+async def async_recv_json(loop, sock, length):
+    return json.loads((await async_recv_exact(loop, sock, length)).decode('utf-8'))
+
+
+async def async_send_frame(loop, sock, frame_type, payload=b'', offset=0):
+    await loop.sock_sendall(sock, pack_header(frame_type, len(payload), offset) + payload)
+
+
+async def async_send_json_frame(loop, sock, frame_type, obj):
+    await async_send_frame(loop, sock, frame_type, json.dumps(obj).encode('utf-8'))
+
+
+def file_checksum(path, start=0, end=None, block_size=1024 * 1024):
+    hasher = hashlib.md5()
+    buffer = memoryview(bytearray(block_size))
+    with open(path, 'rb') as f:
+        if end is None:
+            end = os.fstat(f.fileno()).st_size
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            n = f.readinto(buffer[:min(block_size, remaining)])
+            if not n:
+                break
+            hasher.update(buffer[:n])
+            remaining -= n
+    return hasher.hexdigest()
+
+
+def split_ranges(filesize, streams, align=1024 * 1024):
+    # Near-equal [start, end) ranges on ``align`` boundaries, never more than needed
+    step = max(align, -(-filesize // streams // align) * align)
+    return [(start, min(start + step, filesize)) for start in range(0, filesize, step)] or [(0, 0)]
+
+
+def combine_digests(digests):
+    # Digest of the ordered per-range digests, identical on both ends of a parallel transfer
+    return hashlib.md5(''.join(digests).encode('ascii')).hexdigest()
@@ -0,0 +1,292 @@
+"""Token-bucket bandwidth limits per transfer, per peer and in total.
+
+Every transfer registered with a ``RateLimiter`` gets a ``Throttle`` with its
+own token bucket. Bucket rates are recomputed whenever a transfer starts or
+ends, or a limit changes, and every ``REBALANCE_INTERVAL`` while data flows:
+each peer's limit is split between that peer's transfers, then the global
+limit is split between all of them. Both splits are weighted max-min fair, so
+bandwidth a capped transfer cannot use goes to the others, and
+``interactive`` transfers get a larger weight than ``bulk`` ones without
+starving them. A transfer that drew well under its rate in the last interval
+(stalled on disk, or on a slow link) is capped at twice what it drew, so the
+rest of its share goes to the transfers that can use it; once it uses that
+cap, the cap is lifted again.
+
+Rates are in bytes per second; ``None`` means unlimited.
+"""
+import asyncio
+import os
+import threading
+import time
+
+PRIORITY_WEIGHTS = {'interactive': 8, 'bulk': 1}
+DEFAULT_PRIORITY = 'bulk'
+# Data is sent (and accounted) in pieces of at most this size while a limit is active
+THROTTLE_SLICE = 64 * 1024
+# A bucket can save up this many seconds of its rate, so short pauses are not lost
+BURST_SECONDS = 0.1
+# How often shares follow the transfers' measured draw
+REBALANCE_INTERVAL = 1.0
+# A transfer that drew at least this part of its rate is taken to want more
+SATURATED = 0.8
+DEMAND_HEADROOM = 2
+
+
+def parse_rate(text):
+    # '10M' -> bytes per second; '', '0', 'off' and 'none' mean unlimited
+    text = str(text).strip().upper().rstrip('/S').rstrip('B')
+    if text in ('', '0', 'OFF', 'NONE'):
+        return None
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    multiplier = units.get(text[-1], 1)
+    rate = float(text[:-1] if text[-1] in units else text) * multiplier
+    if rate <= 0:
+        return None
+    return rate
+
+
+def format_rate(rate):
+    return 'unlimited' if rate is None else f"{rate / 1024 / 1024:.2f} MB/s"
+
+
+def fair_share(budget, demands):
+    """Split ``budget`` between ``demands`` ({key: (cap, weight)}), weighted max-min fair."""
+    if budget is None:
+        return {key: cap for key, (cap, _) in demands.items()}
+    shares = {}
+    remaining = budget
+    total_weight = sum(weight for _, weight in demands.values())
+    # Smallest cap per unit of weight first: whatever they leave over is shared by the rest
+    ordered = sorted(demands.items(), key=lambda item: float('inf') if item[1][0] is None else item[1][0] / item[1][1])
+    for key, (cap, weight) in ordered:
+        share = remaining * weight / total_weight
+        if cap is not None:
+            share = min(share, cap)
+        shares[key] = share
+        remaining -= share
+        total_weight -= weight
+    return shares
+
+
+def min_rate(a, b):
+    # The tighter of two rates, where None is unlimited
+    if a is None:
+        return b
+    return a if b is None else min(a, b)
+
+
+class TokenBucket:
+    def __init__(self, rate=None):
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        # Bytes reserved since the last take_drawn
+        self.drawn = 0
+
+    def refill(self, now):
+        if self.rate is not None:
+            burst = max(self.rate * BURST_SECONDS, THROTTLE_SLICE)
+            self.tokens = min(burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.refill(time.monotonic())
+            self.rate = rate
+            if rate is None:
+                self.tokens = 0.0
+
+    def reserve(self, nbytes):
+        # Takes the tokens now (possibly into debt) and returns how long to wait before using them
+        with self.lock:
+            if self.rate is None:
+                return 0.0
+            self.refill(time.monotonic())
+            self.tokens -= nbytes
+            self.drawn += nbytes
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def take_drawn(self):
+        # Bytes reserved since the last call, and the rate they were reserved at
+        with self.lock:
+            drawn, self.drawn = self.drawn, 0
+            return drawn, self.rate
+
+
+class Throttle:
+    # One transfer's share of a RateLimiter; may be used from several threads at once
+    def __init__(self, limiter, peer, priority, rate):
+        if priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"unknown priority {priority!r}, choose from {', '.join(PRIORITY_WEIGHTS)}")
+        self.limiter = limiter
+        self.peer = peer
+        self.priority = priority
+        self.rate = rate
+        self.bucket = TokenBucket()
+        # Rate measured from the bucket's recent draw; None until the transfer is seen to want less than it gets
+        self.demand = None
+        self.measured_at = time.monotonic()
+
+    @property
+    def limited(self):
+        return self.bucket.rate is not None
+
+    def measure_demand(self, now):
+        if now - self.measured_at >= REBALANCE_INTERVAL:
+            drawn, rate = self.bucket.take_drawn()
+            elapsed, self.measured_at = now - self.measured_at, now
+            if rate is None or drawn >= rate * elapsed * SATURATED:
+                self.demand = None
+            else:
+                self.demand = max(drawn / elapsed * DEMAND_HEADROOM, THROTTLE_SLICE)
+        return self.demand
+
+    def consume(self, nbytes):
+        self.limiter.maybe_rebalance()
+        delay = self.bucket.reserve(nbytes)
+        if delay:
+            time.sleep(delay)
+
+    async def consume_async(self, nbytes):
+        self.limiter.maybe_rebalance()
+        delay = self.bucket.reserve(nbytes)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.limiter.rebalance()
+
+    def set_priority(self, priority):
+        if priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"unknown priority {priority!r}, choose from {', '.join(PRIORITY_WEIGHTS)}")
+        self.priority = priority
+        self.limiter.rebalance()
+
+    def close(self):
+        self.limiter.unregister(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RateLimiter:
+    def __init__(self, global_rate=None, peer_rate=None, transfer_rate=None):
+        self.lock = threading.Lock()
+        self.global_rate = global_rate
+        # Default limit for every peer, overridden per address by peer_rates
+        self.peer_rate = peer_rate
+        self.peer_rates = {}
+        # Default limit for transfers that do not set their own
+        self.transfer_rate = transfer_rate
+        self.throttles = set()
+        self.rebalanced_at = time.monotonic()
+
+    def register(self, peer, priority=DEFAULT_PRIORITY, rate=None):
+        throttle = Throttle(self, peer, priority, rate)
+        with self.lock:
+            self.throttles.add(throttle)
+        self.rebalance()
+        return throttle
+
+    def unregister(self, throttle):
+        with self.lock:
+            self.throttles.discard(throttle)
+        self.rebalance()
+
+    def set_global_rate(self, rate):
+        self.global_rate = rate
+        self.rebalance()
+
+    def set_peer_rate(self, rate, peer=None):
+        if peer is None:
+            self.peer_rate = rate
+        elif rate is None:
+            self.peer_rates.pop(peer, None)
+        else:
+            self.peer_rates[peer] = rate
+        self.rebalance()
+
+    def set_transfer_rate(self, rate):
+        self.transfer_rate = rate
+        self.rebalance()
+
+    def maybe_rebalance(self):
+        # Called as data flows, so shares keep up with how much each transfer actually draws
+        if time.monotonic() - self.rebalanced_at >= REBALANCE_INTERVAL:
+            self.rebalance()
+
+    def rebalance(self):
+        with self.lock:
+            now = self.rebalanced_at = time.monotonic()
+            by_peer = {}
+            for throttle in self.throttles:
+                by_peer.setdefault(throttle.peer, []).append(throttle)
+            caps = {}
+            for peer, throttles in by_peer.items():
+                budget = self.peer_rates.get(peer, self.peer_rate)
+                demands = {}
+                for throttle in throttles:
+                    cap = throttle.rate if throttle.rate is not None else self.transfer_rate
+                    demand = throttle.measure_demand(now)
+                    # Measured demand only matters where a budget is shared; alone, a transfer keeps its cap
+                    if budget is not None or self.global_rate is not None:
+                        cap = min_rate(cap, demand)
+                    demands[throttle] = (cap, PRIORITY_WEIGHTS[throttle.priority])
+                caps.update(fair_share(budget, demands))
+            shares = fair_share(self.global_rate, {
+                throttle: (caps[throttle], PRIORITY_WEIGHTS[throttle.priority]) for throttle in self.throttles})
+            for throttle, share in shares.items():
+                throttle.bucket.set_rate(share)
+
+    def describe(self):
+        with self.lock:
+            active = len(self.throttles)
+        peers = ', '.join(f"{peer} {format_rate(rate)}" for peer, rate in sorted(self.peer_rates.items()))
+        return (f"total {format_rate(self.global_rate)}, per peer {format_rate(self.peer_rate)}"
+                f"{f' ({peers})' if peers else ''}, per transfer {format_rate(self.transfer_rate)}, "
+                f"{active} active transfer(s)")
+
+
+class ThrottledSocket:
+    # Socket wrapper that charges every byte sent to a Throttle; anything else goes straight to the socket
+    def __init__(self, sock, throttle):
+        self.sock = sock
+        self.throttle = throttle
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sock.close()
+
+    def sendall(self, data):
+        if not self.throttle.limited:
+            return self.sock.sendall(data)
+        view = memoryview(data).cast('B')
+        for start in range(0, len(view), THROTTLE_SLICE):
+            piece = view[start:start + THROTTLE_SLICE]
+            self.throttle.consume(len(piece))
+            self.sock.sendall(piece)
+
+    def sendfile(self, file, offset=0, count=None):
+        if not self.throttle.limited:
+            return self.sock.sendfile(file, offset=offset, count=count)
+        if count is None:
+            count = max(0, os.fstat(file.fileno()).st_size - offset)
+        sent = 0
+        while sent < count:
+            piece = min(THROTTLE_SLICE, count - sent)
+            self.throttle.consume(piece)
+            n = self.sock.sendfile(file, offset=offset + sent, count=piece)
+            if not n:
+                break
+            sent += n
+        return sent
@@ -0,0 +1,1144 @@
+"""Event-loop based receiver for the framed TCP transfer protocol.
+
+One asyncio loop, running in a background thread, serves every inbound
+connection with non-blocking sockets. Each connection gets a
+``ConnectionState``. Receive buffers come from a pool capped by a global
+memory budget, connections are capped by a file-descriptor budget, and all
+disk I/O runs on a small bounded thread pool.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .archive import (create_file, finish_directories, finish_file, publish_tree, safe_join,
+                      write_small_file)
+from .chunkstore import DIGEST_SIZE, new_hasher
+from .compression import CODECS, Decoder
+from .delta import COPY, block_size_for, file_signatures
+from .merkle import HASH_WORKERS, MAX_CHUNK_SIZE, MAX_LEAVES, chunk_digest, merkle_root
+from .metrics import REGISTRY
+from .probe import MAX_PROBE_CHUNK, MAX_PROBE_SECONDS
+from .protocol import (FRAME_ACK, FRAME_COPY, FRAME_DATA, FRAME_DIGEST, FRAME_END, FRAME_ENTRY,
+                       FRAME_HELLO, FRAME_META, FRAME_NAMES, FRAME_PROBE, FRAME_RESUME, FRAME_SIGNATURE, HEADER,
+                       PROTOCOL_VERSION, ProtocolError, pack_header,
+                       async_recv_exact, async_recv_header, async_recv_into, async_recv_json,
+                       async_send_frame, async_send_json_frame, combine_digests)
+from .ratelimit import PRIORITY_WEIGHTS, THROTTLE_SLICE
+from .tuning import DEFAULT_PROFILE
+
+DEFAULT_BACKLOG = 128
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+DEFAULT_DISK_WORKERS = 4
+# A connection holds its socket plus at most one file of its own
+FDS_PER_CONNECTION = 2
+# Connections silent for longer than this are dropped
+IDLE_TIMEOUT = 60
+# Minimum seconds between manifest writes while chunks are arriving
+MANIFEST_SAVE_INTERVAL = 1.0
+# Times a resumable transfer may re-request chunks that failed verification
+MAX_REPAIR_ROUNDS = 3
+
+WRITE_AT_LOCK = threading.Lock()
+
+
+def default_fd_budget():
+    try:
+        import resource
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, ValueError, OSError):
+        return 1024
+    # Leave headroom for the interpreter, the GUI and the disk pool
+    return max(FDS_PER_CONNECTION * 4, min(4096, soft_limit - 64))
+
+
+def preallocate(fd, size):
+    if hasattr(os, 'posix_fallocate') and size:
+        os.posix_fallocate(fd, 0, size)
+    else:
+        os.ftruncate(fd, size)
+
+
+def write_at(fd, data, offset):
+    # os.pwrite may write less than asked; fall back to seek+write where it is missing
+    if not hasattr(os, 'pwrite'):
+        with WRITE_AT_LOCK:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while data:
+                data = data[os.write(fd, data):]
+        return
+    while data:
+        written = os.pwrite(fd, data, offset)
+        data = data[written:]
+        offset += written
+
+
+def write_and_hash(fd, data, offset, hasher):
+    write_at(fd, data, offset)
+    if hasher:
+        hasher.update(data)
+
+
+def copy_and_hash(source, fd, source_offset, offset, length, hasher, block_size=1024 * 1024):
+    # Reuses a range of the receiver's old copy at a new offset of the file being rebuilt
+    source.seek(source_offset)
+    while length:
+        data = source.read(min(block_size, length))
+        if not data:
+            raise ProtocolError("COPY reaches past the end of the existing file")
+        write_and_hash(fd, data, offset, hasher)
+        offset += len(data)
+        length -= len(data)
+
+
+def open_temp_file(directory, filename, size=0):
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f".{filename}.", suffix='.part', dir=directory)
+    if size:
+        preallocate(fd, size)
+    return fd, path
+
+
+def open_existing(path):
+    return open(path, 'rb') if os.path.isfile(path) else None
+
+
+def remove_if_exists(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class DecodingWriter:
+    # Writes the decompressed form of a DATA stream at ``start``, refusing to grow past the announced size
+    def __init__(self, codec, fd, filesize, hasher, start=0):
+        self.decoder = Decoder(codec)
+        self.fd = fd
+        self.filesize = filesize
+        self.hasher = hasher
+        self.start = start
+        self.position = 0
+
+    def write(self, data):
+        for output in self.decoder.decode(data):
+            self.emit(output)
+
+    def finish(self):
+        for output in self.decoder.finish():
+            self.emit(output)
+        if not self.decoder.eof:
+            raise ProtocolError("compressed stream ended early")
+
+    def emit(self, output):
+        if self.position + len(output) > self.filesize:
+            raise ProtocolError(f"decompressed data exceeds announced size of {self.filesize} bytes")
+        write_and_hash(self.fd, output, self.start + self.position, self.hasher)
+        self.position += len(output)
+
+
+class ConnectionState:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.connected_at = time.time()
+        self.last_activity = self.connected_at
+        self.bytes_received = 0
+        self.files_received = 0
+        self.current_file = None
+        self.task = None
+        # Throttle from the engine's RateLimiter, if any
+        self.throttle = None
+
+
+class BufferPool:
+    # Hands out fixed-size receive buffers without exceeding a global memory budget
+    def __init__(self, buffer_size, budget):
+        self.buffer_size = buffer_size
+        self.available = asyncio.Semaphore(max(1, budget // buffer_size))
+        self.free = []
+
+    async def acquire(self):
+        await self.available.acquire()
+        return self.free.pop() if self.free else memoryview(bytearray(self.buffer_size))
+
+    def release(self, buffer):
+        self.free.append(buffer)
+        self.available.release()
+
+
+class ParallelReceive:
+    # Shared state for one file whose byte ranges arrive over several connections
+    def __init__(self, directory, filename, filesize, streams):
+        self.filename = filename
+        self.filesize = filesize
+        self.streams = streams
+        self.fd, self.temp_path = open_temp_file(directory, filename, filesize)
+        self.lock = threading.Lock()
+        self.range_digests = {}
+        self.finished = 0
+        self.failed = False
+        self.start_time = time.time()
+        # Connections receiving a range right now, and when the last one let go; event loop only
+        self.active = 0
+        self.last_activity = self.start_time
+        self.abandoned = False
+
+    def finish_range(self, start, end, digest):
+        # Returns None while ranges are outstanding, then whether the whole file verified
+        with self.lock:
+            if digest is None:
+                self.failed = True
+            else:
+                self.range_digests[start] = (end, digest)
+            self.finished += 1
+            if self.finished < self.streams:
+                return None
+        os.close(self.fd)
+        if self.failed or not self.covers_file():
+            os.remove(self.temp_path)
+            return False
+        return True
+
+    def covers_file(self):
+        position = 0
+        for start in sorted(self.range_digests):
+            if start != position:
+                return False
+            position = self.range_digests[start][0]
+        return position == self.filesize
+
+    def combined_digest(self):
+        return combine_digests([self.range_digests[start][1] for start in sorted(self.range_digests)])
+
+    def discard(self):
+        # For a transfer whose other ranges never arrived
+        os.close(self.fd)
+        remove_if_exists(self.temp_path)
+
+
+def chunk_size_error(filesize, chunk_size):
+    # Why a resumable sender's chunk size can't be used, or None; it sizes the bitmap and every chunk read
+    if not isinstance(chunk_size, int) or chunk_size <= 0:
+        return f"chunk size {chunk_size!r} is not a positive integer"
+    if chunk_size > MAX_CHUNK_SIZE:
+        return f"chunk size {chunk_size} is above the {MAX_CHUNK_SIZE}-byte limit"
+    if -(-filesize // chunk_size) > MAX_LEAVES:
+        return f"{chunk_size}-byte chunks split {filesize} bytes into more than {MAX_LEAVES} chunks"
+    return None
+
+
+class ResumableReceive:
+    # Partial file plus a sidecar manifest recording which chunks are already on disk, with their BLAKE2b digests
+    def __init__(self, directory, filename, filesize, file_id, chunk_size):
+        error = chunk_size_error(filesize, chunk_size)
+        if error:
+            raise ValueError(error)
+        self.filename = filename
+        self.filesize = filesize
+        self.file_id = file_id
+        self.chunk_size = chunk_size
+        self.chunk_count = (filesize + chunk_size - 1) // chunk_size
+        os.makedirs(directory, exist_ok=True)
+        self.part_path = os.path.join(directory, f".{filename}.{file_id[:12]}.part")
+        self.manifest_path = self.part_path + '.json'
+        self.lock = threading.Lock()
+        self.finished = False
+        self.last_saved = 0
+
+        resumed = self.load()
+        self.fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        if not resumed:
+            self.bitmap = bytearray((self.chunk_count + 7) // 8)
+            self.chunk_hashes = [None] * self.chunk_count
+            preallocate(self.fd, filesize)
+            self.save()
+        self.received_bytes = sum(self.chunk_range(index)[1] - self.chunk_range(index)[0]
+                                  for index in range(self.chunk_count) if self.has_chunk(index))
+
+    def load(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (manifest.get('file_id') != self.file_id or manifest.get('filesize') != self.filesize
+                or manifest.get('chunk_size') != self.chunk_size or manifest.get('hash') != 'blake2b'
+                or not os.path.exists(self.part_path)):
+            return False
+        self.bitmap = bytearray.fromhex(manifest['bitmap'])
+        self.chunk_hashes = manifest['chunk_hashes']
+
+        # The manifest can outlive data that never reached the disk; re-check every chunk it claims
+        for index in range(self.chunk_count):
+            if self.has_chunk(index):
+                start, end = self.chunk_range(index)
+                if chunk_digest(self.part_path, start, end) != self.chunk_hashes[index]:
+                    self.bitmap[index // 8] &= ~(1 << (index % 8))
+                    self.chunk_hashes[index] = None
+        return True
+
+    def save(self):
+        manifest = {
+            'filename': self.filename,
+            'filesize': self.filesize,
+            'file_id': self.file_id,
+            'chunk_size': self.chunk_size,
+            'hash': 'blake2b',
+            'bitmap': self.bitmap.hex(),
+            'chunk_hashes': self.chunk_hashes
+        }
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self.manifest_path)
+        self.last_saved = time.time()
+
+    def flush(self):
+        with self.lock:
+            self.save()
+
+    def chunk_range(self, index):
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.filesize)
+
+    def has_chunk(self, index):
+        return bool(self.bitmap[index // 8] & (1 << (index % 8)))
+
+    def mark_chunk(self, index, digest):
+        with self.lock:
+            if not self.has_chunk(index):
+                start, end = self.chunk_range(index)
+                self.received_bytes += end - start
+            self.bitmap[index // 8] |= 1 << (index % 8)
+            self.chunk_hashes[index] = digest
+            if time.time() - self.last_saved >= MANIFEST_SAVE_INTERVAL:
+                self.save()
+
+    def missing_ranges(self):
+        ranges = []
+        for index in range(self.chunk_count):
+            if self.has_chunk(index):
+                continue
+            start, end = self.chunk_range(index)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        return ranges
+
+    def is_complete(self):
+        return all(self.has_chunk(index) for index in range(self.chunk_count))
+
+    def close(self):
+        os.close(self.fd)
+
+    def discard(self):
+        remove_if_exists(self.part_path)
+        remove_if_exists(self.manifest_path)
+
+
+class ReceiverEngine:
+    def __init__(self, port, host='', backlog=DEFAULT_BACKLOG, output_dir='received_files',
+                 memory_budget=DEFAULT_MEMORY_BUDGET, fd_budget=None, disk_workers=DEFAULT_DISK_WORKERS,
+                 idle_timeout=IDLE_TIMEOUT, profile=DEFAULT_PROFILE, chunk_store=None, rate_limiter=None,
+                 stats=None, on_log=None, on_progress=None, on_file_received=None):
+        self.port = port
+        self.host = host
+        self.backlog = backlog
+        self.output_dir = output_dir
+        self.memory_budget = memory_budget
+        self.fd_budget = fd_budget or default_fd_budget()
+        self.idle_timeout = idle_timeout
+        self.profile = profile
+        # Optional ChunkStore; when set, senders may skip chunks we already hold
+        self.chunk_store = chunk_store
+        # Optional RateLimiter; each connection is a transfer from the peer's address
+        self.rate_limiter = rate_limiter
+        self.stats = stats
+        self.on_log = on_log or (lambda message: None)
+        self.on_progress = on_progress or (lambda percent: None)
+        self.on_file_received = on_file_received or (lambda filename, size, seconds: None)
+
+        self.disk_pool = ThreadPoolExecutor(max_workers=disk_workers, thread_name_prefix='receiver-disk')
+        # Chunk verification runs here, alongside the disk pool, while the next chunk arrives
+        self.hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='receiver-hash')
+        self.connections = {}
+        self.connection_gauge = REGISTRY.gauge('socketlab_receiver_connections', 'Open inbound TCP connections')
+        self.parallel_receives = {}
+        self.resumable_receives = {}
+        self.resumable_users = {}
+        self.server_socket = None
+        self.loop = None
+        self.thread = None
+        self.serve_task = None
+
+    def start(self):
+        # Bind in the caller's thread so address errors surface immediately
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Accepted sockets inherit the buffer sizes set before listen
+        self.profile.apply(self.server_socket)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(self.backlog)
+        self.server_socket.setblocking(False)
+        self.port = self.server_socket.getsockname()[1]
+
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(started,), daemon=True)
+        self.thread.start()
+        started.wait()
+
+    def stop(self):
+        if self.loop and self.serve_task:
+            self.loop.call_soon_threadsafe(self.serve_task.cancel)
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.disk_pool.shutdown(wait=False)
+        self.hash_pool.shutdown(wait=False)
+        if self.chunk_store:
+            self.chunk_store.close()
+
+    def capabilities(self):
+        # What this receiver accepts, advertised to peers by discovery announcements
+        return {
+            'protocol': PROTOCOL_VERSION,
+            'codecs': list(CODECS),
+            'dedup': self.chunk_store is not None,
+            'features': ['resume', 'parallel', 'delta', 'archive'],
+        }
+
+    def run(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.serve_task = self.loop.create_task(self.serve())
+        self.loop.call_soon(started.set)
+        try:
+            self.loop.run_until_complete(self.serve_task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.server_socket.close()
+            self.loop.close()
+
+    async def serve(self):
+        self.buffers = BufferPool(self.profile.recv_buffer_size, self.memory_budget)
+        # Waiting for a slot before accept leaves further connections queued in the kernel backlog
+        slots = asyncio.Semaphore(max(1, self.fd_budget // FDS_PER_CONNECTION))
+        sweeper = self.loop.create_task(self.sweep_idle_connections())
+        try:
+            while True:
+                await slots.acquire()
+                try:
+                    sock, address = await self.loop.sock_accept(self.server_socket)
+                except BaseException:
+                    slots.release()
+                    raise
+                sock.setblocking(False)
+                self.profile.apply(sock)
+                conn = ConnectionState(sock, address)
+                if self.rate_limiter:
+                    conn.throttle = self.rate_limiter.register(address[0])
+                self.connections[id(conn)] = conn
+                self.connection_gauge.inc()
+                conn.task = self.loop.create_task(self.handle_connection(conn, slots))
+        finally:
+            sweeper.cancel()
+            for conn in list(self.connections.values()):
+                conn.task.cancel()
+            await asyncio.gather(*(conn.task for conn in list(self.connections.values())),
+                                 return_exceptions=True)
+
+    async def sweep_idle_connections(self):
+        while True:
+            await asyncio.sleep(1)
+            deadline = time.time() - self.idle_timeout
+            for conn in list(self.connections.values()):
+                if conn.last_activity < deadline:
+                    self.on_log(f"⏱️ Dropping idle connection from {conn.address}")
+                    conn.task.cancel()
+            await self.expire_parallel_receives(deadline)
+
+    async def expire_parallel_receives(self, deadline):
+        # A parallel file whose remaining ranges stopped arriving would hold its fd and temp file forever
+        for transfer_id, pending in list(self.parallel_receives.items()):
+            if not pending.done():
+                continue
+            if pending.exception():
+                del self.parallel_receives[transfer_id]
+                continue
+            transfer = pending.result()
+            if transfer.active or transfer.last_activity >= deadline:
+                continue
+            transfer.abandoned = True
+            del self.parallel_receives[transfer_id]
+            self.on_log(f"⏱️ Gave up on {transfer.filename}: {transfer.streams - transfer.finished} of "
+                        f"{transfer.streams} ranges never arrived")
+            self.on_log(f"🗑️ Discarded partial data for {transfer.filename}")
+            await self.run_disk(transfer.discard)
+
+    async def run_disk(self, func, *args):
+        return await self.loop.run_in_executor(self.disk_pool, func, *args)
+
+    async def recv_into(self, conn, view):
+        if conn.throttle and conn.throttle.limited:
+            # Reading slower lets TCP flow control slow the sender down
+            for start in range(0, len(view), THROTTLE_SLICE):
+                piece = view[start:start + THROTTLE_SLICE]
+                await conn.throttle.consume_async(len(piece))
+                await async_recv_into(self.loop, conn.sock, piece)
+                conn.last_activity = time.time()
+            return
+        await async_recv_into(self.loop, conn.sock, view)
+        conn.last_activity = time.time()
+
+    async def recv_header(self, conn):
+        header = await async_recv_header(self.loop, conn.sock)
+        conn.last_activity = time.time()
+        return header
+
+    async def handle_connection(self, conn, slots):
+        self.on_log(f"📡 Connection received from {conn.address}")
+        try:
+            # Files arrive back to back on one connection until the sender closes it
+            while True:
+                header = await self.recv_header(conn)
+                if header is None:
+                    break
+                frame_type, _, length = header
+                if frame_type == FRAME_HELLO:
+                    hello = await async_recv_json(self.loop, conn.sock, length)
+                    if conn.throttle and hello.get('priority') in PRIORITY_WEIGHTS:
+                        conn.throttle.set_priority(hello['priority'])
+                    accepted = [codec for codec in hello.get('codecs', []) if codec in CODECS]
+                    await async_send_json_frame(self.loop, conn.sock, FRAME_HELLO,
+                                                {'codecs': accepted, 'dedup': self.chunk_store is not None})
+                    continue
+                if frame_type == FRAME_PROBE:
+                    await self.handle_probe(conn, await async_recv_json(self.loop, conn.sock, length))
+                    continue
+                if frame_type != FRAME_META:
+                    raise ProtocolError(f"expected META frame, got {FRAME_NAMES[frame_type]}")
+                metadata = await async_recv_json(self.loop, conn.sock, length)
+                if metadata.get('archive'):
+                    ack = await self.receive_archive(conn, metadata)
+                elif metadata.get('dedup'):
+                    ack = await self.receive_file_dedup(conn, metadata)
+                elif metadata.get('delta'):
+                    ack = await self.receive_file_delta(conn, metadata)
+                elif 'range' in metadata:
+                    ack = await self.receive_file_range(conn, metadata)
+                elif metadata.get('resumable'):
+                    ack = await self.receive_file_resumable(conn, metadata)
+                else:
+                    ack = await self.receive_file_data(conn, metadata)
+                await async_send_json_frame(self.loop, conn.sock, FRAME_ACK, ack)
+                conn.current_file = None
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.on_log(f"❌ Error receiving file: {e}")
+        finally:
+            conn.sock.close()
+            if conn.throttle:
+                conn.throttle.close()
+            del self.connections[id(conn)]
+            self.connection_gauge.dec()
+            slots.release()
+            self.on_progress(0)
+
+    async def handle_probe(self, conn, request):
+        # Link measurements from socketlab.probe; nothing touches the disk
+        test = request.get('test')
+        if test == 'echo':
+            await async_send_json_frame(self.loop, conn.sock, FRAME_PROBE, request)
+        elif test == 'upload':
+            start = time.perf_counter()
+            received = 0
+            buffer = await self.buffers.acquire()
+            try:
+                while True:
+                    header = await self.recv_header(conn)
+                    if header is None:
+                        raise ConnectionError("connection closed during an upload probe")
+                    frame_type, _, length = header
+                    if frame_type == FRAME_END:
+                        await async_recv_exact(self.loop, conn.sock, length)
+                        break
+                    if frame_type != FRAME_DATA:
+                        raise ProtocolError(f"unexpected {FRAME_NAMES[frame_type]} frame inside an upload probe")
+                    remaining = length
+                    while remaining:
+                        view = buffer[:min(len(buffer), remaining)]
+                        await self.recv_into(conn, view)
+                        remaining -= len(view)
+                    received += length
+            finally:
+                self.buffers.release(buffer)
+            await async_send_json_frame(self.loop, conn.sock, FRAME_ACK,
+                                        {'bytes': received, 'seconds': time.perf_counter() - start})
+        elif test == 'download':
+            chunk_size = min(int(request['chunk_size']), MAX_PROBE_CHUNK)
+            deadline = time.perf_counter() + min(float(request['seconds']), MAX_PROBE_SECONDS)
+            frame = pack_header(FRAME_DATA, chunk_size) + os.urandom(chunk_size)
+            while time.perf_counter() < deadline:
+                if conn.throttle:
+                    await conn.throttle.consume_async(chunk_size)
+                await self.loop.sock_sendall(conn.sock, frame)
+                conn.last_activity = time.time()
+            await async_send_frame(self.loop, conn.sock, FRAME_END)
+        else:
+            raise ProtocolError(f"unknown probe test {test!r}")
+
+    async def receive_payload(self, conn, fd, position, length, buffer, hasher, writer=None):
+        remaining = length
+        while remaining:
+            view = buffer[:min(len(buffer), remaining)]
+            await self.recv_into(conn, view)
+            if writer:
+                await self.run_disk(writer.write, view)
+            else:
+                await self.run_disk(write_and_hash, fd, view, position, hasher)
+            position += len(view)
+            remaining -= len(view)
+            conn.bytes_received += len(view)
+        return position
+
+    async def receive_data_frames(self, conn, fd, start, end, hasher, on_frame=None, writer=None):
+        # Reads DATA frames covering [start, end) in order, returns the END checksum and the final position.
+        # With a DecodingWriter, positions count bytes of the compressed stream instead.
+        filename = conn.current_file
+        buffer = await self.buffers.acquire()
+        try:
+            position = start
+            while True:
+                header = await self.recv_header(conn)
+                if header is None:
+                    raise ConnectionError(f"connection closed at byte {position} of {filename}")
+                frame_type, offset, length = header
+                if frame_type == FRAME_END:
+                    checksum = (await async_recv_exact(self.loop, conn.sock, length)).decode('ascii')
+                    if writer:
+                        await self.run_disk(writer.finish)
+                    return checksum, position
+                if frame_type != FRAME_DATA:
+                    raise ProtocolError(f"unexpected {FRAME_NAMES[frame_type]} frame inside {filename}")
+                if offset != position or (writer is None and offset + length > end):
+                    raise ProtocolError(f"DATA frame at {offset} (+{length}) does not follow byte {position}")
+                position = await self.receive_payload(conn, fd, position, length, buffer, hasher, writer)
+                if on_frame:
+                    on_frame(position)
+        finally:
+            self.buffers.release(buffer)
+
+    def file_done(self, conn, filename, filesize, transfer_time, checksum, wire_bytes=None, files=1):
+        conn.files_received += files
+        self.on_log(f"✅ Reception completed! Time: {time.strftime('%H:%M, %m/%d/%Y')}")
+        self.on_log(f"💾 File saved: {self.output_dir}/{filename}")
+        self.on_log(f"✅ File integrity verified! Checksum: {checksum[:8]}...")
+        self.on_log(f"🎉 File received successfully!")
+        if self.stats:
+            self.stats.record_received(filesize, transfer_time, wire_bytes, files)
+        self.on_file_received(filename, filesize, transfer_time)
+
+    async def receive_file_data(self, conn, metadata):
+        filename = os.path.basename(metadata['filename'])
+        filesize = metadata['filesize']
+        codec = metadata.get('codec')
+        conn.current_file = filename
+
+        self.on_log(f"📄 Starting to receive file: {filename}")
+        self.on_log(f"📏 File size: {filesize} bytes" + (f", {codec} compressed" if codec else ""))
+
+        # Stream DATA frames to a temp file next to the target, hashing each chunk
+        fd, temp_path = await self.run_disk(open_temp_file, self.output_dir, filename)
+        try:
+            hasher = hashlib.md5()
+            writer = DecodingWriter(codec, fd, filesize, hasher) if codec else None
+            start_time = time.time()
+            checksum, wire_bytes = await self.receive_data_frames(
+                conn, fd, 0, filesize, hasher,
+                lambda position: self.on_progress((writer.position if writer else position) / filesize * 100),
+                writer)
+            bytes_received = writer.position if writer else wire_bytes
+            await self.run_disk(os.close, fd)
+            fd = None
+            transfer_time = time.time() - start_time
+
+            received_checksum = hasher.hexdigest()
+            if bytes_received != filesize or received_checksum != checksum:
+                self.on_log(f"⚠️ Checksum mismatch! Expected: {checksum[:8]}..., Got: {received_checksum[:8]}...")
+                self.on_log(f"🗑️ Discarded corrupted data for {filename}")
+                return {'filename': filename, 'status': 'corrupted', 'bytes': bytes_received}
+
+            # Only publish the file once its checksum has been verified
+            await self.run_disk(os.replace, temp_path, os.path.join(self.output_dir, filename))
+            temp_path = None
+        finally:
+            if fd is not None:
+                await self.run_disk(os.close, fd)
+            if temp_path:
+                await self.run_disk(remove_if_exists, temp_path)
+
+        self.file_done(conn, filename, filesize, transfer_time, checksum, wire_bytes)
+        return {'filename': filename, 'status': 'received', 'bytes': bytes_received, 'wire_bytes': wire_bytes}
+
+    async def receive_file_delta(self, conn, metadata):
+        filename = os.path.basename(metadata['filename'])
+        filesize = metadata['filesize']
+        conn.current_file = filename
+        base_path = os.path.join(self.output_dir, filename)
+
+        # Signatures of the copy we already have; an empty list makes the sender send everything
+        base = await self.run_disk(open_existing, base_path)
+        base_size = os.fstat(base.fileno()).st_size if base else 0
+        block_size = block_size_for(base_size)
+        signatures = await self.run_disk(file_signatures, base_path, block_size) if base else b''
+        if base:
+            self.on_log(f"🧩 Delta for {filename}: sending signatures of the existing {base_size} bytes")
+        else:
+            self.on_log(f"📄 Starting to receive file: {filename}")
+        self.on_log(f"📏 File size: {filesize} bytes")
+        await async_send_frame(self.loop, conn.sock, FRAME_SIGNATURE, signatures, block_size)
+
+        fd, temp_path = await self.run_disk(open_temp_file, self.output_dir, filename, filesize)
+        buffer = await self.buffers.acquire()
+        try:
+            hasher = hashlib.md5()
+            start_time = time.time()
+            position = reused = wire_bytes = 0
+            while True:
+                header = await self.recv_header(conn)
+                if header is None:
+                    raise ConnectionError(f"connection closed at byte {position} of {filename}")
+                frame_type, offset, length = header
+                wire_bytes += HEADER.size + length
+                if frame_type == FRAME_END:
+                    checksum = (await async_recv_exact(self.loop, conn.sock, length)).decode('ascii')
+                    break
+                if frame_type not in (FRAME_DATA, FRAME_COPY):
+                    raise ProtocolError(f"unexpected {FRAME_NAMES[frame_type]} frame inside {filename}")
+                if offset != position:
+                    raise ProtocolError(f"{FRAME_NAMES[frame_type]} frame at {offset} does not follow byte {position}")
+                if frame_type == FRAME_COPY:
+                    if length != COPY.size:
+                        raise ProtocolError(f"COPY frame of {length} bytes")
+                    source_offset, count = COPY.unpack(await async_recv_exact(self.loop, conn.sock, length))
+                    if not base or source_offset + count > base_size or position + count > filesize:
+                        raise ProtocolError(f"COPY of {count} bytes from {source_offset} is out of range")
+                    await self.run_disk(copy_and_hash, base, fd, source_offset, position, count, hasher)
+                    position += count
+                    reused += count
+                else:
+                    if position + length > filesize:
+                        raise ProtocolError(f"DATA frame at {offset} (+{length}) runs past {filesize} bytes")
+                    position = await self.receive_payload(conn, fd, position, length, buffer, hasher)
+                self.on_progress(position / filesize * 100 if filesize else 100)
+            await self.run_disk(os.close, fd)
+            fd = None
+            transfer_time = time.time() - start_time
+
+            received_checksum = hasher.hexdigest()
+            if position != filesize or received_checksum != checksum:
+                self.on_log(f"⚠️ Checksum mismatch! Expected: {checksum[:8]}..., Got: {received_checksum[:8]}...")
+                self.on_log(f"🗑️ Discarded corrupted data for {filename}")
+                return {'filename': filename, 'status': 'corrupted', 'bytes': position}
+
+            await self.run_disk(os.replace, temp_path, base_path)
+            temp_path = None
+        finally:
+            self.buffers.release(buffer)
+            if base:
+                await self.run_disk(base.close)
+            if fd is not None:
+                await self.run_disk(os.close, fd)
+            if temp_path:
+                await self.run_disk(remove_if_exists, temp_path)
+
+        if reused:
+            self.on_log(f"🧩 Rebuilt {filename}: reused {reused} bytes, received {filesize - reused} new bytes")
+        self.file_done(conn, filename, filesize, transfer_time, checksum, wire_bytes)
+        return {'filename': filename, 'status': 'received', 'bytes': filesize, 'wire_bytes': wire_bytes}
+
+    async def receive_archive(self, conn, metadata):
+        name = os.path.basename(metadata['filename'])
+        total_size = metadata['filesize']
+        conn.current_file = name
+        staging = os.path.join(self.output_dir, f".{name}.{uuid.uuid4().hex[:12]}.part")
+
+        self.on_log(f"📦 Starting to receive folder: {name} ({metadata['files']} files)")
+        self.on_log(f"📏 Total size: {total_size} bytes")
+        await self.run_disk(os.makedirs, staging)
+        start_time = time.time()
+        digests = []
+        directories = []
+        received = 0
+        buffer = await self.buffers.acquire()
+        try:
+            while True:
+                header = await self.recv_header(conn)
+                if header is None:
+                    raise ConnectionError(f"connection closed inside folder {name}")
+                frame_type, _, length = header
+                if frame_type == FRAME_END:
+                    checksum = (await async_recv_exact(self.loop, conn.sock, length)).decode('ascii')
+                    break
+                if frame_type != FRAME_ENTRY:
+                    raise ProtocolError(f"unexpected {FRAME_NAMES[frame_type]} frame inside folder {name}")
+                entry = await async_recv_json(self.loop, conn.sock, length)
+                try:
+                    target = safe_join(staging, entry['path'])
+                except ValueError as e:
+                    raise ProtocolError(str(e)) from None
+
+                if entry['type'] == 'dir':
+                    await self.run_disk(os.makedirs, target, 0o700, True)
+                    directories.append((target, entry['mode'], entry['mtime_ns']))
+                    continue
+
+                # Small files land in the receive buffer and are written with one disk call
+                size = entry['size']
+                small = size <= len(buffer)
+                fd = None if small else await self.run_disk(create_file, target)
+                try:
+                    hasher = hashlib.md5()
+                    position = 0
+                    while position < size:
+                        header = await self.recv_header(conn)
+                        if header is None or header[0] != FRAME_DATA:
+                            raise ProtocolError(f"expected DATA for {entry['path']}")
+                        _, offset, length = header
+                        if offset != position or offset + length > size:
+                            raise ProtocolError(f"DATA frame at {offset} (+{length}) does not follow byte {position}")
+                        if small:
+                            await self.recv_into(conn, buffer[position:position + length])
+                            conn.bytes_received += length
+                            position += length
+                        else:
+                            position = await self.receive_payload(conn, fd, position, length, buffer, hasher)
+                    if small:
+                        digest = await self.run_disk(write_small_file, target, buffer[:size],
+                                                     entry['mode'], entry['mtime_ns'])
+                    else:
+                        digest = hasher.hexdigest()
+                finally:
+                    if fd is not None:
+                        await self.run_disk(finish_file, fd, target, entry['mode'], entry['mtime_ns'])
+                digests.append(digest)
+                received += size
+                self.on_progress(received / total_size * 100 if total_size else 100)
+        except BaseException:
+            await self.run_disk(shutil.rmtree, staging, True)
+            raise
+        finally:
+            self.buffers.release(buffer)
+
+        transfer_time = time.time() - start_time
+        if combine_digests(digests) != checksum:
+            await self.run_disk(shutil.rmtree, staging, True)
+            self.on_log(f"⚠️ Checksum mismatch for folder {name}")
+            self.on_log(f"🗑️ Discarded corrupted data for {name}")
+            return {'filename': name, 'status': 'corrupted', 'bytes': received, 'files': len(digests)}
+
+        await self.run_disk(finish_directories, directories)
+        await self.run_disk(publish_tree, staging, os.path.join(self.output_dir, name))
+        elapsed = max(transfer_time, 1e-6)
+        self.on_log(f"📦 {len(digests)} files in {transfer_time:.2f} s: {len(digests) / elapsed:.1f} files/s, "
+                    f"{received / elapsed / 1024 / 1024:.2f} MB/s")
+        self.file_done(conn, name, received, transfer_time, checksum, files=len(digests))
+        return {'filename': name, 'status': 'received', 'bytes': received, 'files': len(digests)}
+
+    async def receive_file_dedup(self, conn, metadata):
+        filename = os.path.basename(metadata['filename'])
+        filesize = metadata['filesize']
+        chunk_size = metadata['chunk_size']
+        digests = metadata['chunks']
+        conn.current_file = filename
+        store = self.chunk_store
+        if store is None:
+            raise ProtocolError("chunked transfer offered but no chunk store is configured")
+        if chunk_size <= 0 or len(digests) != -(-filesize // chunk_size):
+            raise ProtocolError(f"{len(digests)} chunk digests do not cover {filesize} bytes")
+        # Digests become file names in the store, so only accept plain hex
+        if any(len(digest) != DIGEST_SIZE * 2 or digest.strip('0123456789abcdef') for digest in digests):
+            raise ProtocolError("malformed chunk digest")
+
+        missing = await self.run_disk(store.pin, digests)
+        temp_path = None
+        try:
+            # Ask once for each chunk we lack, even if it repeats within the file
+            wanted = {}
+            requested = set()
+            for index, digest in enumerate(digests):
+                if digest in missing and digest not in requested:
+                    wanted[index] = digest
+                    requested.add(digest)
+            ranges = []
+            for index in sorted(wanted):
+                start, end = index * chunk_size, min((index + 1) * chunk_size, filesize)
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1][1] = end
+                else:
+                    ranges.append([start, end])
+            missing_bytes = sum(end - start for start, end in ranges)
+
+            self.on_log(f"📄 Starting to receive file: {filename}")
+            self.on_log(f"📏 File size: {filesize} bytes, {filesize - missing_bytes} already in the chunk store")
+            await async_send_json_frame(self.loop, conn.sock, FRAME_RESUME,
+                                        {'chunk_size': chunk_size, 'missing': ranges})
+
+            start_time = time.time()
+            wire_bytes = 0
+            buffer = await self.buffers.acquire()
+            try:
+                while True:
+                    header = await self.recv_header(conn)
+                    if header is None:
+                        raise ConnectionError(f"connection closed with {filename} incomplete")
+                    frame_type, offset, length = header
+                    if frame_type == FRAME_END:
+                        checksum = (await async_recv_exact(self.loop, conn.sock, length)).decode('ascii')
+                        break
+                    if frame_type != FRAME_DATA:
+                        raise ProtocolError(f"unexpected {FRAME_NAMES[frame_type]} frame inside {filename}")
+                    index = offset // chunk_size
+                    if offset % chunk_size or index not in wanted \
+                            or length != min(chunk_size, filesize - offset):
+                        raise ProtocolError(f"DATA frame at {offset} (+{length}) is not a requested chunk")
+                    digest = wanted.pop(index)
+
+                    fd, chunk_path = await self.run_disk(store.open_writer)
+                    try:
+                        hasher = new_hasher()
+                        await self.receive_payload(conn, fd, 0, length, buffer, hasher)
+                        await self.run_disk(os.close, fd)
+                        fd = None
+                        if hasher.hexdigest() != digest:
+                            raise ProtocolError(f"chunk {index} of {filename} does not match its digest")
+                        await self.run_disk(store.commit, chunk_path, digest, length)
+                        chunk_path = None
+                    finally:
+                        if fd is not None:
+                            await self.run_disk(os.close, fd)
+                        if chunk_path:
+                            await self.run_disk(remove_if_exists, chunk_path)
+                    wire_bytes += length
+                    self.on_progress((filesize - missing_bytes + wire_bytes) / filesize * 100)
+            finally:
+                self.buffers.release(buffer)
+            if wanted:
+                raise ProtocolError(f"{len(wanted)} requested chunks of {filename} never arrived")
+
+            # Build the file from the store, then verify it like any other transfer
+            temp_path = os.path.join(self.output_dir, f".{filename}.{uuid.uuid4().hex[:12]}.part")
+            hasher = hashlib.md5()
+            await self.run_disk(os.makedirs, self.output_dir, 0o777, True)
+            method = await self.run_disk(store.assemble, digests, chunk_size, temp_path, hasher)
+            transfer_time = time.time() - start_time
+            if hasher.hexdigest() != checksum:
+                self.on_log(f"⚠️ Checksum mismatch! Expected: {checksum[:8]}..., Got: {hasher.hexdigest()[:8]}...")
+                self.on_log(f"🗑️ Discarded corrupted data for {filename}")
+                return {'filename': filename, 'status': 'corrupted', 'bytes': filesize}
+            await self.run_disk(os.replace, temp_path, os.path.join(self.output_dir, filename))
+            temp_path = None
+        finally:
+            await self.run_disk(store.unpin, digests)
+            if temp_path:
+                await self.run_disk(remove_if_exists, temp_path)
+
+        self.on_log(f"🧱 Assembled {filename} from {len(digests)} chunks ({method}), {wire_bytes} bytes were new")
+        self.file_done(conn, filename, filesize, transfer_time, checksum, wire_bytes)
+        return {'filename': filename, 'status': 'received', 'bytes': filesize, 'wire_bytes': wire_bytes}
+
+    async def receive_file_range(self, conn, metadata):
+        filename = os.path.basename(metadata['filename'])
+        filesize = metadata['filesize']
+        transfer_id = metadata['transfer_id']
+        start, end = metadata['range']
+        conn.current_file = filename
+
+        # The first connection of a transfer creates the shared file, the others wait on it
+        pending = self.parallel_receives.get(transfer_id)
+        if pending is None:
+            self.on_log(f"📄 Starting to receive file: {filename} over {metadata['streams']} streams")
+            self.on_log(f"📏 File size: {filesize} bytes" + (f", {metadata['codec']} compressed" if metadata.get('codec') else ""))
+            pending = self.loop.run_in_executor(self.disk_pool, ParallelReceive, self.output_dir,
+                                                filename, filesize, metadata['streams'])
+            self.parallel_receives[transfer_id] = pending
+        transfer = await pending
+        if transfer.abandoned:
+            raise ProtocolError(f"parallel transfer of {filename} already timed out waiting for its ranges")
+        transfer.active += 1
+
+        # Each connection carries its range in order, so it can be hashed as it lands.
+        # A compressed range is one stream of its own, decoded into place.
+        range_digest = None
+        try:
+            hasher = hashlib.md5()
+            codec = metadata.get('codec')
+            if codec:
+                writer = DecodingWriter(codec, transfer.fd, end - start, hasher, start)
+                checksum, _ = await self.receive_data_frames(conn, transfer.fd, 0, end - start, hasher,
+                                                             writer=writer)
+                position = start + writer.position
+            else:
+                checksum, position = await self.receive_data_frames(conn, transfer.fd, start, end, hasher)
+            if position == end and hasher.hexdigest() == checksum:
+                range_digest = checksum
+            else:
+                self.on_log(f"⚠️ Range {start}-{end} of {filename} failed verification")
+        finally:
+            transfer.active -= 1
+            transfer.last_activity = time.time()
+            complete = await self.run_disk(transfer.finish_range, start, end, range_digest)
+            if complete is not None:
+                del self.parallel_receives[transfer_id]
+
+        if complete:
+            await self.run_disk(os.replace, transfer.temp_path, os.path.join(self.output_dir, filename))
+            self.on_log(f"✅ All {transfer.streams} ranges verified")
+            self.file_done(conn, filename, filesize, time.time() - transfer.start_time, transfer.combined_digest())
+        elif complete is False:
+            self.on_log(f"🗑️ Discarded corrupted data for {filename}")
+
+        status = 'received' if range_digest else 'corrupted'
+        ack = {'filename': filename, 'status': status, 'bytes': end - start, 'range': [start, end]}
+        if complete:
+            # The range that completes the file tells the sender which ranges it was built from
+            ack['combined_checksum'] = transfer.combined_digest()
+        return ack
+
+    async def receive_file_resumable(self, conn, metadata):
+        filename = os.path.basename(metadata['filename'])
+        filesize = metadata['filesize']
+        file_id = metadata['file_id']
+        conn.current_file = filename
+        error = chunk_size_error(filesize, metadata.get('chunk_size'))
+        if error:
+            self.on_log(f"❌ Refused {filename}: {error}")
+            return {'filename': filename, 'status': 'failed', 'error': error, 'bytes': 0}
+
+        # Connections for the same file share one partial; the last one out saves and closes it
+        pending = self.resumable_receives.get(file_id)
+        if pending is None:
+            pending = self.loop.run_in_executor(self.disk_pool, ResumableReceive, self.output_dir,
+                                                filename, filesize, file_id, metadata['chunk_size'])
+            self.resumable_receives[file_id] = pending
+        self.resumable_users[file_id] = self.resumable_users.get(file_id, 0) + 1
+        transfer = None
+
+        try:
+            transfer = await pending
+            missing = transfer.missing_ranges()
+            missing_bytes = sum(end - start for start, end in missing)
+            if missing_bytes < filesize:
+                self.on_log(f"🔁 Resuming {filename}: {filesize - missing_bytes} of {filesize} bytes already received")
+            else:
+                self.on_log(f"📄 Starting to receive file: {filename}")
+                self.on_log(f"📏 File size: {filesize} bytes" + (f", {metadata['codec']} compressed" if metadata.get('codec') else ""))
+            await async_send_json_frame(self.loop, conn.sock, FRAME_RESUME,
+                                        {'chunk_size': transfer.chunk_size, 'missing': missing})
+
+            start_time = time.time()
+            verifying = []
+            repairs = 0
+            buffer = await self.buffers.acquire()
+            try:
+                while True:
+                    root = await self.receive_chunks(conn, transfer, buffer, verifying, metadata.get('codec'))
+                    await asyncio.gather(*verifying)
+                    verifying.clear()
+                    if transfer.finished:
+                        raise ProtocolError(f"{filename} was already completed by another connection")
+                    if transfer.is_complete():
+                        break
+                    await self.run_disk(transfer.flush)
+                    missing = transfer.missing_ranges()
+                    still_missing = sum(end - start for start, end in missing)
+                    if repairs == MAX_REPAIR_ROUNDS:
+                        return {'filename': filename, 'status': 'incomplete', 'bytes': filesize - still_missing}
+                    repairs += 1
+                    self.on_log(f"🔁 Re-requesting {still_missing} bytes of {filename} (attempt {repairs} of {MAX_REPAIR_ROUNDS})")
+                    await async_send_json_frame(self.loop, conn.sock, FRAME_RESUME,
+                                                {'chunk_size': transfer.chunk_size, 'missing': missing})
+            finally:
+                self.buffers.release(buffer)
+                if verifying:
+                    await asyncio.gather(*verifying, return_exceptions=True)
+
+            transfer.finished = True
+            await self.run_disk(transfer.close)
+            received_root = merkle_root(transfer.chunk_hashes)
+            if received_root != root:
+                await self.run_disk(transfer.discard)
+                self.on_log(f"⚠️ Merkle root mismatch! Expected: {root[:8]}..., Got: {received_root[:8]}...")
+                self.on_log(f"🗑️ Discarded corrupted data for {filename}")
+                return {'filename': filename, 'status': 'corrupted', 'bytes': filesize}
+
+            await self.run_disk(os.replace, transfer.part_path, os.path.join(self.output_dir, filename))
+            await self.run_disk(transfer.discard)
+        finally:
+            self.resumable_users[file_id] -= 1
+            if self.resumable_users[file_id] == 0:
+                del self.resumable_users[file_id]
+                del self.resumable_receives[file_id]
+                if transfer and not transfer.finished:
+                    # Keep what arrived so the next connection can pick up from here
+                    await self.run_disk(transfer.flush)
+                    await self.run_disk(transfer.close)
+
+        if self.stats:
+            self.stats.record_merkle_root(filename, received_root)
+        self.file_done(conn, filename, filesize, time.time() - start_time, received_root)
+        return {'filename': filename, 'status': 'received', 'bytes': filesize, 'merkle_root': received_root}
+
+    async def receive_chunks(self, conn, transfer, buffer, verifying, codec=None):
+        # Reads DATA + DIGEST pairs until END and returns the sender's Merkle root.
+        # Each chunk is verified on the hash pool while the next one is being received.
+        # With a codec, every DATA frame is one chunk compressed on its own.
+        filename = transfer.filename
+        received = None
+        while True:
+            header = await self.recv_header(conn)
+            if header is None:
+                raise ConnectionError(f"connection closed with {filename} incomplete")
+            frame_type, offset, length = header
+            if frame_type == FRAME_END:
+                return (await async_recv_exact(self.loop, conn.sock, length)).decode('ascii')
+            if frame_type == FRAME_DIGEST:
+                if received is None or transfer.chunk_range(received)[0] != offset or length != DIGEST_SIZE:
+                    raise ProtocolError(f"DIGEST frame at {offset} does not follow its chunk")
+                digest = (await async_recv_exact(self.loop, conn.sock, length)).hex()
+                verifying.append(self.loop.create_task(self.verify_chunk(transfer, received, digest)))
+                received = None
+                continue
+            if frame_type != FRAME_DATA or received is not None:
+                raise ProtocolError(f"unexpected {FRAME_NAMES[frame_type]} frame inside {filename}")
+            index = offset // transfer.chunk_size
+            if offset % transfer.chunk_size or index >= transfer.chunk_count \
+                    or (codec is None and transfer.chunk_range(index) != (offset, offset + length)):
+                raise ProtocolError(f"DATA frame at {offset} (+{length}) is not a whole chunk")
+            if codec:
+                start, end = transfer.chunk_range(index)
+                writer = DecodingWriter(codec, transfer.fd, end - start, None, start)
+                await self.receive_payload(conn, None, 0, length, buffer, None, writer)
+                await self.run_disk(writer.finish)
+                if writer.position != end - start:
+                    raise ProtocolError(f"chunk {index} of {filename} decompressed to {writer.position} bytes")
+            else:
+                await self.receive_payload(conn, transfer.fd, offset, length, buffer, None)
+            received = index
+
+    async def verify_chunk(self, transfer, index, digest):
+        start, end = transfer.chunk_range(index)
+        actual = await self.loop.run_in_executor(self.hash_pool, chunk_digest, transfer.part_path, start, end)
+        if actual != digest:
+            self.on_log(f"⚠️ Chunk {index} of {transfer.filename} failed verification, it will be re-requested")
+            return
+        await self.run_disk(transfer.mark_chunk, index, digest)
+        self.on_progress(transfer.received_bytes / transfer.filesize * 100)
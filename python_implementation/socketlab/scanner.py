@@ -0,0 +1,93 @@
+"""Concurrent TCP-connect scan for partners on the local network.
+
+Each host is probed with a non-blocking connect to the transfer port, many at
+a time on one asyncio loop, so no process is spawned per host and a /24
+takes about one connect timeout. A completed connect means a receiver is
+listening (``open``); a refusal still proves the host is up (``closed``);
+anything else within the timeout counts as ``down``.
+
+Results are cached per (host, port) for ``cache_ttl`` seconds, so repeated
+scans only probe hosts whose result has expired.
+"""
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+
+DEFAULT_CONCURRENCY = 256
+DEFAULT_TIMEOUT = 0.75
+DEFAULT_CACHE_TTL = 60
+
+
+def hosts_in(network, exclude=()):
+    return [str(ip) for ip in ipaddress.ip_network(network, strict=False).hosts() if str(ip) not in exclude]
+
+
+async def probe(host, port, timeout):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (host, port)), timeout)
+        status = 'open'
+    except ConnectionRefusedError:
+        status = 'closed'
+    except (OSError, asyncio.TimeoutError):
+        return 'down', None
+    finally:
+        sock.close()
+    return status, time.perf_counter() - start
+
+
+class NetworkScanner:
+    def __init__(self, port, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, cache_ttl=DEFAULT_CACHE_TTL):
+        self.port = port
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.lock = threading.Lock()
+        self.cache = {}
+
+    def cached(self, host):
+        with self.lock:
+            entry = self.cache.get((host, self.port))
+        if entry and time.time() - entry[0] < self.cache_ttl:
+            return entry[1]
+        return None
+
+    def clear_cache(self):
+        with self.lock:
+            self.cache.clear()
+
+    def scan(self, hosts, on_result=None):
+        """Probe ``hosts`` and return their results; blocks the calling thread, never the caller's loop."""
+        return asyncio.run(self.scan_async(hosts, on_result))
+
+    async def scan_async(self, hosts, on_result=None):
+        # on_result gets each result dict as soon as it is known, cached ones first
+        on_result = on_result or (lambda result: None)
+        slots = asyncio.Semaphore(self.concurrency)
+        results = []
+
+        def report(result):
+            results.append(result)
+            on_result(result)
+
+        async def check(host):
+            async with slots:
+                status, rtt = await probe(host, self.port, self.timeout)
+            with self.lock:
+                self.cache[(host, self.port)] = (time.time(), (status, rtt))
+            report({'host': host, 'port': self.port, 'status': status, 'rtt': rtt, 'cached': False})
+
+        pending = []
+        for host in hosts:
+            hit = self.cached(host)
+            if hit:
+                report({'host': host, 'port': self.port, 'status': hit[0], 'rtt': hit[1], 'cached': True})
+            else:
+                pending.append(check(host))
+        await asyncio.gather(*pending)
+        return results
@@ -0,0 +1,586 @@
+"""Client side of the framed TCP transfer: pipelined, parallel and resumable sends."""
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+from .archive import BATCH_SIZE, READ_AHEAD, READ_WORKERS, SMALL_FILE_SIZE, read_small_file, scan_tree
+from .chunkstore import chunk_size_for, file_chunk_digests
+from .compression import CODECS, choose_codec, get_codec
+from .delta import COPY, SIGNATURE, compute_delta, mapped_file, parse_signatures
+from .merkle import HASH_WORKERS, MAX_LEAVES, chunk_digest, merkle_root
+from .protocol import (FRAME_ACK, FRAME_COPY, FRAME_DATA, FRAME_DIGEST, FRAME_END, FRAME_ENTRY,
+                       FRAME_HELLO, FRAME_META, FRAME_RESUME, FRAME_SIGNATURE, HEADER, ProtocolError,
+                       combine_digests, file_checksum, pack_header, recv_frame, recv_frame_of, send_frame,
+                       send_json_frame, split_ranges)
+from .ratelimit import DEFAULT_PRIORITY, ThrottledSocket
+from .tuning import DEFAULT_PROFILE
+
+# Files smaller than this always go over a single connection
+PARALLEL_MIN_SIZE = 8 * 1024 * 1024
+# Files at least this big are sent resumably, chunk by chunk
+RESUMABLE_MIN_SIZE = 8 * 1024 * 1024
+# Reconnect attempts and idle timeout for resumable transfers
+RESUME_ATTEMPTS = 5
+RESUME_IDLE_TIMEOUT = 30
+
+
+class TransferRejected(ConnectionError):
+    pass
+
+
+class FileSender:
+    def __init__(self, host, port, streams=1, profile=DEFAULT_PROFILE, compression='off', delta=False,
+                 dedup=False, resumable=None, rate_limiter=None, priority=DEFAULT_PRIORITY, stats=None,
+                 on_log=None, on_progress=None, on_connected=None):
+        self.host = host
+        self.port = port
+        self.streams = streams
+        self.profile = profile
+        # 'off', 'auto' (skip data that looks incompressible) or a codec name
+        self.compression = compression
+        # Send only what differs from the partner's existing copy of each file
+        self.delta = delta
+        # Advertise chunk digests first and send only chunks missing from the partner's chunk store
+        self.dedup = dedup
+        # None sends single files of RESUMABLE_MIN_SIZE or more resumably; True or False pins that choice
+        self.resumable = resumable
+        # Optional RateLimiter; all connections of one send() share a single throttle
+        self.rate_limiter = rate_limiter
+        self.priority = priority
+        self.throttle = None
+        self.stats = stats
+        self.on_log = on_log or (lambda message: None)
+        self.on_progress = on_progress or (lambda percent: None)
+        self.on_connected = on_connected or (lambda: None)
+
+    def send(self, paths):
+        self.on_log(f"🔗 Connecting to partner computer {self.host}:{self.port}...")
+
+        tree = None
+        if any(os.path.isdir(path) for path in paths):
+            if len(paths) != 1:
+                raise ValueError("a directory has to be sent on its own")
+            tree, skipped = scan_tree(paths[0])
+            for relative in skipped:
+                self.on_log(f"⏭️ Skipping {relative} (not a regular file or directory)")
+            total_size = sum(entry['size'] for entry in tree)
+        else:
+            total_size = sum(os.path.getsize(path) for path in paths)
+        sent_total = 0
+        wire_total = 0
+        progress_lock = threading.Lock()
+
+        def report_progress(count, wire_count=None):
+            # count is file bytes covered, wire_count the bytes actually sent when compressed
+            nonlocal sent_total, wire_total
+            with progress_lock:
+                sent_total += count
+                wire_total += count if wire_count is None else wire_count
+                progress = (sent_total / total_size) * 100 if total_size else 100
+            self.on_progress(progress)
+
+        if self.compression not in ('off', 'auto') and (tree is not None or self.delta):
+            self.on_log(f"ℹ️ {'Folder' if tree is not None else 'Delta'} transfers are sent uncompressed")
+
+        start_time = time.time()
+        if self.rate_limiter:
+            self.throttle = self.rate_limiter.register(self.host, self.priority)
+
+        mode = self.transfer_mode(paths, total_size, folder=tree is not None)
+        try:
+            if mode == 'folder':
+                acks = self.send_directory(paths[0], tree, report_progress)
+            elif mode == 'delta':
+                acks = self.send_files_delta(paths, report_progress)
+            elif mode == 'dedup':
+                acks = self.send_files_dedup(paths, report_progress)
+            elif mode == 'parallel':
+                acks = self.send_file_parallel(paths[0], report_progress)
+            elif mode == 'resumable':
+                acks = self.send_file_resumable(paths[0], report_progress)
+            else:
+                acks = self.send_files_pipelined(paths, report_progress)
+        finally:
+            if self.throttle:
+                self.throttle.close()
+                self.throttle = None
+
+        transfer_time = time.time() - start_time
+
+        confirmed = [ack for ack in acks if ack.get('status') == 'received']
+        for ack in confirmed:
+            self.on_log(f"✅ Partner confirmed file receipt: {ack['filename']} ({ack['bytes']} bytes)")
+        if self.stats and confirmed:
+            self.stats.record_sent(sum(ack.get('files', 1) for ack in confirmed),
+                                   sum(ack['bytes'] for ack in confirmed), transfer_time, wire_total)
+
+        failed = [ack['filename'] for ack in acks if ack.get('status') != 'received']
+        if failed:
+            raise TransferRejected(f"partner rejected: {', '.join(failed)}")
+        self.on_log(f"🎉 File transfer successful!")
+        return acks
+
+    def transfer_mode(self, paths, total_size, folder=False):
+        """How send() moves these paths: folder, delta, dedup, parallel, resumable or pipelined."""
+        if folder:
+            return 'folder'
+        if self.delta:
+            return 'delta'
+        if self.dedup:
+            return 'dedup'
+        if len(paths) == 1 and self.streams > 1 and total_size >= PARALLEL_MIN_SIZE:
+            return 'parallel'
+        resumable = total_size >= RESUMABLE_MIN_SIZE if self.resumable is None else self.resumable
+        if len(paths) == 1 and resumable:
+            return 'resumable'
+        return 'pipelined'
+
+    def connect(self, timeout=None):
+        client_socket = self.profile.connect((self.host, self.port), timeout=timeout)
+        self.on_connected()
+        if self.throttle:
+            return ThrottledSocket(client_socket, self.throttle)
+        return client_socket
+
+    def send_files_pipelined(self, paths, report_progress):
+        # One worker reads ACK frames while the other hashes the file being sent
+        pool = ThreadPoolExecutor(max_workers=2)
+        client_socket = self.connect()
+        try:
+            self.on_log(f"✅ Connection successful!")
+            accepted = self.negotiate(client_socket).get('codecs', []) if self.compression != 'off' else []
+            self.on_log(f"📤 Starting to send {len(paths)} file(s)...")
+
+            # Pipeline every file without waiting for the previous ACK
+            ack_future = pool.submit(self.read_acks, client_socket, len(paths))
+            for path in paths:
+                self.send_file_frames(client_socket, path, pool, report_progress, accepted)
+
+            self.on_log(f"✅ Data sending completed! Time: {datetime.now().strftime('%H:%M, %m/%d/%Y')}")
+            return ack_future.result()
+        finally:
+            # Wake the ACK reader before waiting for the pool
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client_socket.close()
+            pool.shutdown()
+
+    def send_directory(self, root, entries, report_progress):
+        name = os.path.basename(os.path.normpath(root))
+        files = [entry for entry in entries if entry['type'] == 'file']
+        total_size = sum(entry['size'] for entry in files)
+        start_time = time.time()
+
+        with self.connect() as client_socket, ThreadPoolExecutor(max_workers=READ_WORKERS) as read_pool:
+            self.on_log(f"✅ Connection successful!")
+            self.on_log(f"📦 Sending folder {name}: {len(files)} files, {total_size} bytes")
+            metadata = {
+                'filename': name,
+                'filesize': total_size,
+                'archive': True,
+                'files': len(files),
+                'timestamp': datetime.now().isoformat()
+            }
+            send_json_frame(client_socket, FRAME_META, metadata)
+
+            # Small files are read (and hashed) ahead by the pool while earlier entries go out
+            small = deque(entry for entry in files if entry['size'] <= SMALL_FILE_SIZE)
+            reads = {}
+
+            def read_ahead():
+                while small and len(reads) < READ_AHEAD:
+                    entry = small.popleft()
+                    reads[entry['path']] = read_pool.submit(read_small_file, entry['source'])
+
+            digests = []
+            batch = bytearray()
+            for entry in entries:
+                read_ahead()
+                header = {key: entry[key] for key in ('path', 'type', 'size', 'mode', 'mtime_ns')}
+                if entry['type'] == 'dir':
+                    payload = json.dumps(header).encode('utf-8')
+                    batch += pack_header(FRAME_ENTRY, len(payload)) + payload
+                elif entry['path'] in reads:
+                    data, digest = reads.pop(entry['path']).result()
+                    header['size'] = len(data)
+                    payload = json.dumps(header).encode('utf-8')
+                    batch += pack_header(FRAME_ENTRY, len(payload)) + payload
+                    if data:
+                        batch += pack_header(FRAME_DATA, len(data)) + data
+                    digests.append(digest)
+                    report_progress(len(data))
+                else:
+                    # Large files go out with sendfile and are hashed on the pool meanwhile
+                    payload = json.dumps(header).encode('utf-8')
+                    client_socket.sendall(batch + pack_header(FRAME_ENTRY, len(payload)) + payload)
+                    batch.clear()
+                    digests.append(read_pool.submit(file_checksum, entry['source']))
+                    self.send_data_frames(client_socket, entry['source'], 0, entry['size'], report_progress)
+                if len(batch) >= BATCH_SIZE:
+                    client_socket.sendall(batch)
+                    batch.clear()
+            client_socket.sendall(batch)
+
+            digests = [digest.result() if isinstance(digest, Future) else digest for digest in digests]
+            send_frame(client_socket, FRAME_END, combine_digests(digests).encode('ascii'))
+            self.on_log(f"✅ Data sending completed! Time: {datetime.now().strftime('%H:%M, %m/%d/%Y')}")
+
+            _, payload = recv_frame(client_socket, FRAME_ACK)
+            ack = json.loads(payload.decode('utf-8'))
+
+        elapsed = max(time.time() - start_time, 1e-6)
+        self.on_log(f"📦 {len(files)} files in {elapsed:.2f} s: {len(files) / elapsed:.1f} files/s, "
+                    f"{total_size / elapsed / 1024 / 1024:.2f} MB/s")
+        return [ack]
+
+    def send_files_delta(self, paths, report_progress):
+        # Each file waits for its signatures, so files go one after another rather than pipelined
+        with self.connect() as client_socket:
+            self.on_log(f"✅ Connection successful!")
+            acks = []
+            for path in paths:
+                acks.append(self.send_file_delta(client_socket, path, report_progress))
+            self.on_log(f"✅ Data sending completed! Time: {datetime.now().strftime('%H:%M, %m/%d/%Y')}")
+            return acks
+
+    def send_file_delta(self, client_socket, path, report_progress):
+        filename = os.path.basename(path)
+        filesize = os.path.getsize(path)
+        metadata = {
+            'filename': filename,
+            'filesize': filesize,
+            'delta': True,
+            'timestamp': datetime.now().isoformat()
+        }
+        send_json_frame(client_socket, FRAME_META, metadata)
+
+        block_size, payload = recv_frame(client_socket, FRAME_SIGNATURE)
+        table = parse_signatures(payload)
+        if table:
+            self.on_log(f"🧩 Partner has an older {filename}: {len(payload) // SIGNATURE.size} blocks of {block_size} bytes")
+        else:
+            self.on_log(f"📄 Sending {filename} ({filesize} bytes), partner has no copy")
+
+        hasher = hashlib.md5()
+        position = copied = 0
+        with mapped_file(path) as data:
+            for op, first, second in compute_delta(data, block_size, table):
+                if op == 'copy':
+                    client_socket.sendall(pack_header(FRAME_COPY, COPY.size, position) + COPY.pack(first, second))
+                    hasher.update(data[position:position + second])
+                    position += second
+                    copied += second
+                    report_progress(second, HEADER.size + COPY.size)
+                else:
+                    self.send_data_frames(client_socket, path, first, second, report_progress)
+                    hasher.update(data[first:second])
+                    position = second
+        send_frame(client_socket, FRAME_END, hasher.hexdigest().encode('ascii'))
+        if copied:
+            self.on_log(f"🧩 {filename}: reused {copied} bytes, sent {filesize - copied} new bytes")
+
+        _, payload = recv_frame(client_socket, FRAME_ACK)
+        return json.loads(payload.decode('utf-8'))
+
+    def send_files_dedup(self, paths, report_progress):
+        with self.connect() as client_socket, ThreadPoolExecutor(max_workers=1) as hash_pool:
+            self.on_log(f"✅ Connection successful!")
+            hello = self.negotiate(client_socket)
+            if not hello.get('dedup'):
+                self.on_log(f"ℹ️ Partner has no chunk store, sending files in full")
+            acks = []
+            for path in paths:
+                if hello.get('dedup'):
+                    acks.append(self.send_file_dedup(client_socket, path, hash_pool, report_progress))
+                else:
+                    self.send_file_frames(client_socket, path, hash_pool, report_progress, hello.get('codecs', []))
+                    acks.extend(self.read_acks(client_socket, 1))
+            self.on_log(f"✅ Data sending completed! Time: {datetime.now().strftime('%H:%M, %m/%d/%Y')}")
+            return acks
+
+    def send_file_dedup(self, client_socket, path, hash_pool, report_progress):
+        filename = os.path.basename(path)
+        filesize = os.path.getsize(path)
+        chunk_size = chunk_size_for(filesize)
+
+        # Chunk digests and the whole-file checksum are computed side by side
+        checksum_future = hash_pool.submit(file_checksum, path)
+        digests = file_chunk_digests(path, chunk_size)
+        metadata = {
+            'filename': filename,
+            'filesize': filesize,
+            'dedup': True,
+            'chunk_size': chunk_size,
+            'chunks': digests,
+            'timestamp': datetime.now().isoformat()
+        }
+        send_json_frame(client_socket, FRAME_META, metadata)
+
+        _, payload = recv_frame(client_socket, FRAME_RESUME)
+        missing = json.loads(payload.decode('utf-8'))['missing']
+        missing_bytes = sum(end - start for start, end in missing)
+        report_progress(filesize - missing_bytes, 0)
+        self.on_log(f"🧱 {filename}: partner already stores {filesize - missing_bytes} of {filesize} bytes")
+        if missing and self.compression not in ('off', 'auto'):
+            self.on_log(f"ℹ️ New chunks of {filename} are sent uncompressed")
+
+        for start, end in missing:
+            self.send_data_frames(client_socket, path, start, end, report_progress, chunk_size)
+        send_frame(client_socket, FRAME_END, checksum_future.result().encode('ascii'))
+
+        _, payload = recv_frame(client_socket, FRAME_ACK)
+        return json.loads(payload.decode('utf-8'))
+
+    def send_file_parallel(self, path, report_progress):
+        filename = os.path.basename(path)
+        filesize = os.path.getsize(path)
+        ranges = split_ranges(filesize, self.streams)
+        transfer_id = uuid.uuid4().hex
+
+        self.on_log(f"📤 Sending {filename} ({filesize} bytes) over {len(ranges)} parallel streams...")
+
+        # Each range gets its own connection plus a worker hashing that range alongside
+        with ThreadPoolExecutor(max_workers=len(ranges)) as send_pool, \
+                ThreadPoolExecutor(max_workers=len(ranges)) as hash_pool:
+            futures = [send_pool.submit(self.send_file_range, path, transfer_id,
+                                        start, end, len(ranges), hash_pool, report_progress)
+                       for start, end in ranges]
+            range_acks = [future.result() for future in futures]
+
+        self.on_log(f"✅ Data sending completed! Time: {datetime.now().strftime('%H:%M, %m/%d/%Y')}")
+
+        combined = combine_digests([ack['checksum'] for ack in range_acks])
+        self.on_log(f"🔐 Combined checksum of {len(ranges)} ranges: {combined[:8]}...")
+
+        # Exactly one ACK, from the range that completed the file, carries the partner's combined checksum
+        confirmed = [ack['combined_checksum'] for ack in range_acks if 'combined_checksum' in ack]
+        if confirmed and confirmed != [combined]:
+            self.on_log(f"⚠️ Combined checksum mismatch! Expected: {combined[:8]}..., Got: {confirmed[0][:8]}...")
+        ok = all(ack.get('status') == 'received' for ack in range_acks) and confirmed == [combined]
+        return [{'filename': filename, 'status': 'received' if ok else 'corrupted', 'bytes': filesize}]
+
+    def send_file_resumable(self, path, report_progress):
+        filename = os.path.basename(path)
+        filesize = os.path.getsize(path)
+        # Identifies this version of the file so a stale partial is never resumed
+        file_id = hashlib.md5(f"{filename}:{filesize}:{os.stat(path).st_mtime_ns}".encode('utf-8')).hexdigest()
+        chunk_size = chunk_size_for(filesize, self.profile.chunk_size, MAX_LEAVES)
+        reported = 0
+
+        def count_progress(count, wire_count=None):
+            nonlocal reported
+            reported += count
+            report_progress(count, wire_count)
+
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='sender-hash') as hash_pool:
+            # Chunks hash ahead of the socket; each digest follows its chunk's DATA frames
+            digests = [hash_pool.submit(chunk_digest, path, start, min(start + chunk_size, filesize))
+                       for start in range(0, filesize, chunk_size)]
+            for attempt in range(1, RESUME_ATTEMPTS + 1):
+                try:
+                    with self.connect(timeout=RESUME_IDLE_TIMEOUT) as client_socket:
+                        self.on_log(f"✅ Connection successful!")
+                        accepted = self.negotiate(client_socket).get('codecs', []) if self.compression != 'off' else []
+                        codec = choose_codec(path, filesize, self.compression, accepted)
+
+                        metadata = {
+                            'filename': filename,
+                            'filesize': filesize,
+                            'resumable': True,
+                            'file_id': file_id,
+                            'chunk_size': chunk_size,
+                            'timestamp': datetime.now().isoformat()
+                        }
+                        if codec:
+                            metadata['codec'] = codec
+                        send_json_frame(client_socket, FRAME_META, metadata)
+
+                        # The receiver answers with the chunks it still needs, or an ACK refusing the file
+                        frame_type, _, payload = recv_frame_of(client_socket, FRAME_RESUME, FRAME_ACK)
+                        if frame_type == FRAME_ACK:
+                            return [json.loads(payload.decode('utf-8'))]
+                        resume = json.loads(payload.decode('utf-8'))
+                        if resume['chunk_size'] != chunk_size:
+                            raise ProtocolError(f"partner asked for {resume['chunk_size']}-byte chunks, expected {chunk_size}")
+                        missing_bytes = sum(end - start for start, end in resume['missing'])
+                        count_progress(filesize - missing_bytes - reported, 0)
+                        if missing_bytes < filesize:
+                            self.on_log(f"🔁 Partner already has {filesize - missing_bytes} of {filesize} bytes, sending the rest")
+                        else:
+                            self.on_log(f"📤 Sending {filename} ({filesize} bytes{f', {codec} compressed' if codec else ''})")
+
+                        while True:
+                            self.send_chunks(client_socket, path, resume['missing'], chunk_size, digests, count_progress,
+                                             codec)
+                            root = merkle_root([digest.result() for digest in digests])
+                            send_frame(client_socket, FRAME_END, root.encode('ascii'))
+
+                            frame_type, _, payload = recv_frame_of(client_socket, FRAME_ACK, FRAME_RESUME)
+                            if frame_type == FRAME_ACK:
+                                break
+                            # Chunks that failed verification are re-requested one by one
+                            resume = json.loads(payload.decode('utf-8'))
+                            failed_bytes = sum(end - start for start, end in resume['missing'])
+                            count_progress(-failed_bytes, 0)
+                            self.on_log(f"⚠️ Partner re-requested {failed_bytes} bytes of {filename} that failed verification")
+
+                        self.on_log(f"✅ Data sending completed! Time: {datetime.now().strftime('%H:%M, %m/%d/%Y')}")
+                        ack = json.loads(payload.decode('utf-8'))
+                        if self.stats and ack.get('merkle_root'):
+                            self.stats.record_merkle_root(filename, ack['merkle_root'])
+                        return [ack]
+                except OSError as e:
+                    if attempt == RESUME_ATTEMPTS:
+                        raise
+                    delay = min(2 ** attempt, 30)
+                    self.on_log(f"🔁 Connection lost ({e}), resuming in {delay}s...")
+                    time.sleep(delay)
+
+    def send_chunks(self, client_socket, path, ranges, chunk_size, digests, report_progress, codec=None):
+        for start, end in ranges:
+            for chunk_start in range(start, end, chunk_size):
+                chunk_end = min(chunk_start + chunk_size, end)
+                if codec:
+                    self.send_compressed_chunk(client_socket, path, chunk_start, chunk_end, codec, report_progress)
+                else:
+                    self.send_data_frames(client_socket, path, chunk_start, chunk_end, report_progress, chunk_size)
+                digest = digests[chunk_start // chunk_size].result()
+                send_frame(client_socket, FRAME_DIGEST, bytes.fromhex(digest), chunk_start)
+
+    def send_file_range(self, path, transfer_id, start, end, streams, hash_pool, report_progress):
+        with self.connect() as client_socket:
+            filesize = os.path.getsize(path)
+            accepted = self.negotiate(client_socket).get('codecs', []) if self.compression != 'off' else []
+            codec = choose_codec(path, filesize, self.compression, accepted)
+            metadata = {
+                'filename': os.path.basename(path),
+                'filesize': filesize,
+                'transfer_id': transfer_id,
+                'range': [start, end],
+                'streams': streams,
+                'timestamp': datetime.now().isoformat()
+            }
+            if codec:
+                metadata['codec'] = codec
+            send_json_frame(client_socket, FRAME_META, metadata)
+
+            if codec:
+                # Each range is its own compressed stream
+                _, checksum = self.send_compressed_frames(client_socket, path, codec, report_progress, start, end)
+            else:
+                checksum_future = hash_pool.submit(file_checksum, path, start, end)
+                self.send_data_frames(client_socket, path, start, end, report_progress)
+                checksum = checksum_future.result()
+            send_frame(client_socket, FRAME_END, checksum.encode('ascii'))
+
+            _, payload = recv_frame(client_socket, FRAME_ACK)
+            ack = json.loads(payload.decode('utf-8'))
+            ack['checksum'] = checksum
+            return ack
+
+    def negotiate(self, client_socket):
+        hello = {'codecs': list(CODECS) if self.compression != 'off' else [], 'dedup': self.dedup,
+                 'priority': self.priority}
+        send_json_frame(client_socket, FRAME_HELLO, hello)
+        _, payload = recv_frame(client_socket, FRAME_HELLO)
+        return json.loads(payload.decode('utf-8'))
+
+    def send_file_frames(self, client_socket, path, hash_pool, report_progress, accepted=()):
+        filename = os.path.basename(path)
+        filesize = os.path.getsize(path)
+        codec = choose_codec(path, filesize, self.compression, accepted)
+
+        # Send metadata
+        metadata = {
+            'filename': filename,
+            'filesize': filesize,
+            'timestamp': datetime.now().isoformat()
+        }
+        if codec:
+            metadata['codec'] = codec
+        send_json_frame(client_socket, FRAME_META, metadata)
+
+        if codec:
+            self.on_log(f"📄 Sending {filename} ({filesize} bytes, {codec} compressed)")
+            wire_bytes, checksum = self.send_compressed_frames(client_socket, path, codec, report_progress)
+            send_frame(client_socket, FRAME_END, checksum.encode('ascii'))
+            self.on_log(f"🗜️ {filename}: {filesize} → {wire_bytes} bytes ({filesize / max(wire_bytes, 1):.2f}x)")
+            return
+
+        self.on_log(f"📄 Sending {filename} ({filesize} bytes)")
+
+        # Send file data with sendfile while the checksum is computed alongside
+        checksum_future = hash_pool.submit(file_checksum, path)
+        self.send_data_frames(client_socket, path, 0, filesize, report_progress)
+        send_frame(client_socket, FRAME_END, checksum_future.result().encode('ascii'))
+
+    def send_data_frames(self, client_socket, path, start, end, report_progress, block_size=None):
+        # One sendfile call per DATA frame
+        block_size = block_size or self.profile.chunk_size
+        with open(path, 'rb') as f:
+            offset = start
+            while offset < end:
+                count = min(block_size, end - offset)
+                client_socket.sendall(pack_header(FRAME_DATA, count, offset))
+                sent = client_socket.sendfile(f, offset=offset, count=count)
+                if sent != count:
+                    raise ConnectionError(f"{os.path.basename(path)} shrank while sending ({offset + sent} of {end} bytes)")
+                offset += count
+                report_progress(count)
+
+    def send_compressed_frames(self, client_socket, path, codec, report_progress, start=0, end=None):
+        # Compressed frames cannot use sendfile, so the checksum is taken from the blocks already read
+        compressor = get_codec(codec).compressor()
+        hasher = hashlib.md5()
+        position = 0
+
+        def send_block(block):
+            nonlocal position
+            if block:
+                client_socket.sendall(pack_header(FRAME_DATA, len(block), position))
+                client_socket.sendall(block)
+                position += len(block)
+            return len(block)
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = os.fstat(f.fileno()).st_size - start if end is None else end - start
+            while remaining > 0:
+                data = f.read(min(self.profile.chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                hasher.update(data)
+                report_progress(len(data), send_block(compressor.compress(data)))
+        report_progress(0, send_block(compressor.flush()))
+        return position, hasher.hexdigest()
+
+    def send_compressed_chunk(self, client_socket, path, start, end, codec, report_progress):
+        # A resumable chunk is compressed on its own, so any chunk can be re-sent alone.
+        # Its DATA frame sits at the chunk's file offset; the DIGEST after it covers the plain bytes.
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        if len(data) != end - start:
+            raise ConnectionError(f"{os.path.basename(path)} shrank while sending ({start + len(data)} of {end} bytes)")
+        compressor = get_codec(codec).compressor()
+        block = compressor.compress(data) + compressor.flush()
+        client_socket.sendall(pack_header(FRAME_DATA, len(block), start))
+        client_socket.sendall(block)
+        report_progress(len(data), len(block))
+
+    def read_acks(self, client_socket, count):
+        acks = []
+        for _ in range(count):
+            _, payload = recv_frame(client_socket, FRAME_ACK)
+            acks.append(json.loads(payload.decode('utf-8')))
+        return acks
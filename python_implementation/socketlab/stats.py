@@ -0,0 +1,125 @@
+"""Running totals for sent and received transfers, shared by the GUI and the CLI.
+
+Every recorded transfer also lands in a metrics registry (``socketlab.metrics``):
+counters per direction, histograms of transfer speed and duration, and a
+per-second throughput series, so percentiles survive beyond the last transfer.
+"""
+import threading
+from datetime import datetime
+
+from .metrics import REGISTRY, SPEED_BUCKETS, Histogram
+
+
+class TransferMetrics:
+    # The registry metrics for one transport; the FastAPI backend uses transport='socketio'
+    def __init__(self, registry=REGISTRY, transport='tcp'):
+        self.directions = {}
+        for direction in ('sent', 'received'):
+            labels = {'transport': transport, 'direction': direction}
+            self.directions[direction] = {
+                'files': registry.counter('socketlab_files_total', 'Files transferred', labels),
+                'bytes': registry.counter('socketlab_bytes_total', 'File bytes transferred', labels),
+                'wire_bytes': registry.counter('socketlab_wire_bytes_total', 'Bytes on the wire, after compression',
+                                               labels),
+                'seconds': registry.histogram('socketlab_transfer_seconds', 'Duration of each transfer', labels),
+                'speed': registry.histogram('socketlab_transfer_speed_bytes_per_second', 'Speed of each transfer',
+                                            labels, buckets=SPEED_BUCKETS),
+                'throughput': registry.series('socketlab_throughput_bytes', 'Bytes completed per second', labels),
+            }
+
+    def record(self, direction, files, nbytes, seconds, wire_bytes=None):
+        metrics = self.directions[direction]
+        metrics['files'].inc(files)
+        metrics['bytes'].inc(nbytes)
+        metrics['wire_bytes'].inc(nbytes if wire_bytes is None else wire_bytes)
+        metrics['seconds'].observe(seconds)
+        if seconds > 0:
+            metrics['speed'].observe(nbytes / seconds)
+        metrics['throughput'].record(nbytes)
+
+
+class TransferStats:
+    def __init__(self, registry=REGISTRY):
+        self.lock = threading.Lock()
+        # Registry metrics are cumulative for the process, as Prometheus expects; reset() leaves them alone
+        self.metrics = TransferMetrics(registry)
+        # Speeds since the last reset, both directions, for the report's percentiles
+        self.speeds = Histogram('transfer_speed', buckets=SPEED_BUCKETS)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.files_sent = 0
+            self.files_received = 0
+            self.bytes_transferred = 0
+            self.wire_bytes = 0  # bytes on the wire, smaller than bytes_transferred when compressed
+            self.transfer_time = 0
+            self.transfer_speed = 0  # KB/s of the most recent transfer
+            self.last_merkle_root = None  # (filename, hex root) of the most recent chunk-verified file
+        self.speeds.reset()
+
+    def record_sent(self, files, nbytes, seconds, wire_bytes=None):
+        with self.lock:
+            self.files_sent += files
+            self.record(nbytes, seconds, wire_bytes)
+        self.metrics.record('sent', files, nbytes, seconds, wire_bytes)
+
+    def record_received(self, nbytes, seconds, wire_bytes=None, files=1):
+        with self.lock:
+            self.files_received += files
+            self.record(nbytes, seconds, wire_bytes)
+        self.metrics.record('received', files, nbytes, seconds, wire_bytes)
+
+    def record_merkle_root(self, filename, root):
+        with self.lock:
+            self.last_merkle_root = (filename, root)
+
+    def record(self, nbytes, seconds, wire_bytes=None):
+        self.bytes_transferred += nbytes
+        self.wire_bytes += nbytes if wire_bytes is None else wire_bytes
+        self.transfer_time += seconds
+        if seconds > 0:
+            self.transfer_speed = nbytes / seconds / 1024
+            self.speeds.observe(nbytes / seconds)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'files_sent': self.files_sent,
+                'files_received': self.files_received,
+                'bytes_transferred': self.bytes_transferred,
+                'wire_bytes': self.wire_bytes,
+                'compression_ratio': self.bytes_transferred / self.wire_bytes if self.wire_bytes else 1.0,
+                'effective_speed': self.bytes_transferred / self.transfer_time / 1024 if self.transfer_time else 0,
+                'files_per_second': (self.files_sent + self.files_received) / self.transfer_time if self.transfer_time else 0,
+                'transfer_time': self.transfer_time,
+                'transfer_speed': self.transfer_speed,
+                'speed_p50': (self.speeds.percentile(0.5) or 0) / 1024,
+                'speed_p99': (self.speeds.percentile(0.99) or 0) / 1024,
+                'last_merkle_root': self.last_merkle_root
+            }
+
+    def format_report(self):
+        stats = self.as_dict()
+        return f"""📊 Transfer Statistics
+{'='*40}
+
+📤 Files Sent: {stats['files_sent']}
+📥 Files Received: {stats['files_received']}
+📁 Total Files: {stats['files_sent'] + stats['files_received']}
+
+💾 Bytes Transferred: {stats['bytes_transferred']:,} bytes
+📏 MB Transferred: {stats['bytes_transferred'] / 1024 / 1024:.2f} MB
+
+⏱️ Total Transfer Time: {stats['transfer_time']:.2f} seconds
+🚀 Last Transfer Speed: {stats['transfer_speed']:.2f} KB/s
+📈 Speed p50 / p99: {stats['speed_p50']:.2f} / {stats['speed_p99']:.2f} KB/s
+📦 Files per Second: {stats['files_per_second']:.1f}
+
+🗜️ Bytes on the Wire: {stats['wire_bytes']:,} bytes
+📉 Compression Ratio: {stats['compression_ratio']:.2f}x
+⚡ Effective Throughput: {stats['effective_speed']:.2f} KB/s of file data
+🌳 Last Merkle Root: {f"{stats['last_merkle_root'][1][:16]}... ({stats['last_merkle_root'][0]})" if stats['last_merkle_root'] else 'none'}
+
+📅 Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+"""
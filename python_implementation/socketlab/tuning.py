@@ -0,0 +1,81 @@
+"""Socket tuning profiles: kernel buffer sizes, Nagle/delayed-ACK and chunk sizes.
+
+A profile is applied to a socket before it connects or listens, so the TCP
+window scale is negotiated with the larger buffers in place. Setting
+``SO_SNDBUF``/``SO_RCVBUF`` explicitly turns off Linux buffer autotuning for
+that socket, which is why the ``default`` profile leaves them alone.
+"""
+import socket
+
+# Kernel option missing on macOS and Windows; skipped where unavailable
+TCP_QUICKACK = getattr(socket, 'TCP_QUICKACK', None)
+
+
+class SocketProfile:
+    def __init__(self, name, sndbuf=None, rcvbuf=None, nodelay=False, quickack=False,
+                 chunk_size=4 * 1024 * 1024, recv_buffer_size=256 * 1024):
+        self.name = name
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.nodelay = nodelay
+        self.quickack = quickack
+        # Bytes per DATA frame on the sending side
+        self.chunk_size = chunk_size
+        # Size of each pooled recv_into buffer on the receiving side
+        self.recv_buffer_size = recv_buffer_size
+
+    def apply(self, sock):
+        if self.sndbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        if self.rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        if self.nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.quickack and TCP_QUICKACK is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, TCP_QUICKACK, 1)
+
+    def connect(self, address, timeout=None):
+        # Like socket.create_connection, but tuned before the handshake
+        host, port = address
+        error = None
+        for family, kind, proto, _, sockaddr in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+            sock = socket.socket(family, kind, proto)
+            try:
+                self.apply(sock)
+                sock.settimeout(timeout)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                sock.close()
+                error = e
+        raise error or OSError(f"could not resolve {host}")
+
+    def describe(self):
+        def size(value):
+            return f"{value // 1024} KB" if value else "kernel default"
+        return (f"{self.name}: sndbuf {size(self.sndbuf)}, rcvbuf {size(self.rcvbuf)}, "
+                f"nodelay {'on' if self.nodelay else 'off'}, quickack {'on' if self.quickack else 'off'}, "
+                f"chunk {self.chunk_size // 1024} KB, recv buffer {self.recv_buffer_size // 1024} KB")
+
+
+PROFILES = {
+    # Kernel autotuning, Nagle on: behaves like an untuned socket
+    'default': SocketProfile('default'),
+    # Same host: huge buffers and chunks, latency is irrelevant
+    'loopback': SocketProfile('loopback', sndbuf=4 * 1024 * 1024, rcvbuf=4 * 1024 * 1024, nodelay=True,
+                              chunk_size=8 * 1024 * 1024, recv_buffer_size=1024 * 1024),
+    # Low-latency LAN: modest buffers, small control frames go out immediately
+    'lan': SocketProfile('lan', sndbuf=1024 * 1024, rcvbuf=1024 * 1024, nodelay=True, quickack=True),
+    # High bandwidth-delay product: large windows, smaller chunks so a resume loses less
+    'wan': SocketProfile('wan', sndbuf=8 * 1024 * 1024, rcvbuf=8 * 1024 * 1024, nodelay=True,
+                         chunk_size=1024 * 1024),
+}
+
+DEFAULT_PROFILE = PROFILES['default']
+
+
+def get_profile(name):
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown socket profile {name!r} (choose from {', '.join(PROFILES)})") from None
@@ -0,0 +1,63 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketlab.receiver import ReceiverEngine  # noqa: E402
+
+
+@pytest.fixture
+def start_receiver(tmp_path):
+    """Starts receivers on ephemeral loopback ports writing into ``tmp_path / 'received'``."""
+    engines = []
+
+    def start(**options):
+        logs = []
+        engine = ReceiverEngine(0, host='127.0.0.1', output_dir=str(tmp_path / 'received'),
+                                on_log=logs.append, **options)
+        engine.logs = logs
+        engine.start()
+        engines.append(engine)
+        return engine
+
+    yield start
+    for engine in engines:
+        engine.stop()
+
+
+@pytest.fixture
+def receiver(start_receiver):
+    return start_receiver()
+
+
+def write_random(path, size, seed=0):
+    data = random.Random(seed).randbytes(size)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='session')
+def backend(tmp_path_factory):
+    """The FastAPI backend module, importable once its dependencies are installed."""
+    for module in ('fastapi', 'socketio', 'aiofiles'):
+        pytest.importorskip(module)
+    directory = tmp_path_factory.mktemp('backend')
+    # main.py creates its upload folder relative to the working directory on import
+    cwd = os.getcwd()
+    os.chdir(directory)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    main.UPLOAD_DIR = str(directory / 'uploads')
+    return main
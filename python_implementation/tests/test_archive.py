@@ -0,0 +1,81 @@
+"""Folder transfers: round trip, metadata and paths that try to leave the folder."""
+import json
+import os
+import socket
+
+import pytest
+
+from conftest import read, write_random
+
+from socketlab.archive import safe_join
+from socketlab.protocol import FRAME_DATA, FRAME_ENTRY, FRAME_META, pack_header, send_json_frame
+from socketlab.sender import FileSender
+
+
+def make_tree(root):
+    os.makedirs(root / 'docs' / 'empty')
+    os.makedirs(root / 'src' / 'pkg')
+    for index in range(50):
+        (root / 'src' / 'pkg' / f"module{index}.py").write_bytes(b'x = %d\n' % index * (index + 1))
+    (root / 'docs' / 'blank.txt').write_bytes(b'')
+    write_random(root / 'docs' / 'big.bin', 3 * 1024 * 1024 + 1)
+    os.chmod(root / 'src' / 'pkg' / 'module1.py', 0o755)
+    os.utime(root / 'docs' / 'blank.txt', ns=(1_000_000_000, 1_000_000_000))
+    os.symlink('/etc/passwd', root / 'docs' / 'link')
+
+
+def listing(root):
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            files[os.path.relpath(path, root)] = read(path)
+    return files
+
+
+def test_folder_round_trip(receiver, tmp_path):
+    root = tmp_path / 'project'
+    make_tree(root)
+    logs = []
+
+    ack, = FileSender('127.0.0.1', receiver.port, on_log=logs.append).send([str(root)])
+
+    assert ack['status'] == 'received'
+    assert ack['files'] == 52
+    target = os.path.join(receiver.output_dir, 'project')
+    expected = listing(root)
+    del expected[os.path.join('docs', 'link')]
+    assert listing(target) == expected
+    assert os.path.isdir(os.path.join(target, 'docs', 'empty'))
+    assert os.stat(os.path.join(target, 'src', 'pkg', 'module1.py')).st_mode & 0o777 == 0o755
+    assert os.stat(os.path.join(target, 'docs', 'blank.txt')).st_mtime_ns == 1_000_000_000
+    assert any('Skipping docs/link' in message for message in logs)
+    assert [name for name in os.listdir(receiver.output_dir) if name.startswith('.')] == []
+
+
+@pytest.mark.parametrize('relative', ['', '/etc/passwd', '../escape', 'a/../../escape', 'a//b', './a', 'a/.'])
+def test_safe_join_rejects_paths_leaving_the_folder(relative):
+    with pytest.raises(ValueError):
+        safe_join('/staging', relative)
+
+
+def test_safe_join_accepts_nested_paths():
+    assert safe_join('/staging', 'a/b/c.txt') == os.path.join('/staging', 'a', 'b', 'c.txt')
+
+
+def test_receiver_rejects_entries_leaving_the_folder(receiver, tmp_path):
+    with socket.create_connection(('127.0.0.1', receiver.port)) as sock:
+        send_json_frame(sock, FRAME_META, {'filename': 'evil', 'filesize': 5, 'archive': True, 'files': 1})
+        entry = json.dumps({'path': '../../escape', 'type': 'file', 'size': 5, 'mode': 0o644,
+                            'mtime_ns': 0}).encode('utf-8')
+        sock.sendall(pack_header(FRAME_ENTRY, len(entry)) + entry + pack_header(FRAME_DATA, 5) + b'owned')
+        sock.settimeout(5)
+        # The receiver drops the connection instead of acknowledging
+        try:
+            assert sock.recv(1) == b''
+        except ConnectionResetError:
+            pass
+
+    assert not (tmp_path / 'escape').exists()
+    assert os.listdir(receiver.output_dir) == []
+    assert any('unsafe path' in message for message in receiver.logs)
@@ -0,0 +1,102 @@
+"""Benchmark suite: case runs, result comparison and the CLI's exit status."""
+import json
+
+import pytest
+
+from socketlab import cli
+from socketlab.benchmark import KB, MB, compare, files_for, generate_files, run_case
+from socketlab.sender import RESUMABLE_MIN_SIZE, FileSender
+
+
+def results(*cases, mode='pipelined'):
+    return {'version': 1, 'created_at': '2025-01-01T00:00:00',
+            'results': [{'case': {'size': size, 'chunk_size': 64 * KB, 'concurrency': 1}, 'mode': mode,
+                         'files': files, 'mb_per_s': mb_per_s} for size, files, mb_per_s in cases]}
+
+
+def test_compare_flags_drops_beyond_the_threshold():
+    before = results((KB, 10, 100.0), (64 * KB, 10, 100.0), (1024 * KB, 1, 100.0))
+    after = results((KB, 10, 95.0), (64 * KB, 10, 80.0), (1024 * KB, 1, 150.0))
+
+    changes = {change['case']: change for change in compare(after, before, threshold=10)}
+
+    assert not changes['1K/64K/x1']['regression']
+    assert changes['64K/64K/x1']['regression']
+    assert changes['64K/64K/x1']['change'] == pytest.approx(-20)
+    assert changes['1M/64K/x1']['change'] == pytest.approx(50)
+
+
+def test_compare_skips_cases_run_differently():
+    before = results((KB, 10, 100.0))
+    after = results((KB, 20, 10.0), (64 * KB, 10, 10.0))
+    assert compare(after, before) == []
+
+
+def test_compare_skips_cases_run_in_another_mode():
+    before = results((8 * MB, 1, 100.0), mode='resumable')
+    after = results((8 * MB, 1, 10.0))
+    assert compare(after, before) == []
+
+
+def test_transfer_mode_can_be_pinned():
+    assert FileSender('127.0.0.1', 1).transfer_mode(['a'], RESUMABLE_MIN_SIZE) == 'resumable'
+    assert FileSender('127.0.0.1', 1, resumable=False).transfer_mode(['a'], RESUMABLE_MIN_SIZE) == 'pipelined'
+    assert FileSender('127.0.0.1', 1, resumable=True).transfer_mode(['a'], KB) == 'resumable'
+    assert FileSender('127.0.0.1', 1, resumable=True).transfer_mode(['a', 'b'], KB) == 'pipelined'
+    assert FileSender('127.0.0.1', 1, streams=2, resumable=False).transfer_mode(['a'], 8 * MB) == 'parallel'
+
+
+def test_generated_files_are_reproducible(tmp_path):
+    first = generate_files(str(tmp_path / 'a'), 3000, 2, seed=7)
+    second = generate_files(str(tmp_path / 'b'), 3000, 2, seed=7)
+    contents = [open(path, 'rb').read() for path in first + second]
+    assert contents[0] == contents[2] and contents[1] == contents[3]
+    assert contents[0] != contents[1]
+    assert len(contents[0]) == 3000
+
+
+def test_run_case(tmp_path):
+    case = {'size': 4 * KB, 'chunk_size': 64 * KB, 'concurrency': 2}
+    paths = generate_files(str(tmp_path / 'input'), case['size'], 20, seed=1)
+
+    result = run_case(case, paths, 2, str(tmp_path / 'work'))
+
+    assert result['key'] == '4K/64K/x2'
+    assert result['files'] == 20 and result['bytes'] == 80 * KB
+    assert len(result['rounds']) == 2
+    assert result['mb_per_s'] > 0 and result['ttfb'] is not None
+    assert result['mode'] == 'pipelined'
+    assert files_for(4 * KB) == 1000 and files_for(64 * 1024 * KB) == 1
+
+
+def test_single_large_file_case_is_not_sent_resumably(tmp_path):
+    case = {'size': RESUMABLE_MIN_SIZE, 'chunk_size': 256 * KB, 'concurrency': 1}
+    paths = generate_files(str(tmp_path / 'input'), case['size'], 1, seed=1)
+
+    result = run_case(case, paths, 1, str(tmp_path / 'work'))
+
+    assert result['mode'] == 'pipelined'
+
+
+def run_suite_cli(*extra):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(['suite', '--sizes', '16K', '--chunk-sizes', '64K', '--concurrency', '1', '--rounds', '1', *extra])
+    return exit_info.value.code
+
+
+def test_suite_exit_status_reports_regressions(tmp_path):
+    baseline = tmp_path / 'baseline.json'
+    assert run_suite_cli('--output', str(baseline)) == 0
+
+    saved = json.loads(baseline.read_text())
+    for result in saved['results']:
+        result['mb_per_s'] *= 1000
+    faster_before = tmp_path / 'faster.json'
+    faster_before.write_text(json.dumps(saved))
+    for result in saved['results']:
+        result['mb_per_s'] /= 1000 * 1000
+    slower_before = tmp_path / 'slower.json'
+    slower_before.write_text(json.dumps(saved))
+
+    assert run_suite_cli('--compare', str(faster_before)) == 1
+    assert run_suite_cli('--compare', str(slower_before)) == 0
@@ -0,0 +1,100 @@
+"""ChunkStore bookkeeping: eviction, pinning and the persisted index."""
+import os
+import time
+
+import pytest
+
+from socketlab.chunkstore import ChunkStore, new_hasher
+
+
+def put(store, data):
+    digest = new_hasher()
+    digest.update(data)
+    digest = digest.hexdigest()
+    fd, temp_path = store.open_writer()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    store.commit(temp_path, digest, len(data))
+    return digest
+
+
+def test_least_recently_used_chunks_are_evicted_first(tmp_path):
+    store = ChunkStore(str(tmp_path), max_bytes=3000)
+    first = put(store, b'a' * 1000)
+    time.sleep(0.01)
+    second = put(store, b'b' * 1000)
+    time.sleep(0.01)
+    third = put(store, b'c' * 1000)
+    time.sleep(0.01)
+    # Using the first chunk again makes the second the oldest
+    store.assemble([first], 1000, str(tmp_path / 'out.bin'), new_hasher())
+    time.sleep(0.01)
+
+    put(store, b'd' * 1000)
+
+    assert second not in store.index
+    assert not os.path.exists(store.path(second))
+    assert {first, third} <= set(store.index)
+    assert store.total_bytes == 3000
+
+
+def test_pinned_chunks_survive_eviction(tmp_path):
+    store = ChunkStore(str(tmp_path), max_bytes=1500)
+    first = put(store, b'a' * 1000)
+    assert store.pin([first, 'f' * 64]) == {'f' * 64}
+    time.sleep(0.01)
+
+    second = put(store, b'b' * 1000)
+
+    assert first in store.index
+    store.unpin([first, 'f' * 64])
+    put(store, b'c' * 1000)
+    assert first not in store.index and second not in store.index
+
+
+def test_chunks_older_than_max_age_are_evicted(tmp_path):
+    store = ChunkStore(str(tmp_path), max_age=60)
+    old = put(store, b'a' * 10)
+    store.index[old] = (10, time.time() - 120)
+
+    put(store, b'b' * 10)
+
+    assert old not in store.index
+
+
+def test_index_is_reloaded(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    digest = put(store, b'x' * 100)
+    store.close()
+
+    reopened = ChunkStore(str(tmp_path))
+
+    assert digest in reopened.index
+    assert reopened.total_bytes == 100
+
+
+@pytest.mark.parametrize('chunks', [1, 3])
+def test_assemble(tmp_path, chunks):
+    store = ChunkStore(str(tmp_path / 'store'))
+    parts = [bytes([index]) * 1000 for index in range(chunks)]
+    digests = [put(store, part) for part in parts]
+    hasher = new_hasher()
+
+    store.assemble(digests, 1000, str(tmp_path / 'out.bin'), hasher)
+
+    assert (tmp_path / 'out.bin').read_bytes() == b''.join(parts)
+    expected = new_hasher()
+    expected.update(b''.join(parts))
+    assert hasher.hexdigest() == expected.hexdigest()
+
+
+def test_assembled_file_never_shares_the_store_object(tmp_path):
+    store = ChunkStore(str(tmp_path / 'store'))
+    digest = put(store, b'a' * 1000)
+
+    method = store.assemble([digest], 1000, str(tmp_path / 'out.bin'), new_hasher())
+
+    assert method in ('reflink', 'copy')
+    assert not os.path.samefile(tmp_path / 'out.bin', store.path(digest))
+    (tmp_path / 'out.bin').write_bytes(b'changed')
+    assert open(store.path(digest), 'rb').read() == b'a' * 1000
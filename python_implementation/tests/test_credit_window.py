@@ -0,0 +1,66 @@
+"""The uploader's ack-driven credit window."""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('socketio')
+pytest.importorskip('tkinter')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend'))
+
+from gui import RTT_SLACK, CreditWindow  # noqa: E402
+
+
+def test_slow_start_doubles_per_round_trip():
+    window = CreditWindow(max_window=64, credit=64, initial=4)
+    for _ in range(4):
+        window.on_ack(0.01)
+    assert window.size == 8
+    for _ in range(8):
+        window.on_ack(0.01)
+    assert window.size == 16
+
+
+def test_size_never_exceeds_credit_or_maximum():
+    window = CreditWindow(max_window=10, credit=64, initial=4)
+    for _ in range(50):
+        window.on_ack(0.01)
+    assert window.size == 10
+    window.on_ack(0.01, credit=3)
+    assert window.size == 3
+    assert CreditWindow(max_window=10, credit=0).size == 1
+
+
+def test_stretched_round_trips_back_off_then_grow_additively():
+    window = CreditWindow(max_window=64, credit=64, initial=16)
+    window.on_ack(0.01)
+    window.last_decrease = -1e9
+    # A few slow acks push the smoothed RTT past twice the minimum
+    while window.slow_start:
+        window.on_ack(0.05 + 2 * RTT_SLACK)
+    backed_off = window.cwnd
+    assert backed_off < 17
+    window.srtt = window.min_rtt
+    for _ in range(int(backed_off)):
+        window.on_ack(window.min_rtt)
+    # Congestion avoidance: about one more chunk per window of acks
+    assert backed_off + 0.5 < window.cwnd < backed_off + 1.5
+
+
+def test_loss_halves_once_per_round_trip():
+    window = CreditWindow(max_window=64, credit=64, initial=16)
+    window.on_ack(0.5)
+    window.last_decrease = -1e9
+    window.on_loss()
+    assert window.cwnd == 8.5
+    # The rest of the same burst of timeouts counts as the same signal
+    window.on_loss()
+    assert window.cwnd == 8.5
+    assert not window.slow_start
+
+
+def test_window_never_drops_below_one_chunk():
+    window = CreditWindow(max_window=64, credit=64, initial=1)
+    window.on_loss(credit=2)
+    assert window.cwnd == 1.0
+    assert window.size == 1
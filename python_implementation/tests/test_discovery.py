@@ -0,0 +1,80 @@
+"""Peer discovery: the peer table and announcements over loopback."""
+import socket
+import time
+
+from socketlab.discovery import Announcer, PeerListener, PeerTable
+
+
+def announcement(node_id, port=9000, **extra):
+    return {'node_id': node_id, 'name': node_id, 'port': port, **extra}
+
+
+def free_udp_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_silent_peers_expire():
+    table = PeerTable(ttl=6)
+    table.update(announcement('a'), '10.0.0.1', now=100)
+    table.update(announcement('b'), '10.0.0.2', now=104)
+
+    assert not table.expire(now=105)
+    assert table.expire(now=107)
+    assert [peer['node_id'] for peer in table.snapshot()] == ['b']
+    table.update(announcement('b'), '10.0.0.2', now=109)
+    assert not table.expire(now=112)
+
+
+def test_leaving_peer_is_removed_at_once():
+    table = PeerTable()
+    table.update(announcement('a'), '10.0.0.1', now=100)
+
+    assert table.update(announcement('a', leaving=True), '10.0.0.1', now=101)
+    assert table.snapshot() == []
+    assert not table.update(announcement('a', leaving=True), '10.0.0.1', now=102)
+
+
+def test_only_real_changes_are_reported():
+    table = PeerTable()
+    assert table.update(announcement('a'), '10.0.0.1', now=100)
+    assert not table.update(announcement('a'), '10.0.0.1', now=102)
+    assert table.update(announcement('a', port=9001), '10.0.0.1', now=104)
+    assert table.snapshot()[0]['last_seen'] == 104
+
+
+def test_announcements_over_loopback():
+    port = free_udp_port()
+    changes = []
+    listener = PeerListener(group='127.0.0.1', discovery_port=port, ignore=['self'], on_change=changes.append)
+    listener.start()
+    announcer = Announcer('node-1', 9000, name='lab-pc', group='127.0.0.1', discovery_port=port, interval=0.1)
+    own = Announcer('self', 9001, group='127.0.0.1', discovery_port=port, interval=0.1)
+    try:
+        announcer.start()
+        own.start()
+        assert wait_for(lambda: listener.peers())
+        peer, = listener.peers()
+        assert (peer['node_id'], peer['name'], peer['host'], peer['port']) == ('node-1', 'lab-pc', '127.0.0.1', 9000)
+
+        # Stray datagrams on the group are ignored
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as stray:
+            stray.sendto(b'not json', ('127.0.0.1', port))
+            stray.sendto(b'{"magic": "other"}', ('127.0.0.1', port))
+
+        announcer.stop()
+        assert wait_for(lambda: not listener.peers())
+        assert changes[-1] == []
+    finally:
+        own.stop()
+        listener.stop()
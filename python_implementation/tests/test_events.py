@@ -0,0 +1,78 @@
+"""EventBus delivery: ordered emits, coalesced latest values and batched appends."""
+import threading
+
+from socketlab.events import EventBus
+
+
+def test_coalesce_keeps_the_latest_call_per_key():
+    bus = EventBus()
+    seen = []
+    for percent in range(100):
+        bus.coalesce('progress', seen.append, ('progress', percent))
+    bus.coalesce('stats', seen.append, ('stats', 1))
+
+    bus.drain()
+
+    assert seen == [('progress', 99), ('stats', 1)]
+    bus.drain()
+    assert len(seen) == 2
+
+
+def test_append_batches_items_into_one_call():
+    bus = EventBus()
+    calls = []
+    for line in ['a', 'b', 'c']:
+        bus.append('log', calls.append, line)
+    bus.append('other', calls.append, 'x')
+
+    bus.drain()
+
+    assert calls == [['a', 'b', 'c'], ['x']]
+
+
+def test_emit_delivers_every_call_in_order():
+    bus = EventBus()
+    seen = []
+    for status in ['connecting', 'sending', 'done']:
+        bus.emit(seen.append, status)
+
+    bus.drain()
+
+    assert seen == ['connecting', 'sending', 'done']
+
+
+def test_a_failing_handler_does_not_stop_the_drain():
+    bus = EventBus()
+    seen, errors = [], []
+
+    def fail():
+        raise ValueError("broken widget")
+
+    bus.emit(fail)
+    bus.emit(seen.append, 'after')
+
+    bus.drain(on_error=errors.append)
+
+    assert seen == ['after']
+    assert [str(error) for error in errors] == ["broken widget"]
+
+
+def test_publishing_from_many_threads():
+    bus = EventBus()
+    lines = []
+
+    def worker(name):
+        for index in range(1000):
+            bus.append('log', lines.extend, (name, index))
+            bus.coalesce(('progress', name), lambda: None)
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bus.drain()
+
+    assert len(lines) == 4000
+    for name in range(4):
+        assert [index for owner, index in lines if owner == name] == list(range(1000))
@@ -0,0 +1,179 @@
+"""The Tk client's presence state: snapshots, sequenced deltas and resyncs."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('socketio')
+pytest.importorskip('tkinter')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend'))
+
+import gui  # noqa: E402
+
+
+class FakeRoot:
+    def after(self, delay, callback, *args):
+        pass
+
+
+class FakeServer:
+    """Answers presence_snapshot and heartbeat calls the way the backend would."""
+
+    def __init__(self, seq, clients):
+        self.seq = seq
+        self.clients = clients
+        self.snapshots = 0
+        # Set to hold snapshot replies back until the test releases them
+        self.gate = None
+        # (seq, clients) the server moves to after each snapshot it serves
+        self.next_states = []
+
+    async def call(self, event, data=None):
+        if event == 'heartbeat':
+            return {'status': 'ok', 'seq': self.seq}
+        self.snapshots += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        page = {'seq': self.seq, 'clients': [{'client_id': client_id} for client_id in self.clients],
+                'total': len(self.clients), 'next_cursor': None}
+        if self.next_states:
+            self.seq, self.clients = self.next_states.pop(0)
+        return page
+
+
+def client_app(server):
+    # The presence logic only needs the Socket.IO client and root.after, not a display
+    app = gui.FileTransferApp.__new__(gui.FileTransferApp)
+    app.root = FakeRoot()
+    app.sio = server
+    app.connected = True
+    app.clients = {}
+    app.presence_seq = None
+    app.pending_presence = []
+    app.presence_lock = asyncio.Lock()
+    return app
+
+
+def join(seq, client_id):
+    return {'seq': seq, 'changes': [{'op': 'join', 'client': {'client_id': client_id}}]}
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(gui, 'RESYNC_JITTER', 0)
+
+
+def test_deltas_apply_in_order_and_a_gap_reloads():
+    server = FakeServer(5, ['a', 'b'])
+
+    async def scenario():
+        app = client_app(server)
+        await app.load_presence()
+        await app.on_presence(join(6, 'c'))
+        await app.on_presence({'seq': 7, 'changes': [{'op': 'leave', 'client_id': 'a'}]})
+        applied = (app.presence_seq, set(app.clients))
+        # Frame 8 was lost; 9 shows the gap
+        server.seq, server.clients = 9, ['b', 'c', 'd', 'e']
+        await app.on_presence(join(9, 'e'))
+        return app, applied
+
+    app, applied = asyncio.run(scenario())
+    assert applied == (7, {'b', 'c'})
+    assert server.snapshots == 2
+    assert (app.presence_seq, set(app.clients)) == (9, {'b', 'c', 'd', 'e'})
+
+
+def test_resync_notice_reloads_the_snapshot():
+    server = FakeServer(1, ['a'])
+
+    async def scenario():
+        app = client_app(server)
+        await app.load_presence()
+        server.seq, server.clients = 2, ['a', 'b', 'c']
+        await app.on_presence({'seq': 2, 'resync': True, 'total': 3})
+        return app
+
+    app = asyncio.run(scenario())
+    assert server.snapshots == 2
+    assert (app.presence_seq, set(app.clients)) == (2, {'a', 'b', 'c'})
+
+
+def test_frames_during_a_load_are_held_until_it_is_in():
+    server = FakeServer(4, ['a'])
+
+    async def scenario():
+        app = client_app(server)
+        server.gate = asyncio.Event()
+        load = asyncio.create_task(app.load_presence())
+        await asyncio.sleep(0)
+        # The snapshot covers frame 4; frame 5 comes after it
+        await app.on_presence(join(4, 'a'))
+        await app.on_presence(join(5, 'b'))
+        held = list(app.pending_presence)
+        server.gate.set()
+        await load
+        return app, held
+
+    app, held = asyncio.run(scenario())
+    assert [frame['seq'] for frame in held] == [4, 5]
+    assert server.snapshots == 1
+    assert (app.presence_seq, set(app.clients)) == (5, {'a', 'b'})
+    assert app.pending_presence == []
+
+
+def test_gap_among_held_frames_loads_again():
+    server = FakeServer(4, ['a'])
+    # Frame 5 is lost while the first snapshot is on its way
+    server.next_states = [(6, ['a', 'b', 'c'])]
+
+    async def scenario():
+        app = client_app(server)
+        server.gate = asyncio.Event()
+        load = asyncio.create_task(app.load_presence())
+        await asyncio.sleep(0)
+        await app.on_presence(join(6, 'c'))
+        server.gate.set()
+        await load
+        return app
+
+    app = asyncio.run(scenario())
+    assert server.snapshots == 2
+    assert (app.presence_seq, set(app.clients)) == (6, {'a', 'b', 'c'})
+
+
+def test_concurrent_loads_read_one_snapshot():
+    server = FakeServer(3, ['a'])
+
+    async def scenario():
+        app = client_app(server)
+        server.gate = asyncio.Event()
+        loads = [asyncio.create_task(app.load_presence()) for _ in range(2)]
+        await asyncio.sleep(0)
+        server.gate.set()
+        await asyncio.gather(*loads)
+        return app
+
+    app = asyncio.run(scenario())
+    assert server.snapshots == 1
+    assert app.presence_seq == 3
+
+
+def test_heartbeat_seq_still_unseen_a_heartbeat_later_resyncs(monkeypatch):
+    monkeypatch.setattr(gui, 'HEARTBEAT_INTERVAL', 0.01)
+    server = FakeServer(2, ['a'])
+
+    async def scenario():
+        app = client_app(server)
+        await app.load_presence()
+        # Frame 3 is lost while presence is otherwise quiet: no later frame reveals a gap
+        server.seq, server.clients = 3, ['a', 'b']
+        heartbeats = asyncio.create_task(app.send_heartbeats())
+        while server.snapshots < 2:
+            await asyncio.sleep(0.01)
+        app.connected = False
+        await heartbeats
+        return app
+
+    app = asyncio.run(scenario())
+    assert (app.presence_seq, set(app.clients)) == (3, {'a', 'b'})
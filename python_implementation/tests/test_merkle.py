@@ -0,0 +1,114 @@
+"""Per-chunk verification of resumable transfers and the Merkle root over it."""
+import hashlib
+import os
+
+import pytest
+
+from conftest import write_random
+
+from socketlab import sender as sender_module
+from socketlab.merkle import DIGEST_SIZE, MAX_CHUNK_SIZE, merkle_root
+from socketlab.protocol import FRAME_META
+from socketlab.receiver import MAX_REPAIR_ROUNDS, ResumableReceive
+from socketlab.sender import RESUMABLE_MIN_SIZE, FileSender, TransferRejected
+
+
+def leaf(data):
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def node(left, right):
+    return hashlib.blake2b(b'\x01' + bytes.fromhex(left) + bytes.fromhex(right), digest_size=DIGEST_SIZE).hexdigest()
+
+
+def test_merkle_root():
+    a, b, c = leaf(b'a'), leaf(b'b'), leaf(b'c')
+    assert merkle_root([a]) == a
+    assert merkle_root([a, b]) == node(a, b)
+    # An odd node is carried up unchanged
+    assert merkle_root([a, b, c]) == node(node(a, b), c)
+    assert merkle_root([]) == leaf(b'')
+    assert merkle_root([b, a]) != merkle_root([a, b])
+
+
+class WrongDigest:
+    def result(self):
+        return '00' * DIGEST_SIZE
+
+
+class CorruptingSender(FileSender):
+    # Sends a wrong digest for chunk 1 in the first ``bad_rounds`` rounds
+    bad_rounds = 1
+
+    def send_chunks(self, client_socket, path, ranges, chunk_size, digests, report_progress, codec=None):
+        if self.bad_rounds:
+            self.bad_rounds -= 1
+            digests = list(digests)
+            digests[1] = WrongDigest()
+        super().send_chunks(client_socket, path, ranges, chunk_size, digests, report_progress, codec)
+
+
+def test_failed_chunk_is_re_requested(receiver, tmp_path):
+    path = tmp_path / 'big.bin'
+    data = write_random(path, 2 * RESUMABLE_MIN_SIZE)
+    logs = []
+
+    ack, = CorruptingSender('127.0.0.1', receiver.port, on_log=logs.append).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert (tmp_path / 'received' / 'big.bin').read_bytes() == data
+    assert any('Chunk 1 of big.bin failed verification' in message for message in receiver.logs)
+    assert any('attempt 1 of' in message for message in receiver.logs)
+    assert any('re-requested' in message for message in logs)
+
+
+def test_repairs_give_up_after_max_rounds(receiver, tmp_path):
+    path = tmp_path / 'big.bin'
+    write_random(path, 2 * RESUMABLE_MIN_SIZE)
+    corrupting = CorruptingSender('127.0.0.1', receiver.port)
+    corrupting.bad_rounds = MAX_REPAIR_ROUNDS + 1
+
+    with pytest.raises(TransferRejected):
+        corrupting.send([str(path)])
+
+    assert not os.path.exists(tmp_path / 'received' / 'big.bin')
+    assert sum('Re-requesting' in message for message in receiver.logs) == MAX_REPAIR_ROUNDS
+
+
+def test_merkle_root_mismatch_discards_the_file(receiver, tmp_path, monkeypatch):
+    path = tmp_path / 'big.bin'
+    write_random(path, RESUMABLE_MIN_SIZE)
+    monkeypatch.setattr(sender_module, 'merkle_root', lambda digests: '11' * DIGEST_SIZE)
+
+    with pytest.raises(TransferRejected):
+        FileSender('127.0.0.1', receiver.port).send([str(path)])
+
+    assert os.listdir(tmp_path / 'received') == []
+    assert any('Merkle root mismatch' in message for message in receiver.logs)
+
+
+@pytest.mark.parametrize('chunk_size', [0, -4096, 1.5, MAX_CHUNK_SIZE * 2, 64])
+def test_bad_chunk_size_gets_a_failed_ack(receiver, tmp_path, monkeypatch, chunk_size):
+    path = tmp_path / 'big.bin'
+    write_random(path, RESUMABLE_MIN_SIZE)
+    send_json_frame = sender_module.send_json_frame
+
+    def claim_chunk_size(sock, frame_type, obj):
+        if frame_type == FRAME_META:
+            obj = dict(obj, chunk_size=chunk_size)
+        send_json_frame(sock, frame_type, obj)
+
+    monkeypatch.setattr(sender_module, 'send_json_frame', claim_chunk_size)
+
+    with pytest.raises(TransferRejected):
+        FileSender('127.0.0.1', receiver.port).send([str(path)])
+
+    # Refused before any partial or manifest is created
+    assert not os.path.exists(tmp_path / 'received') or os.listdir(tmp_path / 'received') == []
+    assert any('Refused big.bin' in message for message in receiver.logs)
+
+
+def test_resumable_receive_checks_its_chunk_size(tmp_path):
+    with pytest.raises(ValueError):
+        ResumableReceive(str(tmp_path), 'big.bin', RESUMABLE_MIN_SIZE, 'f' * 32, 0)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,125 @@
+"""Metrics registry: histogram percentiles, Prometheus output and the endpoints."""
+import json
+import urllib.request
+
+import pytest
+
+from socketlab.metrics import Histogram, MetricsRegistry, TimeSeries, serve_metrics
+from socketlab.stats import TransferStats
+
+
+def test_percentiles_interpolate_within_buckets():
+    histogram = Histogram('latency', buckets=[1, 2, 4, 8])
+    for value in [0.5] * 50 + [3] * 40 + [6] * 10:
+        histogram.observe(value)
+
+    # Half the observations are in the first bucket, so p50 is its upper bound
+    assert histogram.percentile(0.5) == pytest.approx(1)
+    # p70 is halfway through the (2, 4] bucket's 40 observations
+    assert histogram.percentile(0.7) == pytest.approx(3)
+    assert histogram.percentile(0.99) == pytest.approx(6)
+    snapshot = histogram.snapshot()
+    assert (snapshot['count'], snapshot['min'], snapshot['max']) == (100, 0.5, 6)
+    assert snapshot['mean'] == pytest.approx((25 + 120 + 60) / 100)
+
+
+def test_percentiles_beyond_the_last_bucket_and_when_empty():
+    histogram = Histogram('speed', buckets=[1, 2])
+    assert histogram.percentile(0.5) is None
+    for value in [100, 200]:
+        histogram.observe(value)
+    assert histogram.percentile(0.99) == 200
+    # Never outside what was observed
+    assert histogram.percentile(0.01) >= 100
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.counter('files_total', 'Files moved', {'direction': 'sent'}).inc(3)
+    registry.counter('files_total', 'Files moved', {'direction': 'rec"eived'}).inc()
+    registry.gauge('active', 'In progress').set(2)
+    histogram = registry.histogram('seconds', 'Duration', buckets=[0.5, 1])
+    histogram.observe(0.25)
+    histogram.observe(0.75)
+    histogram.observe(5)
+    registry.series('throughput').record(10)
+
+    lines = registry.render().splitlines()
+
+    assert lines[:4] == ['# HELP active In progress', '# TYPE active gauge', 'active 2',
+                         '# HELP files_total Files moved']
+    assert 'files_total{direction="rec\\"eived"} 1' in lines
+    assert 'files_total{direction="sent"} 3' in lines
+    assert '# TYPE seconds histogram' in lines
+    # Buckets are cumulative and end in +Inf
+    assert lines[lines.index('# TYPE seconds histogram') + 1:] == [
+        'seconds_bucket{le="0.5"} 1', 'seconds_bucket{le="1"} 2', 'seconds_bucket{le="+Inf"} 3',
+        'seconds_sum 6', 'seconds_count 3']
+    assert not any(line.startswith('throughput') for line in lines)
+
+
+def test_registry_rejects_a_name_reused_for_another_kind():
+    registry = MetricsRegistry()
+    registry.counter('things')
+    with pytest.raises(ValueError):
+        registry.gauge('things')
+    with pytest.raises(ValueError):
+        registry.counter('other').inc(-1)
+
+
+def test_time_series_fills_empty_intervals():
+    series = TimeSeries('bytes', capacity=5)
+    series.record(10, now=100.2)
+    series.record(5, now=100.7)
+    series.record(1, now=103.1)
+    assert series.snapshot() == [(100, 15), (101, 0), (102, 0), (103, 1)]
+    for second in range(104, 110):
+        series.record(1, now=second)
+    assert len(series.snapshot()) == 5
+
+
+def test_transfer_stats_record_into_the_registry():
+    registry = MetricsRegistry()
+    stats = TransferStats(registry)
+    stats.record_sent(1, 10 * 1024 * 1024, 2.0)
+    stats.record_sent(1, 10 * 1024 * 1024, 0.5)
+
+    families = registry.snapshot()
+
+    sent = {metric['labels']['direction']: metric['value'] for metric in families['socketlab_files_total']}
+    assert sent == {'sent': 2, 'received': 0}
+    speed, = [metric['value'] for metric in families['socketlab_transfer_speed_bytes_per_second']
+              if metric['labels']['direction'] == 'sent']
+    assert speed['count'] == 2 and speed['min'] == 5 * 1024 * 1024
+
+
+def test_serve_metrics():
+    registry = MetricsRegistry()
+    registry.counter('hits').inc(7)
+    server = serve_metrics(0, host='127.0.0.1', registry=registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'hits 7' in response.read().decode('utf-8').splitlines()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_backend_endpoints(backend):
+    testclient = pytest.importorskip('fastapi.testclient')
+    backend.transfer_metrics.record('received', 1, 4096, 0.5)
+    client = testclient.TestClient(backend.app)
+
+    text = client.get('/metrics')
+    snapshot = client.get('/metrics/snapshot')
+
+    assert text.status_code == snapshot.status_code == 200
+    assert 'socketlab_files_total{direction="received",transport="socketio"}' in text.text
+    families = json.loads(snapshot.text)
+    received, = [metric for metric in families['socketlab_bytes_total']
+                 if metric['labels'] == {'direction': 'received', 'transport': 'socketio'}]
+    assert received['value'] >= 4096
@@ -0,0 +1,111 @@
+"""Sequenced presence deltas, paged snapshots and heartbeats."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def presence(backend, monkeypatch):
+    """Broadcast presence frames, in order, instead of sending them."""
+    sent = []
+
+    async def record(event, data=None, to=None, **kwargs):
+        if event == 'presence':
+            sent.append(data)
+
+    monkeypatch.setattr(backend.sio, 'emit', record)
+    return sent
+
+
+async def connect(backend, name):
+    sid = await backend.sio.manager.connect(f'eio-{name}', '/')
+    await backend.connect(sid, {})
+    return sid
+
+
+async def disconnect(backend, *sids):
+    for sid in sids:
+        await backend.disconnect(sid)
+        await backend.sio.manager.disconnect(sid, '/')
+
+
+def test_changes_in_one_tick_share_one_frame(backend, presence):
+    async def scenario():
+        first = await connect(backend, 'tick-1')
+        second = await connect(backend, 'tick-2')
+        await backend.register(second, {'user_id': 'someone', 'name': 'Someone'})
+        await backend.flush_presence()
+        await disconnect(backend, first)
+        await backend.flush_presence()
+        await disconnect(backend, second)
+        await backend.flush_presence()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    joined, left, _ = presence
+    assert left['seq'] == joined['seq'] + 1
+    # A join followed by an update goes out as one join with the latest state
+    assert [change['op'] for change in joined['changes']] == ['join', 'join']
+    assert {change['client']['name'] for change in joined['changes']} == {first, 'Someone'}
+    assert left['changes'] == [{'op': 'leave', 'client_id': first}]
+
+
+def test_client_that_comes_and_goes_within_a_tick_is_never_announced(backend, presence):
+    async def scenario():
+        await disconnect(backend, await connect(backend, 'brief'))
+        await backend.flush_presence()
+
+    asyncio.run(scenario())
+    assert presence == []
+
+
+def test_connection_storm_sends_a_resync_notice(backend, presence, monkeypatch):
+    monkeypatch.setattr(backend, 'MAX_PRESENCE_CHANGES', 2)
+
+    async def scenario():
+        sids = [await connect(backend, f'storm-{number}') for number in range(3)]
+        await backend.flush_presence()
+        await disconnect(backend, *sids)
+
+    asyncio.run(scenario())
+    assert presence[0]['resync'] is True
+    assert presence[0]['total'] == 3
+    assert 'changes' not in presence[0]
+
+
+def test_snapshot_pages_resume_after_the_cursor(backend, presence):
+    async def scenario():
+        sids = [await connect(backend, f'page-{number}') for number in range(5)]
+        pages = [backend.presence_page(limit=2)]
+        while pages[-1]['next_cursor']:
+            pages.append(backend.presence_page(pages[-1]['next_cursor'], limit=2))
+        await disconnect(backend, *sids)
+        return sids, pages
+
+    sids, pages = asyncio.run(scenario())
+    assert [len(page['clients']) for page in pages] == [2, 2, 1]
+    assert [client['client_id'] for page in pages for client in page['clients']] == sorted(sids)
+    assert pages[0]['total'] == 5
+
+
+def test_silent_clients_go_offline_until_they_heartbeat(backend, presence, monkeypatch):
+    monkeypatch.setattr(backend, 'HEARTBEAT_INTERVAL', 0.01)
+
+    async def scenario():
+        sid = await connect(backend, 'silent')
+        await backend.flush_presence()
+        backend.clients[sid].last_seen = datetime.now() - timedelta(seconds=backend.HEARTBEAT_TIMEOUT + 1)
+        await asyncio.sleep(0.05)
+        offline = backend.clients[sid].is_online
+        await backend.flush_presence()
+        reply = await backend.heartbeat(sid)
+        online = backend.clients[sid].is_online
+        await backend.flush_presence()
+        await disconnect(backend, sid)
+        return sid, offline, online, reply
+
+    sid, offline, online, reply = asyncio.run(scenario())
+    assert (offline, online) == (False, True)
+    assert reply == {'status': 'ok', 'seq': presence[1]['seq']}
+    assert [frame['changes'][0]['client']['is_online'] for frame in presence[1:3]] == [False, True]
@@ -0,0 +1,83 @@
+"""Link probe: the recommendation, buffer sizing, the cache and a real probe."""
+import time
+
+import pytest
+
+from socketlab.probe import (MAX_SOCKET_BUFFER, MIN_SOCKET_BUFFER, LinkProbe, ProbeCache, recommended_profile,
+                             socket_buffer_for)
+
+KB = 1024
+MB = 1024 * 1024
+
+
+class FakeProbe(LinkProbe):
+    # Measurements from a table instead of the network
+    def __init__(self, upload_bps, rtt=0.01, download_bps=50 * MB):
+        super().__init__('10.0.0.9', 8888)
+        self.upload_bps = upload_bps
+        self.rtt = rtt
+        self.download_bps = download_bps
+
+    def measure_rtt(self, samples=0):
+        return {'samples': 1, 'min': self.rtt, 'median': self.rtt, 'p90': self.rtt, 'max': self.rtt, 'jitter': 0.0}
+
+    def throughput(self, direction, chunk_size, streams=1):
+        if direction == 'upload':
+            return self.upload_bps[chunk_size, streams]
+        return self.download_bps
+
+
+def test_recommends_the_cheapest_setting_close_to_the_best():
+    upload_bps = {
+        (64 * KB, 1): 40 * MB, (256 * KB, 1): 97 * MB, (1 * MB, 1): 100 * MB, (4 * MB, 1): 99 * MB,
+        # A second stream barely helps, four do
+        (256 * KB, 2): 101 * MB, (256 * KB, 4): 180 * MB,
+    }
+
+    result = FakeProbe(upload_bps).run()
+
+    recommended = result['recommended']
+    assert recommended['chunk_size'] == 256 * KB
+    assert recommended['streams'] == 4
+    assert result['bdp'] == pytest.approx(180 * MB * 0.01)
+    assert recommended['sndbuf'] == recommended['rcvbuf'] == 4 * MB
+    profile = recommended_profile(result)
+    assert (profile.chunk_size, profile.sndbuf) == (256 * KB, 4 * MB)
+
+
+def test_one_stream_when_more_do_not_help():
+    upload_bps = {(size, 1): 100 * MB for size in (64 * KB, 256 * KB, MB, 4 * MB)}
+    upload_bps.update({(64 * KB, 2): 100 * MB, (64 * KB, 4): 102 * MB})
+
+    recommended = FakeProbe(upload_bps).run()['recommended']
+
+    assert (recommended['chunk_size'], recommended['streams']) == (64 * KB, 1)
+
+
+def test_socket_buffer_is_twice_the_bdp_within_bounds():
+    assert socket_buffer_for(0) == MIN_SOCKET_BUFFER
+    assert socket_buffer_for(300 * KB) == MB
+    assert socket_buffer_for(1024 * MB) == MAX_SOCKET_BUFFER
+
+
+def test_probe_cache(tmp_path):
+    cache = ProbeCache(str(tmp_path / 'probes.json'), max_age=60)
+    result = {'host': '10.0.0.9', 'port': 8888, 'measured_at': time.time(), 'recommended': {}}
+    cache.put(result)
+
+    assert cache.get('10.0.0.9', 8888) == result
+    assert cache.get('10.0.0.9', 9999) is None
+    cache.put({**result, 'measured_at': time.time() - 120})
+    assert cache.get('10.0.0.9', 8888) is None
+
+
+def test_probe_against_a_receiver(receiver):
+    probe = LinkProbe('127.0.0.1', receiver.port, seconds=0.05, chunk_sizes=[64 * KB, 256 * KB],
+                      stream_counts=[1, 2])
+
+    result = probe.run()
+
+    assert result['rtt']['samples'] == 20
+    assert all(test['bps'] > 0 for test in result['upload'])
+    assert result['download'] > 0 and result['bidirectional'] > 0
+    assert result['recommended']['chunk_size'] in (64 * KB, 256 * KB)
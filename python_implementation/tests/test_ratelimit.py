@@ -0,0 +1,121 @@
+"""Token buckets and the weighted max-min fair split of the limits."""
+import socket
+import threading
+import time
+
+import pytest
+
+from socketlab.ratelimit import RateLimiter, ThrottledSocket, fair_share, parse_rate
+
+MB = 1024 * 1024
+
+
+@pytest.mark.parametrize('text, rate', [('10M', 10 * MB), ('512k', 512 * 1024), ('1.5MB/s', 1.5 * MB),
+                                        ('2048', 2048), ('off', None), ('0', None), ('', None)])
+def test_parse_rate(text, rate):
+    assert parse_rate(text) == rate
+
+
+def test_fair_share_splits_by_weight():
+    shares = fair_share(90, {'a': (None, 8), 'b': (None, 1)})
+    assert shares == pytest.approx({'a': 80, 'b': 10})
+
+
+def test_fair_share_gives_what_a_capped_demand_leaves_to_the_others():
+    shares = fair_share(100, {'capped': (10, 1), 'b': (None, 1), 'c': (None, 1)})
+    assert shares == pytest.approx({'capped': 10, 'b': 45, 'c': 45})
+
+
+def test_fair_share_without_a_budget_keeps_the_caps():
+    assert fair_share(None, {'a': (5, 1), 'b': (None, 1)}) == {'a': 5, 'b': None}
+
+
+def test_rebalance_applies_peer_then_global_limits():
+    limiter = RateLimiter(global_rate=30 * MB, peer_rate=10 * MB)
+    first = limiter.register('10.0.0.1')
+    second = limiter.register('10.0.0.1')
+    other = limiter.register('10.0.0.2', priority='interactive')
+
+    assert first.bucket.rate == second.bucket.rate == pytest.approx(5 * MB)
+    assert other.bucket.rate == pytest.approx(10 * MB)
+
+    first.close()
+    assert second.bucket.rate == pytest.approx(10 * MB)
+    limiter.set_global_rate(4 * MB)
+    # Both peers want 10 MB/s; the interactive transfer gets 8 parts of 9
+    assert other.bucket.rate == pytest.approx(4 * MB * 8 / 9)
+    assert second.bucket.rate == pytest.approx(4 * MB / 9)
+
+
+def test_transfer_rate_caps_each_transfer():
+    limiter = RateLimiter(transfer_rate=MB)
+    throttle = limiter.register('peer')
+    assert throttle.bucket.rate == MB
+    throttle.set_rate(2 * MB)
+    assert throttle.bucket.rate == 2 * MB
+    limiter.set_transfer_rate(None)
+    throttle.set_rate(None)
+    assert not throttle.limited
+
+
+def one_second_later(limiter):
+    # As if a second of traffic had gone by since the last measurement
+    limiter.rebalanced_at -= 1
+    for throttle in limiter.throttles:
+        throttle.measured_at -= 1
+
+
+def test_share_follows_measured_draw():
+    limiter = RateLimiter(global_rate=10 * MB)
+    busy = limiter.register('10.0.0.1')
+    stalled = limiter.register('10.0.0.2')
+    assert busy.bucket.rate == stalled.bucket.rate == pytest.approx(5 * MB)
+
+    busy.bucket.reserve(5 * MB)
+    stalled.bucket.reserve(MB // 2)
+    one_second_later(limiter)
+    limiter.rebalance()
+    # The stalled transfer keeps twice what it drew; the rest goes to the busy one
+    assert stalled.bucket.rate == pytest.approx(MB, rel=0.01)
+    assert busy.bucket.rate == pytest.approx(9 * MB, rel=0.01)
+
+    # Using all of its cap lifts it again at the next interval
+    busy.bucket.reserve(9 * MB)
+    stalled.bucket.reserve(MB)
+    limiter.maybe_rebalance()
+    assert stalled.bucket.rate == pytest.approx(MB, rel=0.01)
+    one_second_later(limiter)
+    limiter.maybe_rebalance()
+    assert busy.bucket.rate == stalled.bucket.rate == pytest.approx(5 * MB)
+
+
+def test_draw_does_not_cap_a_transfer_without_a_shared_budget():
+    limiter = RateLimiter(transfer_rate=MB)
+    throttle = limiter.register('peer')
+    one_second_later(limiter)
+    limiter.rebalance()
+    assert throttle.bucket.rate == MB
+
+
+def test_throttled_socket_keeps_to_its_rate():
+    limiter = RateLimiter(global_rate=2 * MB)
+    left, right = socket.socketpair()
+    received = bytearray()
+
+    def drain():
+        while chunk := right.recv(65536):
+            received.extend(chunk)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    with limiter.register('peer') as throttle:
+        started = time.monotonic()
+        ThrottledSocket(left, throttle).sendall(bytes(MB))
+        elapsed = time.monotonic() - started
+    left.close()
+    reader.join()
+    right.close()
+
+    assert len(received) == MB
+    # One second of budget minus the bucket's burst allowance
+    assert 0.35 < elapsed < 1.5
@@ -0,0 +1,105 @@
+"""Per-transfer and per-user rooms, and the coalescing transfer_update tick."""
+import asyncio
+import hashlib
+
+import pytest
+
+
+@pytest.fixture
+def frames(backend, monkeypatch):
+    """transfer_update frames by recipient sid, instead of sending them."""
+    sent = {}
+    emit = backend.sio.emit
+
+    async def record(event, data=None, to=None, **kwargs):
+        if event == 'transfer_update':
+            sent.setdefault(to, []).append(data)
+        else:
+            await emit(event, data, to=to, **kwargs)
+
+    monkeypatch.setattr(backend.sio, 'emit', record)
+    monkeypatch.setattr(backend, 'UPDATE_TICK', 0.05)
+    return sent
+
+
+async def connect(backend, user_id):
+    # Rooms only take connections the Socket.IO manager knows of
+    sid = await backend.sio.manager.connect(f'eio-{user_id}-{len(backend.clients)}', '/')
+    await backend.connect(sid, {})
+    await backend.register(sid, {'user_id': user_id})
+    return sid
+
+
+async def disconnect(backend, *sids):
+    for sid in sids:
+        await backend.disconnect(sid)
+        await backend.sio.manager.disconnect(sid, '/')
+
+
+async def settle(backend):
+    while backend.update_ticker is not None and not backend.update_ticker.done():
+        await asyncio.sleep(0.01)
+
+
+def test_chunks_reach_every_connection_of_the_owner_in_few_frames(backend, frames):
+    data = bytes(400)
+
+    async def scenario():
+        alice = [await connect(backend, 'alice'), await connect(backend, 'alice')]
+        bob = await connect(backend, 'bob')
+        await backend.start_transfer(alice[0], {'transfer_id': 'batched', 'file_name': 'f.bin',
+                                                 'size': len(data), 'chunk_size': 10})
+        for index in range(40):
+            await backend.chunk_upload(alice[0], {'transfer_id': 'batched', 'index': index,
+                                                   'data': data[index * 10:index * 10 + 10]})
+        await backend.finish_transfer(alice[0], {'transfer_id': 'batched',
+                                                  'checksum': hashlib.sha256(data).hexdigest()})
+        await settle(backend)
+        await disconnect(backend, *alice, bob)
+        return alice, bob
+
+    alice, bob = asyncio.run(scenario())
+    for sid in alice:
+        assert 1 <= len(frames[sid]) < 40
+        assert frames[sid][-1]['transfers'][-1]['status'] == 'completed'
+    assert bob not in frames
+
+
+def test_one_frame_per_client_batches_every_changed_transfer(backend, frames):
+    async def scenario():
+        carol = await connect(backend, 'carol')
+        for transfer_id in ('batch-a', 'batch-b'):
+            await backend.start_transfer(carol, {'transfer_id': transfer_id, 'file_name': 'f.bin',
+                                                     'size': 20, 'chunk_size': 10})
+        await backend.flush_updates()
+        for transfer_id in ('batch-a', 'batch-b'):
+            await backend.fail_upload(backend.uploads[transfer_id], 'test over')
+        await settle(backend)
+        await disconnect(backend, carol)
+        return carol
+
+    carol = asyncio.run(scenario())
+    assert len(frames[carol][0]['transfers']) == 2
+    assert {transfer['status'] for transfer in frames[carol][-1]['transfers']} == {'failed'}
+
+
+def test_subscribers_follow_other_transfers_until_they_unsubscribe(backend, frames):
+    async def scenario():
+        dave = await connect(backend, 'dave')
+        erin = await connect(backend, 'erin')
+        await backend.start_transfer(dave, {'transfer_id': 'watched', 'file_name': 'f.bin',
+                                                'size': 20, 'chunk_size': 10})
+        current = await backend.subscribe(erin, {'transfer_ids': ['watched']})
+        await backend.chunk_upload(dave, {'transfer_id': 'watched', 'index': 0, 'data': bytes(10)})
+        await settle(backend)
+        followed = len(frames.get(erin, []))
+        await backend.unsubscribe(erin, {'transfer_ids': ['watched']})
+        await backend.chunk_upload(dave, {'transfer_id': 'watched', 'index': 1, 'data': bytes(10)})
+        await settle(backend)
+        await disconnect(backend, dave, erin)
+        return current, followed, len(frames[erin])
+
+    current, followed, total = asyncio.run(scenario())
+    assert current['transfers'][0]['transfer_id'] == 'watched'
+    assert followed == 1
+    assert total == 1
@@ -0,0 +1,80 @@
+"""TCP-connect scanning: host states, the result cache and concurrency."""
+import asyncio
+import socket
+import time
+
+import pytest
+
+from socketlab.scanner import NetworkScanner, hosts_in
+
+
+@pytest.fixture
+def listener():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def silent_hosts(monkeypatch):
+    # Connects that never complete, like hosts that drop SYNs
+    async def hang(self, sock, address):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(asyncio.selector_events.BaseSelectorEventLoop, 'sock_connect', hang)
+
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_hosts_in():
+    assert hosts_in('192.168.1.0/30') == ['192.168.1.1', '192.168.1.2']
+    assert hosts_in('192.168.1.7/30', exclude=['192.168.1.5']) == ['192.168.1.6']
+
+
+def test_open_and_closed(listener):
+    assert NetworkScanner(listener).scan(['127.0.0.1'])[0]['status'] == 'open'
+    assert NetworkScanner(closed_port()).scan(['127.0.0.1'])[0]['status'] == 'closed'
+
+
+def test_silent_host_is_down(silent_hosts):
+    result, = NetworkScanner(9, timeout=0.2).scan(['192.0.2.1'])
+    assert result['status'] == 'down' and result['rtt'] is None
+
+
+def test_results_are_cached(listener):
+    scanner = NetworkScanner(listener)
+    first, = scanner.scan(['127.0.0.1'])
+    second, = scanner.scan(['127.0.0.1'])
+    assert not first['cached'] and second['cached']
+    assert second['status'] == 'open'
+
+    scanner.clear_cache()
+    assert not scanner.scan(['127.0.0.1'])[0]['cached']
+
+
+def test_expired_results_are_probed_again(listener):
+    scanner = NetworkScanner(listener, cache_ttl=0)
+    scanner.scan(['127.0.0.1'])
+    assert not scanner.scan(['127.0.0.1'])[0]['cached']
+
+
+def test_hosts_are_probed_concurrently(silent_hosts):
+    hosts = [f"192.0.2.{index}" for index in range(1, 41)]
+    reported = []
+    started = time.monotonic()
+
+    results = NetworkScanner(9, timeout=0.3).scan(hosts, on_result=reported.append)
+
+    # One round of timeouts, not forty
+    assert time.monotonic() - started < 3
+    assert sorted(result['host'] for result in results) == sorted(hosts)
+    assert len(reported) == len(hosts)
+    assert {result['status'] for result in results} == {'down'}
@@ -0,0 +1,252 @@
+"""Round trips of every TCP transfer mode over a loopback socket."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import read, write_random
+
+from socketlab import sender as sender_module
+from socketlab.chunkstore import ChunkStore
+from socketlab.delta import SKIP_BLOCKS, block_size_for
+from socketlab.sender import RESUMABLE_MIN_SIZE, FileSender, TransferRejected
+from socketlab.stats import TransferStats
+
+MB = 1024 * 1024
+
+
+def received(receiver, name):
+    return read(os.path.join(receiver.output_dir, name))
+
+
+def log_lines(count):
+    return b''.join(b'%08d GET /index.html 200\n' % line for line in range(count))
+
+
+def test_pipelined_files(receiver, tmp_path):
+    paths = []
+    for index, size in enumerate([0, 1, 64 * 1024, 3 * MB + 17]):
+        path = tmp_path / f"file{index}.bin"
+        write_random(path, size, seed=index)
+        paths.append(str(path))
+
+    acks = FileSender('127.0.0.1', receiver.port).send(paths)
+
+    assert [ack['status'] for ack in acks] == ['received'] * len(paths)
+    for path in paths:
+        assert received(receiver, os.path.basename(path)) == read(path)
+
+
+def test_pipelined_compressed(receiver, tmp_path):
+    path = tmp_path / 'log.txt'
+    path.write_bytes(log_lines(100000))
+
+    ack, = FileSender('127.0.0.1', receiver.port, compression='zlib').send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert ack['wire_bytes'] < path.stat().st_size // 4
+    assert received(receiver, 'log.txt') == path.read_bytes()
+
+
+def test_auto_compression_sends_random_data_raw(receiver, tmp_path):
+    path = tmp_path / 'random.bin'
+    data = write_random(path, MB)
+    text = tmp_path / 'log.txt'
+    text.write_bytes(log_lines(50000))
+
+    raw, packed = FileSender('127.0.0.1', receiver.port, compression='auto').send([str(path), str(text)])
+
+    assert raw['wire_bytes'] == len(data)
+    assert packed['wire_bytes'] < text.stat().st_size // 4
+    assert received(receiver, 'random.bin') == data
+    assert received(receiver, 'log.txt') == text.read_bytes()
+
+
+def test_resumable_compressed(receiver, tmp_path):
+    path = tmp_path / 'big.log'
+    path.write_bytes(log_lines(400000))
+    assert path.stat().st_size >= RESUMABLE_MIN_SIZE
+    stats = TransferStats()
+
+    ack, = FileSender('127.0.0.1', receiver.port, compression='zlib', stats=stats).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert received(receiver, 'big.log') == path.read_bytes()
+    assert any('zlib compressed' in message for message in receiver.logs)
+    assert stats.wire_bytes < path.stat().st_size // 4
+
+
+def test_parallel_streams_compressed(receiver, tmp_path):
+    path = tmp_path / 'big.log'
+    path.write_bytes(log_lines(400000))
+    stats = TransferStats()
+
+    ack, = FileSender('127.0.0.1', receiver.port, streams=3, compression='zlib', stats=stats).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert received(receiver, 'big.log') == path.read_bytes()
+    assert stats.wire_bytes < path.stat().st_size // 4
+
+
+def test_parallel_streams(receiver, tmp_path):
+    path = tmp_path / 'big.bin'
+    data = write_random(path, 9 * MB + 5)
+
+    ack, = FileSender('127.0.0.1', receiver.port, streams=3).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert received(receiver, 'big.bin') == data
+    assert not receiver.parallel_receives
+
+
+def test_parallel_combined_checksum_mismatch_is_rejected(receiver, tmp_path, monkeypatch):
+    path = tmp_path / 'big.bin'
+    write_random(path, 9 * MB)
+    logs = []
+    monkeypatch.setattr(sender_module, 'combine_digests', lambda digests: '0' * 32)
+
+    with pytest.raises(TransferRejected):
+        FileSender('127.0.0.1', receiver.port, streams=3, on_log=logs.append).send([str(path)])
+
+    assert any('Combined checksum mismatch' in message for message in logs)
+
+
+def test_parallel_range_that_never_arrives(start_receiver, tmp_path):
+    receiver = start_receiver(idle_timeout=1)
+    path = tmp_path / 'big.bin'
+    write_random(path, 2 * MB)
+    sender = FileSender('127.0.0.1', receiver.port)
+
+    # Only the first of two ranges is ever sent
+    with ThreadPoolExecutor(max_workers=1) as hash_pool:
+        ack = sender.send_file_range(str(path), 'abc123', 0, MB, 2, hash_pool, lambda *args: None)
+    assert ack['status'] == 'received'
+    assert 'abc123' in receiver.parallel_receives
+
+    deadline = time.time() + 5
+    while receiver.parallel_receives and time.time() < deadline:
+        time.sleep(0.1)
+    assert not receiver.parallel_receives
+    assert os.listdir(receiver.output_dir) == []
+    assert any('ranges never arrived' in message for message in receiver.logs)
+
+
+def test_resumable(receiver, tmp_path):
+    path = tmp_path / 'big.bin'
+    data = write_random(path, RESUMABLE_MIN_SIZE + 123)
+
+    ack, = FileSender('127.0.0.1', receiver.port).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert ack['merkle_root']
+    assert received(receiver, 'big.bin') == data
+    assert not [name for name in os.listdir(receiver.output_dir) if name.endswith('.part')]
+
+
+class DroppingSender(FileSender):
+    # Loses the connection once, after two whole chunks
+    drops = 1
+
+    def send_chunks(self, client_socket, path, ranges, chunk_size, digests, report_progress, codec=None):
+        if self.drops:
+            self.drops -= 1
+            start = ranges[0][0]
+            super().send_chunks(client_socket, path, [[start, start + 2 * chunk_size]], chunk_size, digests,
+                                report_progress, codec)
+            raise ConnectionResetError("simulated connection loss")
+        super().send_chunks(client_socket, path, ranges, chunk_size, digests, report_progress, codec)
+
+
+def test_resumable_after_interruption(receiver, tmp_path):
+    path = tmp_path / 'big.bin'
+    data = write_random(path, 4 * RESUMABLE_MIN_SIZE + 99)
+    logs = []
+
+    ack, = DroppingSender('127.0.0.1', receiver.port, on_log=logs.append).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert received(receiver, 'big.bin') == data
+    assert any('Connection lost' in message for message in logs)
+    # The second connection only asked for what the first one had not delivered
+    assert any(message.startswith('🔁 Resuming big.bin') for message in receiver.logs)
+    assert [name for name in os.listdir(receiver.output_dir) if name.startswith('.')] == []
+
+
+def test_resumable_compressed_after_interruption(receiver, tmp_path):
+    path = tmp_path / 'big.log'
+    path.write_bytes(log_lines(1600000))
+
+    ack, = DroppingSender('127.0.0.1', receiver.port, compression='zlib').send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert received(receiver, 'big.log') == path.read_bytes()
+    assert any(message.startswith('🔁 Resuming big.log') for message in receiver.logs)
+
+
+def test_delta(receiver, tmp_path):
+    old = write_random(tmp_path / 'old.bin', 4 * MB, seed=1)
+    os.makedirs(receiver.output_dir)
+    with open(os.path.join(receiver.output_dir, 'doc.bin'), 'wb') as f:
+        f.write(old)
+    new = old[:MB] + b'inserted' + old[MB:3 * MB] + old[3 * MB + 4096:]
+    path = tmp_path / 'doc.bin'
+    path.write_bytes(new)
+
+    ack, = FileSender('127.0.0.1', receiver.port, delta=True).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert received(receiver, 'doc.bin') == new
+    # One block around each edit goes out in full, the rest is copied
+    assert ack['wire_bytes'] < 64 * 1024
+
+
+def test_delta_after_large_unaligned_insertion(receiver, tmp_path):
+    old = write_random(tmp_path / 'old.bin', 20 * 1000 * 1000, seed=1)
+    os.makedirs(receiver.output_dir)
+    with open(os.path.join(receiver.output_dir, 'doc.bin'), 'wb') as f:
+        f.write(old)
+    # Far longer than the byte-by-byte search budget, and leaves the old blocks unaligned
+    inserted = write_random(tmp_path / 'insert.bin', 2000001, seed=4)
+    new = old[:1000 * 1000] + inserted + old[1000 * 1000:]
+    path = tmp_path / 'doc.bin'
+    path.write_bytes(new)
+    block_size = block_size_for(len(old))
+
+    ack, = FileSender('127.0.0.1', receiver.port, delta=True).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert received(receiver, 'doc.bin') == new
+    # The insertion, the block it split, the unsigned tail and at most SKIP_BLOCKS + 1 blocks to re-sync
+    literal_limit = len(inserted) + (SKIP_BLOCKS + 2) * block_size + len(old) % block_size
+    assert ack['wire_bytes'] < literal_limit + 4096
+
+
+def test_delta_without_existing_copy(receiver, tmp_path):
+    path = tmp_path / 'doc.bin'
+    data = write_random(path, MB + 3)
+
+    ack, = FileSender('127.0.0.1', receiver.port, delta=True).send([str(path)])
+
+    assert ack['status'] == 'received'
+    assert received(receiver, 'doc.bin') == data
+
+
+def test_dedup(start_receiver, tmp_path):
+    store = ChunkStore(str(tmp_path / 'store'))
+    receiver = start_receiver(chunk_store=store)
+    first = write_random(tmp_path / 'first.bin', 6 * MB, seed=2)
+    (tmp_path / 'a.bin').write_bytes(first)
+    # Same chunks plus a new tail, and one chunk repeated within the file
+    second = first + first[:MB] + write_random(tmp_path / 'tail.bin', MB, seed=3)
+    (tmp_path / 'b.bin').write_bytes(second)
+
+    sender = FileSender('127.0.0.1', receiver.port, dedup=True)
+    ack_a, = sender.send([str(tmp_path / 'a.bin')])
+    ack_b, = sender.send([str(tmp_path / 'b.bin')])
+
+    assert ack_a['status'] == ack_b['status'] == 'received'
+    assert ack_a['wire_bytes'] == len(first)
+    assert ack_b['wire_bytes'] == MB
+    assert received(receiver, 'a.bin') == first
+    assert received(receiver, 'b.bin') == second
@@ -0,0 +1,317 @@
+"""Socket.IO chunks and streamed HTTP ranges into the backend's UploadSession."""
+import asyncio
+import hashlib
+import os
+import random
+
+import pytest
+
+
+def chunks_of(data, chunk_size):
+    return [data[offset:offset + chunk_size] for offset in range(0, len(data), chunk_size)]
+
+
+def start(backend, transfer_id, data, chunk_size=10):
+    return backend.start_transfer('sid', {'transfer_id': transfer_id, 'file_name': 'file.bin',
+                                          'size': len(data), 'chunk_size': chunk_size})
+
+
+def upload(backend, transfer_id, index, payload):
+    return backend.chunk_upload('sid', {'transfer_id': transfer_id, 'index': index, 'data': payload})
+
+
+def finish(backend, transfer_id, data):
+    return backend.finish_transfer('sid', {'transfer_id': transfer_id,
+                                           'checksum': hashlib.sha256(data).hexdigest()})
+
+
+def test_chunks_arrive_in_any_order(backend):
+    data = random.Random(1).randbytes(95)
+    chunks = chunks_of(data, 10)
+
+    async def scenario():
+        started = await start(backend, 'any-order', data)
+        assert started['status'] == 'ok' and started['missing'] == list(range(10))
+        for index in reversed(range(len(chunks))):
+            assert (await upload(backend, 'any-order', index, chunks[index]))['status'] == 'ok'
+        result = await finish(backend, 'any-order', data)
+        # A retried finish after a lost acknowledgement
+        retried = await finish(backend, 'any-order', data)
+        assert (retried['status'], retried['path']) == ('completed', result['path'])
+        return result
+
+    result = asyncio.run(scenario())
+    assert result['status'] == 'completed'
+    with open(result['path'], 'rb') as f:
+        assert f.read() == data
+
+
+def test_duplicate_chunk_is_acknowledged_once(backend):
+    data = random.Random(2).randbytes(30)
+
+    async def scenario():
+        await start(backend, 'duplicate', data)
+        assert (await upload(backend, 'duplicate', 0, data[:10]))['received'] == 1
+        assert (await upload(backend, 'duplicate', 0, data[:10]))['duplicate']
+        assert backend.uploads['duplicate'].bytes_received == 10
+        # A retried start reports what is still missing
+        assert (await start(backend, 'duplicate', data))['missing'] == [1, 2]
+        await backend.fail_upload(backend.uploads['duplicate'], 'test over')
+
+    asyncio.run(scenario())
+
+
+def test_credit_shrinks_as_uploads_multiply(backend):
+    chunk_size = 1024 * 1024
+
+    async def scenario():
+        alone = (await start(backend, 'credit-1', bytes(10), chunk_size))['credit']
+        shared = (await start(backend, 'credit-2', bytes(10), chunk_size))['credit']
+        for transfer_id in ('credit-1', 'credit-2'):
+            await backend.fail_upload(backend.uploads[transfer_id], 'test over')
+        return alone, shared
+
+    alone, shared = asyncio.run(scenario())
+    assert alone == min(backend.MAX_CREDIT, backend.INFLIGHT_BUDGET // chunk_size)
+    assert shared == backend.INFLIGHT_BUDGET // 2 // chunk_size
+
+
+def test_finish_reports_missing_chunks(backend):
+    data = random.Random(3).randbytes(40)
+    chunks = chunks_of(data, 10)
+
+    async def scenario():
+        await start(backend, 'missing', data)
+        await upload(backend, 'missing', 0, chunks[0])
+        await upload(backend, 'missing', 2, chunks[2])
+        assert (await finish(backend, 'missing', data))['missing'] == [1, 3]
+        await upload(backend, 'missing', 1, chunks[1])
+        await upload(backend, 'missing', 3, chunks[3])
+        assert (await finish(backend, 'missing', data))['status'] == 'completed'
+
+    asyncio.run(scenario())
+
+
+def test_checksum_mismatch_fails_the_upload(backend):
+    data = random.Random(4).randbytes(20)
+
+    async def scenario():
+        await start(backend, 'mismatch', data)
+        for index, chunk in enumerate(chunks_of(data, 10)):
+            await upload(backend, 'mismatch', index, chunk)
+        part_path = backend.uploads['mismatch'].part_path
+        return part_path, await finish(backend, 'mismatch', b'something else')
+
+    part_path, result = asyncio.run(scenario())
+    assert result['status'] == 'failed'
+    assert result['checksum'] == hashlib.sha256(data).hexdigest()
+    assert backend.active_transfers['mismatch']['status'] == 'failed'
+    assert not os.path.exists(part_path)
+
+
+def test_malformed_requests_are_rejected(backend):
+    data = bytes(25)
+
+    async def scenario():
+        assert (await start(backend, '../escape', data))['status'] == 'error'
+        assert (await start(backend, 'big', data, chunk_size=backend.MAX_CHUNK_SIZE + 1))['status'] == 'error'
+        await start(backend, 'malformed', data)
+        assert (await upload(backend, 'malformed', 3, bytes(10)))['error'] == 'chunk index out of range'
+        # The last chunk is short, and must be exactly that short
+        assert (await upload(backend, 'malformed', 2, bytes(10)))['status'] == 'error'
+        assert (await upload(backend, 'malformed', 2, bytes(5)))['status'] == 'ok'
+        assert (await upload(backend, 'unknown', 0, bytes(10)))['error'] == 'unknown transfer'
+        await backend.fail_upload(backend.uploads['malformed'], 'test over')
+
+    asyncio.run(scenario())
+
+
+def session(backend, size=100, chunk_size=10):
+    return backend.UploadSession('t1', None, 'file.bin', size, chunk_size)
+
+
+def test_ranges_merge_when_they_overlap_or_touch(backend):
+    upload = session(backend)
+    upload.mark(20, 30)
+    upload.mark(50, 60)
+    upload.mark(30, 40)
+    assert upload.ranges == [[20, 40], [50, 60]]
+    upload.mark(35, 55)
+    assert upload.ranges == [[20, 60]]
+    upload.mark(0, 10)
+    assert upload.ranges == [[0, 10], [20, 60]]
+    assert upload.bytes_received == 50
+
+
+def test_duplicate_ranges_count_once(backend):
+    upload = session(backend)
+    upload.mark(10, 20)
+    upload.mark(10, 20)
+    upload.mark(12, 18)
+    assert upload.ranges == [[10, 20]]
+    assert upload.bytes_received == 10
+
+
+def test_covers(backend):
+    upload = session(backend)
+    upload.mark(10, 30)
+    assert upload.covers(10, 30)
+    assert upload.covers(15, 20)
+    assert not upload.covers(5, 15)
+    assert not upload.covers(25, 35)
+
+
+def test_missing_ranges_and_chunks(backend):
+    upload = session(backend, size=95)
+    assert upload.missing_ranges() == [[0, 95]]
+    upload.mark(0, 10)
+    upload.mark(25, 50)
+    upload.mark(90, 95)
+    assert upload.missing_ranges() == [[10, 25], [50, 90]]
+    # Chunk 2 is only partly received, so it is still missing
+    assert upload.missing() == [1, 2, 5, 6, 7, 8]
+    upload.mark(0, 95)
+    assert upload.missing_ranges() == []
+    assert upload.missing() == []
+
+
+def test_chunks_received_counts_whole_chunks(backend):
+    upload = session(backend, size=95)
+    upload.mark(5, 30)
+    assert upload.chunks_received == 2
+    upload.mark(5, 30)
+    assert upload.chunks_received == 2
+    # The short last chunk is whole once the range reaches the end of the file
+    upload.mark(88, 95)
+    assert upload.chunks_received == 3
+    upload.mark(0, 95)
+    assert upload.chunks_received == 10
+
+
+@pytest.mark.parametrize('header', ['bytes 0-10/5', 'bytes 5-2/10', 'bytes 0-4/11', 'items 0-4/10'])
+def test_bad_content_range_is_rejected(backend, header):
+    with pytest.raises(ValueError):
+        backend.parse_content_range(header, 10)
+
+
+def test_content_range_is_end_inclusive(backend):
+    assert backend.parse_content_range('bytes 0-9/10', 10) == (0, 10)
+    assert backend.parse_content_range('bytes 4-6/*', 10) == (4, 7)
+
+
+def put_request(backend, start, end, size, body):
+    # A PUT whose body arrives only once ``body`` (a queue of byte strings) is fed
+    async def receive():
+        piece = await body.get()
+        return {"type": "http.request", "body": piece or b"", "more_body": piece is not None}
+
+    scope = {"type": "http", "method": "PUT", "path": "/", "query_string": b"",
+             "headers": [(b"content-range", f"bytes {start}-{end - 1}/{size}".encode())]}
+    return backend.Request(scope, receive)
+
+
+def test_http_ranges_stream_in_any_order(backend):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    middle = len(data) // 2
+
+    async def upload():
+        await backend.start_upload(None, {"transfer_id": "ranges", "file_name": "ranges.bin", "size": len(data)})
+        for start, end in ((middle, len(data)), (0, middle)):
+            body = asyncio.Queue()
+            # Pieces smaller than the write buffer, as a socket would deliver them
+            for offset in range(start, end, 64 * 1024):
+                body.put_nowait(data[offset:min(offset + 64 * 1024, end)])
+            body.put_nowait(None)
+            await backend.upload_range("ranges", put_request(backend, start, end, len(data), body))
+            status = await backend.upload_status("ranges")
+        return status, await backend.finish_upload("ranges", hashlib.sha256(data).hexdigest())
+
+    status, result = asyncio.run(upload())
+    assert status["received_ranges"] == [[0, len(data)]]
+    assert result["status"] == "completed"
+    with open(result["path"], "rb") as f:
+        assert f.read() == data
+
+
+def test_finish_waits_for_ranges_still_streaming(backend):
+    data = os.urandom(3 * 1024 * 1024)
+
+    async def upload():
+        await backend.start_upload(None, {"transfer_id": "race", "file_name": "race.bin", "size": len(data)})
+        body = asyncio.Queue()
+        for piece in (data, None):
+            body.put_nowait(piece)
+        await backend.upload_range("race", put_request(backend, 0, len(data), len(data), body))
+
+        # A re-sent range is still streaming when the client finishes
+        resend = asyncio.Queue()
+        stream = asyncio.create_task(
+            backend.upload_range("race", put_request(backend, 0, len(data), len(data), resend)))
+        await asyncio.sleep(0.1)
+        finish = asyncio.create_task(backend.finish_upload("race", hashlib.sha256(data).hexdigest()))
+        await asyncio.sleep(0.1)
+        assert not finish.done()
+
+        resend.put_nowait(data)
+        with pytest.raises(backend.HTTPException) as error:
+            await stream
+        assert error.value.status_code == 409
+        return await finish
+
+    result = asyncio.run(upload())
+    assert result["status"] == "completed"
+    assert backend.active_transfers["race"]["chunks_received"] == backend.active_transfers["race"]["total_chunks"]
+
+
+def test_http_body_longer_than_its_range_is_rejected(backend):
+    async def upload():
+        await backend.start_upload(None, {"transfer_id": "long", "file_name": "long.bin", "size": 100})
+        body = asyncio.Queue()
+        for piece in (bytes(60), None):
+            body.put_nowait(piece)
+        try:
+            with pytest.raises(backend.HTTPException) as error:
+                await backend.upload_range("long", put_request(backend, 0, 50, 100, body))
+            return error.value.status_code, backend.uploads["long"].ranges
+        finally:
+            await backend.fail_upload(backend.uploads["long"], "test over")
+
+    assert asyncio.run(upload()) == (400, [])
+
+
+def test_idle_http_uploads_expire(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'UPLOAD_SWEEP_INTERVAL', 0.01)
+    monkeypatch.setattr(backend, 'UPLOAD_IDLE_TIMEOUT', 0.1)
+
+    async def scenario():
+        await backend.start_upload(None, {'transfer_id': 'idle-http', 'file_name': 'idle.bin', 'size': 100})
+        await backend.start_upload('sid', {'transfer_id': 'idle-socketio', 'file_name': 'idle.bin', 'size': 100})
+        part_path = backend.uploads['idle-http'].part_path
+        await asyncio.sleep(0.3)
+        expired = 'idle-http' not in backend.uploads
+        await backend.fail_upload(backend.uploads['idle-socketio'], 'test over')
+        return part_path, expired
+
+    part_path, expired = asyncio.run(scenario())
+    assert expired
+    assert backend.active_transfers['idle-http']['status'] == 'failed'
+    assert not os.path.exists(part_path)
+
+
+def test_http_upload_with_a_range_streaming_does_not_expire(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'UPLOAD_SWEEP_INTERVAL', 0.01)
+    monkeypatch.setattr(backend, 'UPLOAD_IDLE_TIMEOUT', 0.1)
+    data = os.urandom(100)
+
+    async def upload():
+        await backend.start_upload(None, {'transfer_id': 'slow-http', 'file_name': 'slow.bin', 'size': len(data)})
+        body = asyncio.Queue()
+        stream = asyncio.create_task(
+            backend.upload_range('slow-http', put_request(backend, 0, len(data), len(data), body)))
+        await asyncio.sleep(0.3)
+        for piece in (data, None):
+            body.put_nowait(piece)
+        await stream
+        return await backend.finish_upload('slow-http', hashlib.sha256(data).hexdigest())
+
+    assert asyncio.run(upload())['status'] == 'completed'